@@ -0,0 +1,45 @@
+import threading
+from concurrent.futures import wait, ALL_COMPLETED
+
+
+class ActuationGroup:
+    """
+    一次動作 (兩俥兩舵) 的完成控制代碼。
+    futures 為 {致動器名稱: 控制任務}，任務結果為 True 代表該致動器到達目標；
+    沒有任務 (例如尚未連線就略過) 的致動器以 None 表示，視為已完成。
+    """
+
+    def __init__(self, futures=None):
+        self.futures = dict(futures or {})
+        self.started = threading.Event()  # 所有致動器同時開始的閘門
+
+    def release(self):
+        # 所有任務都已排入後一起放行
+        self.started.set()
+
+    def done(self):
+        return all(future is None or future.done() for future in self.futures.values())
+
+    def wait(self, timeout=None):
+        # 等待所有致動器完成，逾時回傳 False
+        pending = [future for future in self.futures.values() if future is not None]
+        if not pending:
+            return True
+        _, not_done = wait(pending, timeout=timeout, return_when=ALL_COMPLETED)
+        return not not_done
+
+    def results(self):
+        # 各致動器是否到達目標，尚未完成者為 None
+        results = {}
+        for name, future in self.futures.items():
+            if future is None:
+                results[name] = True
+            elif not future.done():
+                results[name] = None
+            else:
+                results[name] = future.exception() is None and future.result() is True
+        return results
+
+    def reached(self):
+        # 全部致動器都已到達目標
+        return all(result is True for result in self.results().values())
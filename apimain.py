@@ -1,212 +1,428 @@
-from flask import Flask, request, jsonify, render_template
-from threading import Thread, Lock
+from flask import Flask, Response, request, jsonify, render_template
+from threading import Lock
 import time
-from controlsys import ControlSys
-
-
-# 初始化 Flask 應用
-app = Flask(__name__)
-
-# 共享變數
-last_command = {'Command': 0, 'Speed': -0.42,'Range':0.01}
-last_command_time = time.time()
-last_command_direction_executed = False
-
-lock = Lock()
-
-# 初始化 ControlSys 實例
-ControlSys = ControlSys(gear_system_port="COM11", rudder_systemEnZero_port='COM12', rudder_systemEnOne_port='COM13')
-# 校準
-ControlSys.gear_system.Adjustment(enginID=0, adjVal=2.71)
-ControlSys.gear_system.Adjustment(enginID=1, adjVal=2.71)
-ControlSys.rudder_systemEnZero.Adjustment(0)
-ControlSys.rudder_systemEnOne.Adjustment(0)
-
-#整理
-def execute_command(command_data):
-    """執行控制指令的核心函數，根據命令類型進行對應處理"""
-    command = command_data.get('Command', 0)
-    global last_command_direction_executed
-    if command == 666:
-        last_command_direction_executed = command
-        # 精密控制模式
-        msg = ControlSys.decision(
-            Command=command,
-            Left_Speed=command_data.get('Left_Speed', -0.42),
-            Left_Rudder=command_data.get('Left_Rudder', 0),
-            Right_Speed=command_data.get('Right_Speed', -0.42),
-            Right_Rudder=command_data.get('Right_Rudder', 0),
-            Range = command_data.get('Range', 0.01),
-        )
-        return msg
-    elif command >= 900:
-        # 高優先指令處理
-        # global last_command_direction_executed
-        if command != last_command_direction_executed:
-            msg=ControlSys.decision(Command=command)
-            last_command_direction_executed = command
-            # print("7777777777",last_command_direction_executed)
-            return msg
-        else:
-            msg = ControlSys.decision(Command=0)
-            # print("8888888888888888888888888888888888")
-            return msg
-    elif command==701:
-        last_command_direction_executed = command
-        #speed還沒條
-        # print("6666666666666666",command_data)
-        msg=ControlSys.decision(Command=command, Current_heading=command_data.get('Current_heading', 0),Range=command_data.get('Range', 0.01),Speed=command_data['Speed'] )
-    else:
-        # 常規指令處理
-        last_command_direction_executed = command
-        msg=ControlSys.decision(Command=command, Speed=command_data.get('Speed', -0.42),Range=command_data.get('Range', 0.01))
-        return msg
-
-#----------------------------------------------------------------
-
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-@app.route('/status', methods=['GET'])
-def status():
-    with lock:
-        current_status = {
-            'Command': last_command['Command'],
-            'Speed': last_command.get('Speed', 666),
-            'Voltage': {
-                'status':ControlSys.gear_system.connect(),
-                'Engine0': ControlSys.gear_system.left_curvoltval,
-                'Engine1': ControlSys.gear_system.right_curvoltval,
-                'rawdata':ControlSys.gear_system.rawdata,
-                'rawdata0':ControlSys.gear_system.rawdata0,
-                'rawdata1':ControlSys.gear_system.rawdata1,
-                'Engine0_left_gear_status':ControlSys.gear_system.left_gear_status,
-                'Engine1_right_gear_status':ControlSys.gear_system.right_gear_status,
-            },
-            'RudderAngle': {
-                'status0':ControlSys.rudder_systemEnZero.connect(),
-                'status1':ControlSys.rudder_systemEnOne.connect(),
-                'Engine0': ControlSys.rudder_systemEnZero.currudder,
-                'Engine1': ControlSys.rudder_systemEnOne.currudder,
-                'rawdata0':ControlSys.rudder_systemEnZero.rawdata,
-                'rawdata1':ControlSys.rudder_systemEnOne.rawdata
-            },
-        }
-    return jsonify(current_status)
-
-@app.route('/control', methods=['POST'])
-def control():
-    #控制指令選擇
-    global last_command, last_command_time
-
-    data = request.get_json()
-    if not data or 'Command' not in data:
-        return jsonify({'status': 'error', 'message': '無效的輸入'}), 400
-
-    with lock:
-        command = data['Command']
-
-        # 根據命令類型更新 last_command
+from telemetry import TelemetryHub
+from commandworker import CommandWorker, CommandWatchdog
+from controlchannel import ControlChannelServer
+from sequence import SequenceRunner
+from metrics import REGISTRY
+import tracing
+
+
+# 預設的板子串口
+DEFAULT_PORTS = {'gear_system_port': "COM11", 'rudder_systemEnZero_port': 'COM12', 'rudder_systemEnOne_port': 'COM13'}
+
+# 指令逾時秒數，以及需要週期重算的指令與其週期 (秒)
+COMMAND_TIMEOUT = 60
+REFRESH_PERIODS = {701: 3.0}
+
+# SSE 每個連線預設的最高推送頻率 (Hz)
+STREAM_MAX_HZ = 20
+
+# 硬體建立前的遙測快照，與 LeverSys/RudderSys 剛建立 (尚未連線、已校準) 時發布的內容相同
+DEFAULT_TELEMETRY = {
+    'gear': {
+        'status': 0,
+        'Engine0': 2.71,
+        'Engine1': 2.71,
+        'Engine0_left_gear_status': 'neutral',
+        'Engine1_right_gear_status': 'neutral',
+    },
+    'lever': {'NEUTRAL_LED': '0', 'ACTIVE_LED': '0', 'SYNC_LED': '0', 'LPS_L_vol': '0', 'LPS_R_vol': '0'},
+    'lever0': {'EngineInstance': '0', 'EngineSpeed': '0', 'EngineBoostPressure': '0', 'EngineTiltTrim': '0',
+               'TransmissionGear': '0', 'OilPressure': '0', 'OilTemperature': '0', 'DiscreteStatus': '0'},
+    'lever1': {'EngineInstance': '1', 'EngineSpeed': '0', 'EngineBoostPressure': '0', 'EngineTiltTrim': '0',
+               'TransmissionGear': '0', 'OilPressure': '0', 'OilTemperature': '0', 'DiscreteStatus': '0'},
+    'rudder0': {'enginID': '0', 'RudderOrder': '0', 'RudderFeedback': '0', 'Pilot_Mode': 'None', 'Heading': '0', 'Course': '0'},
+    'rudder0_state': {'status': 0, 'currudder': 0},
+    'rudder1': {'enginID': '1', 'RudderOrder': '0', 'RudderFeedback': '0', 'Pilot_Mode': 'None', 'Heading': '0', 'Course': '0'},
+    'rudder1_state': {'status': 0, 'currudder': 0},
+}
+
+
+class BoatService:
+    """
+    API 背後的控制狀態：最後指令、致動執行緒、看門狗與動作序列。
+    ControlSys (串口、pynmea2、航向控制的 numpy/scipy) 第一次真正用到時才建立，
+    import apimain 與 Flask 啟動不再被硬體初始化拖慢。
+    """
+
+    def __init__(self, ports=None):
+        self.ports = dict(DEFAULT_PORTS, **(ports or {}))
+        self.telemetry = TelemetryHub()  # 先建立遙測快照，/status 與 /stream 不需要等硬體
+        self.lock = Lock()
+        self.build_lock = Lock()
+        self._control_sys = None
+
+        # 共享變數
+        self.last_command = {'Command': 0, 'Speed': -0.42,'Range':0.01}
+        self.last_command_direction_executed = False
+        # 硬體還沒建立前 /status 與 /stream 也要有完整的預設值 (網頁直接對數值呼叫 toFixed)
+        for key, value in DEFAULT_TELEMETRY.items():
+            self.telemetry.publish(key, dict(value))
+        self.publish_command()
+
+        # 致動專用執行緒：/control 只排入指令，由這裡依序執行 execute_command，尚未開始的舊運動指令會被新指令取代
+        self.worker = CommandWorker(execute=self.execute_command, progress=self.pending_steps, coalesce=self.is_motion_command, outcome=self.last_actuation)
+        # 事件驅動的看門狗：逾時期限一到就回空俥，只有需要的指令才週期重送
+        # 收到第一筆指令 (submit_command) 才開始計時，沒有客戶端時不會因逾時而建立硬體
+        self.watchdog = CommandWatchdog(on_timeout=self.command_timeout, on_refresh=self.refresh_command, timeout=COMMAND_TIMEOUT, refresh_periods=REFRESH_PERIODS)
+        # 伺服器端定時動作序列：依計畫時間送出每一步，中止或失敗時回空俥
+        self.sequences = SequenceRunner(submit=lambda data, source: self.submit_command(data, source=source)[1], lookup=self.worker.get, started=self.worker.started)
+
+    @property
+    def control_sys(self):
+        # 第一次使用時才建立 ControlSys 並套用預設校準
+        if self._control_sys is None:
+            with self.build_lock:
+                if self._control_sys is None:
+                    self._control_sys = self._build_control_sys()
+        return self._control_sys
+
+    @property
+    def hardware_ready(self):
+        return self._control_sys is not None
+
+    def _build_control_sys(self):
+        from controlsys import ControlSys
+        control_sys = ControlSys(telemetry=self.telemetry, **self.ports)
+        # 校準
+        control_sys.gear_system.Adjustment(enginID=0, adjVal=2.71)
+        control_sys.gear_system.Adjustment(enginID=1, adjVal=2.71)
+        control_sys.rudder_systemEnZero.Adjustment(0)
+        control_sys.rudder_systemEnOne.Adjustment(0)
+        return control_sys
+
+    def pending_steps(self):
+        # 硬體還沒建立就沒有剩餘步數
+        if not self.hardware_ready:
+            return {"total": 0}
+        return self.control_sys.pending_steps()
+
+    def last_actuation(self):
+        # 最近一次動作的完成控制代碼 (硬體還沒建立就沒有)
+        if not self.hardware_ready:
+            return None
+        return self.control_sys.last_actuation
+
+    def publish_command(self):
+        # 把目前指令發布到遙測快照，/status 不需要再拿 lock 讀 last_command
+        self.telemetry.publish('command', {'Command': self.last_command['Command'], 'Speed': self.last_command.get('Speed', 666)})
+
+    #整理
+    def execute_command(self, command_data):
+        """執行控制指令的核心函數，根據命令類型進行對應處理"""
+        ControlSys = self.control_sys
+        command = command_data.get('Command', 0)
+        if command != 701:
+            # 離開航向保持後，下次進入要重新記錄目標航向
+            ControlSys.autoHeading.last_heading = None
         if command == 666:
-            last_command = {
-                'Command': command,
-                'Left_Speed': data.get('Left_Speed', -0.42),
-                'Left_Rudder': data.get('Left_Rudder', 0),
-                'Right_Speed': data.get('Right_Speed', -0.42),
-                'Right_Rudder': data.get('Right_Rudder', 0),
-                'Range': data.get('Range', 0.01)
-            }
+            self.last_command_direction_executed = command
+            # 精密控制模式
+            msg = ControlSys.decision(
+                Command=command,
+                Left_Speed=command_data.get('Left_Speed', -0.42),
+                Left_Rudder=command_data.get('Left_Rudder', 0),
+                Right_Speed=command_data.get('Right_Speed', -0.42),
+                Right_Rudder=command_data.get('Right_Rudder', 0),
+                Range = command_data.get('Range', 0.01),
+            )
+            return msg
         elif command >= 900:
-            last_command = {'Command': command}
+            # 高優先指令處理
+            if command != self.last_command_direction_executed:
+                msg=ControlSys.decision(Command=command)
+                self.last_command_direction_executed = command
+                return msg
+            else:
+                msg = ControlSys.decision(Command=0)
+                return msg
         elif command==701:
-            last_command = {
-                'Command': command,
-                'Current_heading':data.get('Current_heading', 0),
-                'Range':data.get('Range', 0.01),
-                'Speed':data.get('Speed', -0.42)
-            }
+            self.last_command_direction_executed = command
+            #speed還沒條
+            msg=ControlSys.decision(Command=command, Current_heading=command_data.get('Current_heading', 0),Range=command_data.get('Range', 0.01),Speed=command_data['Speed'] )
+            return msg
         else:
-            last_command = {
-                'Command': command,
-                'Speed': data.get('Speed', -0.42),
-                'Range': data.get('Range', 0.01)
-            }
+            # 常規指令處理
+            self.last_command_direction_executed = command
+            msg=ControlSys.decision(Command=command, Speed=command_data.get('Speed', -0.42),Range=command_data.get('Range', 0.01))
+            return msg
+
+    @staticmethod
+    def is_motion_command(command_data):
+        # 運動指令 (空俥、方向、精密控制、航向保持) 只需要執行最新的一筆；連接/叫站/斷線必須依序執行
+        return command_data.get('Command', 0) < 900
 
-        # 執行指令
-        msg=execute_command(last_command)
-        last_command_time = time.time()
+    def submit_command(self, data, source="api"):
+        """更新 last_command 並交給致動執行緒，回傳 (指令內容, 指令編號)"""
+        with self.lock:
+            command = data['Command']
 
-        return jsonify({**last_command, 'status': 200,'msg':msg})
+            # 根據命令類型更新 last_command
+            if command == 666:
+                self.last_command = {
+                    'Command': command,
+                    'Left_Speed': data.get('Left_Speed', -0.42),
+                    'Left_Rudder': data.get('Left_Rudder', 0),
+                    'Right_Speed': data.get('Right_Speed', -0.42),
+                    'Right_Rudder': data.get('Right_Rudder', 0),
+                    'Range': data.get('Range', 0.01)
+                }
+            elif command >= 900:
+                self.last_command = {'Command': command}
+            elif command==701:
+                self.last_command = {
+                    'Command': command,
+                    'Current_heading':data.get('Current_heading', 0),
+                    'Range':data.get('Range', 0.01),
+                    'Speed':data.get('Speed', -0.42)
+                }
+            else:
+                self.last_command = {
+                    'Command': command,
+                    'Speed': data.get('Speed', -0.42),
+                    'Range': data.get('Range', 0.01)
+                }
 
-def control_loop():
-    #持續控制指令的執行迴圈
-    global last_command_direction_executed, last_command_time
+            # 交給致動執行緒，立即回傳指令編號
+            cmd_id = self.worker.submit(self.last_command, source=source)
+            self.watchdog.kick(command)
+            self.publish_command()
+            return dict(self.last_command), cmd_id
 
-    while True:
-        with lock:
-            elapsed_time = time.time() - last_command_time
+    def manual_command(self, data, source="api"):
+        """手動指令 (/control、搖桿通道)：先中止執行中的動作序列再送出"""
+        self.sequences.abort_running(reason="手動指令接手")
+        return self.submit_command(data, source=source)
+
+    def command_timeout(self):
+        # 指令逾時：回空俥
+        self.worker.submit({'Command': 0}, source="timeout")
+
+    def refresh_command(self, command):
+        # 週期重算的指令 (航向保持) 以最新航向重新送出
+        with self.lock:
+            if self.last_command['Command'] != command:
+                return
+            if command == 701:
+                self.last_command['Current_heading'] = self.control_sys.rudder_systemEnZero.rawdata.Heading
+            self.worker.submit(self.last_command, source="refresh")
+
+    def calibrate(self, gear_adj_engine0, gear_adj_engine1, rudder_adj_engine0, rudder_adj_engine1):
+        # 應用校準值
+        with self.lock:
+            ControlSys = self.control_sys
+            ControlSys.gear_system.Adjustment(enginID=0, adjVal=gear_adj_engine0)
+            ControlSys.gear_system.Adjustment(enginID=1, adjVal=gear_adj_engine1)
+            ControlSys.rudder_systemEnZero.Adjustment(rudder_adj_engine0)
+            ControlSys.rudder_systemEnOne.Adjustment(rudder_adj_engine1)
+            ControlSys.reset_setpoints()
 
-            if elapsed_time > 60:
-                # 超時重置指令
-                ControlSys.decision(Command=0)
-            else:
-                # 執行最新指令
-                if last_command['Command'] == 701:
-                    # print("555555555555",last_command)
-                    last_command['Current_heading'] = ControlSys.rudder_systemEnZero.rawdata['Heading']
 
-                    # last_command['current_heading'] = round(random.uniform(100.9, 110.5), 2)
-                    # print("555555555555","有更新current_heading",last_command)
+def build_status(data):
+    """把遙測快照整理成 /status 的回應格式"""
+    command = data.get('command', {})
+    gear = data.get('gear', {})
+    rudder0 = data.get('rudder0_state', {})
+    rudder1 = data.get('rudder1_state', {})
+    return {
+        'Command': command.get('Command'),
+        'Speed': command.get('Speed'),
+        'Voltage': {
+            'status': gear.get('status'),
+            'Engine0': gear.get('Engine0'),
+            'Engine1': gear.get('Engine1'),
+            'rawdata': dict(data.get('lever', {})),
+            'rawdata0': dict(data.get('lever0', {})),
+            'rawdata1': dict(data.get('lever1', {})),
+            'Engine0_left_gear_status': gear.get('Engine0_left_gear_status'),
+            'Engine1_right_gear_status': gear.get('Engine1_right_gear_status'),
+        },
+        'RudderAngle': {
+            'status0': rudder0.get('status'),
+            'status1': rudder1.get('status'),
+            'Engine0': rudder0.get('currudder'),
+            'Engine1': rudder1.get('currudder'),
+            'rawdata0': dict(data.get('rudder0', {})),
+            'rawdata1': dict(data.get('rudder1', {})),
+        },
+    }
+
+def status_delta(old, new):
+    """比較兩份 /status 內容，只留下有變化的欄位 (巢狀結構保留)"""
+    delta = {}
+    for key, value in new.items():
+        old_value = old.get(key)
+        if isinstance(value, dict) and isinstance(old_value, dict):
+            sub = status_delta(old_value, value)
+            if sub:
+                delta[key] = sub
+        elif value != old_value:
+            delta[key] = value
+    return delta
+
+
+def create_app(ports=None, service=None):
+    """建立 Flask 應用；硬體在第一次下指令 (或校準) 時才建立"""
+    app = Flask(__name__)
+    service = service or BoatService(ports)
+    app.extensions['boat'] = service
+    telemetry = service.telemetry
+
+    # /status 回應快取 (版本, 內容, 序列化內容)：同一個快照版本只整理與序列化一次
+    status_cache = [None, None, None]
+
+    def status_document(snapshot):
+        version, doc, body = status_cache
+        if version != snapshot.version:
+            doc = build_status(snapshot.data)
+            body = app.json.dumps(doc)
+            status_cache[:] = [snapshot.version, doc, body]
+        return doc, body
+
+    @app.route('/')
+    def index():
+        return render_template('index.html')
+
+    @app.route('/status', methods=['GET'])
+    def status():
+        # 不拿控制用的 lock，直接讀唯讀快照，支援 ETag/If-None-Match
+        snapshot = telemetry.snapshot
+        doc, body = status_document(snapshot)
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(str(snapshot.version))
+        return response.make_conditional(request)
+
+    @app.route('/stream', methods=['GET'])
+    def stream():
+        # Server-Sent Events：先送完整狀態，之後只推送有變化的欄位
+        max_hz = request.args.get('hz', default=STREAM_MAX_HZ, type=float)
+        min_interval = 1.0 / max_hz if max_hz > 0 else 0
+
+        def generate():
+            last_doc = None
+            version = None
+            next_send = 0
+            while True:
+                snapshot = telemetry.wait_for_change(version, timeout=15)
+                if snapshot.version == version:
+                    # 一段時間沒有新資料，送註解保持連線
+                    yield ": keep-alive\n\n"
+                    continue
+                # 每個連線的速率上限，睡完再拿最新快照，中間的變化會合併成一筆
+                wait = next_send - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                    snapshot = telemetry.snapshot
+                next_send = time.monotonic() + min_interval
+                version = snapshot.version
+                doc, body = status_document(snapshot)
+                if last_doc is None:
+                    yield f"id: {version}\nevent: snapshot\ndata: {body}\n\n"
                 else:
-                    ControlSys.autoHeading.last_heading = None
-                execute_command(last_command)
-
-        time.sleep(3)  # 根據需要調整睡眠時間
-
-@app.route('/calibrate', methods=['POST'])
-def calibrate():
-    data = request.get_json()
-    if not data:
-        return jsonify({'status': 'error', 'message': '無效的輸入'}), 400
-
-    # 獲取校準值
-    gear_adj_engine0 = data.get('gear_adj_engine0')
-    gear_adj_engine1 = data.get('gear_adj_engine1')
-    rudder_adj_engine0 = data.get('rudder_adj_engine0')
-    rudder_adj_engine1 = data.get('rudder_adj_engine1')
-
-    # 校驗輸入值
-    if gear_adj_engine0 is None or gear_adj_engine1 is None or rudder_adj_engine0 is None or rudder_adj_engine1 is None:
-        return jsonify({'status': 'error', 'message': '缺少校準值'}), 400
-
-    # 應用校準值
-    with lock:
-        ControlSys.gear_system.Adjustment(enginID=0, adjVal=gear_adj_engine0)
-        ControlSys.gear_system.Adjustment(enginID=1, adjVal=gear_adj_engine1)
-        ControlSys.rudder_systemEnZero.Adjustment(rudder_adj_engine0)
-        ControlSys.rudder_systemEnOne.Adjustment(rudder_adj_engine1)
-
-    return jsonify({'status': '校準完成'})
+                    delta = status_delta(last_doc, doc)
+                    if delta:
+                        yield f"id: {version}\nevent: delta\ndata: {app.json.dumps(delta)}\n\n"
+                last_doc = doc
+
+        return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+    @app.route('/control', methods=['POST'])
+    def control():
+        #控制指令選擇
+        data = request.get_json()
+        if not data or 'Command' not in data:
+            return jsonify({'status': 'error', 'message': '無效的輸入'}), 400
+
+        # 每個 /control 一個追蹤編號，從這裡一路帶到串口寫入
+        with tracing.use_trace(tracing.new_trace_id()) as trace_id, tracing.span("POST /control"):
+            command, cmd_id = service.manual_command(data, source="api")
+        return jsonify({**command, 'status': 200, 'id': cmd_id, 'trace_id': trace_id, 'state': 'queued', 'msg': '指令已排入'})
+
+    @app.route('/control/sequence', methods=['POST'])
+    def control_sequence():
+        # 例：{"steps": [{"Command": 1, "params": {"Speed": 1}, "duration": 5}, {"Command": 0, "duration": 0}]}
+        data = request.get_json()
+        if not data or 'steps' not in data:
+            return jsonify({'status': 'error', 'message': '無效的輸入'}), 400
+        try:
+            seq_id = service.sequences.start(data['steps'])
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        return jsonify({'status': 200, 'id': seq_id, 'state': 'running', 'msg': '序列已開始'})
+
+    @app.route('/control/sequence/<int:seq_id>', methods=['GET'])
+    def sequence_status(seq_id):
+        # 查詢序列進度與每一步開始時間的偏差
+        record = service.sequences.get(seq_id)
+        if record is None:
+            return jsonify({'status': 'error', 'message': f'找不到序列 {seq_id}'}), 404
+        return jsonify(record)
+
+    @app.route('/control/sequence/<int:seq_id>/abort', methods=['POST'])
+    def sequence_abort(seq_id):
+        # 中止序列並回空俥
+        if not service.sequences.abort(seq_id):
+            return jsonify({'status': 'error', 'message': f'序列 {seq_id} 不在執行中'}), 409
+        return jsonify({'status': 200, 'id': seq_id, 'state': 'aborted', 'msg': '序列已中止'})
+
+    @app.route('/commands', methods=['GET'])
+    def command_stats():
+        # 指令統計：總數、實際執行數、被較新指令取代的數量
+        return jsonify(service.worker.stats())
+
+    @app.route('/commands/<int:cmd_id>', methods=['GET'])
+    def command_progress(cmd_id):
+        # 查詢指令進度：queued/running/done、剩餘步數與時間
+        record = service.worker.get(cmd_id)
+        if record is None:
+            return jsonify({'status': 'error', 'message': f'找不到指令 {cmd_id}'}), 404
+        return jsonify(record)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        # Prometheus 文字格式的延遲與計數指標
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    @app.route('/trace', methods=['GET'])
+    def trace():
+        # 最近的 span 匯出成 Chrome trace JSON，?trace_id= 只看單一指令
+        return jsonify(tracing.chrome_trace(request.args.get('trace_id')))
+
+    @app.route('/calibrate', methods=['POST'])
+    def calibrate():
+        data = request.get_json()
+        if not data:
+            return jsonify({'status': 'error', 'message': '無效的輸入'}), 400
+
+        # 獲取校準值
+        gear_adj_engine0 = data.get('gear_adj_engine0')
+        gear_adj_engine1 = data.get('gear_adj_engine1')
+        rudder_adj_engine0 = data.get('rudder_adj_engine0')
+        rudder_adj_engine1 = data.get('rudder_adj_engine1')
+
+        # 校驗輸入值
+        if gear_adj_engine0 is None or gear_adj_engine1 is None or rudder_adj_engine0 is None or rudder_adj_engine1 is None:
+            return jsonify({'status': 'error', 'message': '缺少校準值'}), 400
+
+        service.calibrate(gear_adj_engine0, gear_adj_engine1, rudder_adj_engine0, rudder_adj_engine1)
+        return jsonify({'status': '校準完成'})
+
+    return app
+
+
+# 建立應用不會連接硬體，可直接給 flask run / pyinstaller 使用
+app = create_app()
+
 if __name__ == '__main__':
-    # # 在單獨的執行緒中啟動控制迴圈
-    # control_thread = Thread(target=control_loop)
-    # control_thread.daemon = True
-    # control_thread.start()
-
-    # # 在單獨的執行緒中啟動數據接收迴圈
-    # data_receive_thread = Thread(target=data_receive_loop)
-    # data_receive_thread.daemon = True
-    # data_receive_thread.start()
-
-    # 定義需要運行的函數
-    threads = [
-        Thread(target=control_loop, daemon=True),
-        # Thread(target=data_receive_loop, daemon=True)
-    ]
-    
-    # 啟動所有線程
-    for thread in threads:
-        thread.start()
+    service = app.extensions['boat']
+
+    # 搖桿用的常駐控制通道
+    channel = ControlChannelServer(submit=service.manual_command, telemetry=service.telemetry, port=5900)
+    channel.start()
+
+    # 指令看門狗 (取代每 3 秒重跑指令的 control_loop)
+    service.watchdog.start()
     # 運行 Flask 應用
     app.run(host='0.0.0.0', port=5899)
@@ -0,0 +1,53 @@
+"""
+句子解析基準測試：比較 pynmea2 路徑 (customNemaJson().formatjson_pynmea) 與快速解析表
+(customNemaJson().formatjson)。先確認兩者結果完全相同，再量每秒可解析的行數。
+
+用法：python bench_nemadict.py [行數]
+"""
+import random
+import sys
+import time
+
+from nemadict import customNemaJson
+
+
+SAMPLE_LINES = [
+    "$Lever,2731,2731",
+    "$IND,0,1,0",
+    "$EngRap,0,1200,15,3",
+    "$TransPar,1,1,300,60,0",
+    "$RudderFeedback,-12",
+    "$RudderOrder,-20",
+    "$Pilot_Mode,1",
+    "$Heading,215.3",
+    "$HeadingToSteerCourse,12",
+]
+
+
+def run(parse, lines):
+    start = time.perf_counter()
+    for line in lines:
+        parse(line)
+    return len(lines) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(0)
+    lines = [rng.choice(SAMPLE_LINES) for _ in range(count)]
+    encoded = [line.encode("ascii") for line in lines]
+
+    for line in SAMPLE_LINES:
+        slow = customNemaJson().formatjson_pynmea(line)
+        fast = customNemaJson().formatjson(line)
+        assert slow == fast, (line, slow, fast)
+        assert customNemaJson().formatjson(line.encode("ascii")) == slow, line
+
+    results = (
+        ("pynmea2 (舊)", run(lambda line: customNemaJson().formatjson_pynmea(line), lines)),
+        ("快速解析 str", run(lambda line: customNemaJson().formatjson(line), lines)),
+        ("快速解析 bytes", run(lambda line: customNemaJson().formatjson(line), encoded)),
+    )
+    base = results[0][1]
+    for name, rate in results:
+        print(f"{name:>14}: {rate:12,.0f} 行/秒  ({rate / base:5.1f}x)")
@@ -0,0 +1,80 @@
+"""
+舵角滿舵轉換基準測試：-30 度到 +30 度 (再轉回來) 需要多久，直到板子回授到達目標為止。
+不需要實體板子，使用 boardemulator 的舵機板 (太快的指令會被丟掉，回授每次回報最多追 slew 度)。
+
+比較：
+  逐度 (原本)      開迴路，每一度固定隔 rudder_step 預設 0.08 秒
+  逐度 (校正間隔)  開迴路，rudder_step 使用校正後的間隔
+  逐度回授確認      回授模式，burst_window=1，每一度等回授確認
+  連發              回授模式，burst_window=4，間隔使用量到的最短間隔並依回授延遲調整
+
+用法：python bench_rudder.py [來回次數]
+"""
+import sys
+import time
+
+import pacing
+from boardemulator import RudderBoardEmulator
+from rudderboard import RudderSys
+
+
+def wait_feedback(board, target, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while board.feedback != target:
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def transit(rudder_system, board, target):
+    # 下令到板子回授到達目標的時間
+    start = time.perf_counter()
+    result = rudder_system.controlRudder(decision=target).result(timeout=30)
+    reached = wait_feedback(board, target)
+    return time.perf_counter() - start, result and reached
+
+
+def run(name, rudder_system, board, rounds):
+    dropped = board.dropped
+    # 先到 -30 度 (不計時)
+    rudder_system.controlRudder(decision=-30).result(timeout=30)
+    wait_feedback(board, -30)
+    times = []
+    ok = True
+    for _ in range(rounds):
+        for target in (30, -30):
+            seconds, reached = transit(rudder_system, board, target)
+            times.append(seconds)
+            ok = ok and reached
+    average = sum(times) / len(times)
+    print(
+        f"{name:<16} 平均 {average:.2f}s  最慢 {max(times):.2f}s  "
+        f"板子丟掉 {board.dropped - dropped} 筆  到達 {'是' if ok else '否'}"
+    )
+    return average
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    profile = pacing.PacingProfile(path=None)
+    board = RudderBoardEmulator()
+    rudder_system = RudderSys(port="EMU_RUDDER", enginID=0, pacing=profile)
+    rudder_system.open(board)
+    time.sleep(0.2)  # 等第一筆回授
+
+    rudder_system.feedback_tracking = False
+    before = run("逐度 (原本)", rudder_system, board, rounds)
+
+    print("校正間隔中...")
+    pacing.calibrate(rudder_system=rudder_system, profile=profile)
+    run("逐度 (校正間隔)", rudder_system, board, rounds)
+
+    rudder_system.feedback_tracking = True
+    rudder_system.burst_window = 1
+    run("逐度回授確認", rudder_system, board, rounds)
+
+    rudder_system.burst_window = 4
+    after = run("連發", rudder_system, board, rounds)
+    print(f"滿舵轉換 {before:.2f}s -> {after:.2f}s，快 {before / after:.2f} 倍 (回授延遲 {rudder_system.feedback_lag * 1000:.0f}ms)")
+    rudder_system.close()
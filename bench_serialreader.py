@@ -0,0 +1,141 @@
+"""
+串口讀取基準測試：比較舊的 str(readline()).replace(...) 與 SerialLineReader。
+不需要實體串口，以記憶體中的假串口模擬 USB 轉串口一次送來不定長度的資料。
+分兩項：只切行，以及切行加解析 (板子實際的路徑，舊寫法解析 str，新寫法直接解析 bytes 行)。
+輸出每秒行數，以及每行處理時的暫存記憶體峰值 (tracemalloc)。
+
+用法：python bench_serialreader.py [行數]
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+from nemadict import customNemaJson
+from serialreader import SerialLineReader
+
+
+SAMPLE_LINES = [
+    b"$Lever,2731,2731",
+    b"$IND,0,1,0",
+    b"$EngRap,0,1200,15,3",
+    b"$TransPar,1,1,300,60,0",
+    b"$RudderFeedback,-12",
+    b"$RudderOrder,-20",
+    b"$Heading,215.3",
+]
+
+
+class FakeSerial:
+    # 模擬 pyserial：read/readline/in_waiting，資料分成不定長度的片段抵達
+    def __init__(self, data, seed=1):
+        self.data = data
+        self.pos = 0
+        self.random = random.Random(seed)
+        self.arrived = 0
+
+    @property
+    def in_waiting(self):
+        if self.arrived <= self.pos:
+            self.arrived = min(len(self.data), self.pos + self.random.randint(16, 256))
+        return self.arrived - self.pos
+
+    def read(self, size=1):
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += len(chunk)
+        return chunk
+
+    def readline(self):
+        end = self.data.find(b"\n", self.pos)
+        end = len(self.data) if end < 0 else end + 1
+        return self.read(end - self.pos)
+
+
+def make_data(count):
+    rng = random.Random(0)
+    return b"".join(rng.choice(SAMPLE_LINES) + b"\r\n" for _ in range(count))
+
+
+def old_lines(ser, count):
+    # 原本 LeverSys/RudderSys 的寫法
+    for _ in range(count):
+        yield (
+            str(ser.readline())
+            .replace("'", "")
+            .replace("b", "")
+            .replace("\\r\\n", "")
+        )
+
+
+def new_lines(ser, count):
+    reader = SerialLineReader(ser)
+    produced = 0
+    while produced < count:
+        reader.fill()
+        for line in reader.lines():
+            produced += 1
+            yield line
+            if produced == count:
+                return
+
+
+def old_parsed(ser, count):
+    parser = customNemaJson()
+    for line in old_lines(ser, count):
+        yield parser.formatjson(line)
+
+
+def new_parsed(ser, count):
+    parser = customNemaJson()
+    for line in new_lines(ser, count):
+        yield parser.formatjson(line)
+
+
+def throughput(make_lines, data, count):
+    ser = FakeSerial(data)
+    start = time.perf_counter()
+    for _ in make_lines(ser, count):
+        pass
+    return count / (time.perf_counter() - start)
+
+
+def peak_per_line(make_lines, data, count):
+    # 每處理一行前重設峰值，量這一行需要的暫存記憶體
+    ser = FakeSerial(data)
+    lines = make_lines(ser, count)
+    tracemalloc.start()
+    total = 0
+    try:
+        for _ in range(count):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            next(lines)
+            total += tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return total / count
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    data = make_data(count)
+
+    old_sample = list(old_lines(FakeSerial(data), 3))
+    new_sample = list(new_lines(FakeSerial(data), 3))
+    print("舊寫法範例:", old_sample)
+    print("新寫法範例:", new_sample)
+
+    for name, make_lines in (
+        ("str(readline()).replace", old_lines),
+        ("SerialLineReader", new_lines),
+        ("舊寫法 + 解析", old_parsed),
+        ("SerialLineReader + 解析", new_parsed),
+    ):
+        rate = throughput(make_lines, data, count)
+        peak = peak_per_line(make_lines, data, min(count, 20000))
+        print(f"{name:>24}: {rate:12,.0f} 行/秒  每行暫存記憶體峰值 {peak:7.1f} bytes")
+
+    broken = sum(
+        1 for a, b in zip(old_lines(FakeSerial(data), count), new_lines(FakeSerial(data), count)) if a != str(b, "ascii")
+    )
+    print(f"舊寫法內容被改壞的行數 (字母 b 被刪除): {broken}/{count}")
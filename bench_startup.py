@@ -0,0 +1,52 @@
+"""
+啟動時間量測：每一輪開新的 python 行程，量
+  import apimain、第一個 /status 請求、第一次建立硬體 (ControlSys)、第一次航向計算 (numpy/scipy)
+的耗時，取中位數。硬體串口不存在也能量 (只建立物件不開串口)。
+
+用法：python bench_startup.py [輪數]
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+
+# 在子行程裡執行，輸出一行 JSON (毫秒)
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import apimain
+t1 = time.perf_counter()
+client = apimain.app.test_client()
+response = client.get('/status')
+t2 = time.perf_counter()
+service = apimain.app.extensions['boat']
+hardware_before = service.hardware_ready
+service.control_sys
+t3 = time.perf_counter()
+service.control_sys.autoHeading.RudderAngleCalculation(10, 0, 0)
+t4 = time.perf_counter()
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'first_status_ms': (t2 - t1) * 1000,
+    'status_code': response.status_code,
+    'hardware_built_at_import': hardware_before,
+    'build_control_sys_ms': (t3 - t2) * 1000,
+    'first_autoheading_ms': (t4 - t3) * 1000,
+}))
+"""
+
+
+def run_once():
+    result = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True)
+    # 只取最後一行 JSON，前面可能有硬體初始化的 print
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    samples = [run_once() for _ in range(rounds)]
+    print(f"輪數: {rounds}，啟動時硬體已建立: {samples[0]['hardware_built_at_import']}")
+    for key in ("import_ms", "first_status_ms", "build_control_sys_ms", "first_autoheading_ms"):
+        values = [sample[key] for sample in samples]
+        print(f"{key:>22}: 中位數 {statistics.median(values):8.1f} ms  最小 {min(values):8.1f} ms  最大 {max(values):8.1f} ms")
@@ -0,0 +1,128 @@
+import threading
+import time
+
+
+class EmulatedSerial:
+    """
+    模擬板子的串口 (write/read/in_waiting/flushInput)，沒有硬體時用來測試與校正送出間隔。
+    板子處理一筆指令需要 min_gap 秒，距離上一筆被接受的指令太近的指令會被丟掉，
+    和實際板子收太快時漏指令的行為相同。子類別覆寫 handle() 與 report()。
+    """
+
+    def __init__(self, port="EMU", min_gap=0.1, report_interval=0.05, timeout=1):
+        self.port = port
+        self.min_gap = min_gap
+        self.report_interval = report_interval
+        self.timeout = timeout
+        self.is_open = True
+        self.lock = threading.Lock()
+        self.output = bytearray()  # 板子送出、還沒被讀走的資料
+        self.last_accepted = float("-inf")
+        self.next_report = time.monotonic()
+        self.accepted = 0
+        self.dropped = 0
+
+    def write(self, data):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_accepted < self.min_gap:
+                self.dropped += 1
+            else:
+                self.last_accepted = now
+                self.accepted += 1
+                self.handle(bytes(data).decode("ascii"))
+        return len(data)
+
+    def _produce(self):
+        # 呼叫端需持有 self.lock：到了回報時間就產生一筆回報
+        now = time.monotonic()
+        if now >= self.next_report:
+            self.output += self.report().encode("ascii")
+            self.next_report = now + self.report_interval
+
+    @property
+    def in_waiting(self):
+        with self.lock:
+            self._produce()
+            return len(self.output)
+
+    def read(self, size=1):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self.lock:
+                self._produce()
+                if self.output:
+                    data = bytes(self.output[:size])
+                    del self.output[:size]
+                    return data
+                wait = min(self.next_report, deadline) - time.monotonic()
+            if wait <= 0 or not self.is_open:
+                return b""
+            time.sleep(wait)
+
+    def flushInput(self):
+        with self.lock:
+            del self.output[:]
+
+    reset_input_buffer = flushInput
+
+    def close(self):
+        self.is_open = False
+
+    def handle(self, command):
+        # 處理一筆被接受的指令；預設不做任何事 (不認得的指令板子也是直接忽略)
+        pass
+
+    def report(self):
+        # 定時回報的內容；預設不回報
+        return ""
+
+
+class LeverBoardEmulator(EmulatedSerial):
+    """油門控制板：LPS_*_DEC 讓電壓上升、LPS_*_ACC 讓電壓下降 (單步 10mV，_Five 50mV，_Ten 100mV)"""
+
+    GEAR_VOLTAGES = {"Neutral": 2710, "Forward": 2190, "Reverse": 3240}
+    STEP_SIZES = {"": 10, "_Five": 50, "_Ten": 100}
+
+    def __init__(self, port="EMU_LEVER", min_gap=0.12, report_interval=0.05, timeout=1):
+        super().__init__(port, min_gap, report_interval, timeout)
+        self.voltages = [2710, 2710]
+        self.active_led = 0
+
+    def handle(self, command):
+        if command.startswith(("LPS_L_", "LPS_R_")):
+            engine = 0 if command[4] == "L" else 1
+            action = command[6:]
+            if action in self.GEAR_VOLTAGES:
+                self.voltages[engine] = self.GEAR_VOLTAGES[action]
+                return
+            for direction, sign in (("DEC", 1), ("ACC", -1)):
+                if action.startswith(direction):
+                    size = self.STEP_SIZES.get(action[len(direction):])
+                    if size is not None:
+                        self.voltages[engine] += sign * size
+        elif command == "STA_SEL_LONG_PRESS":
+            self.active_led = 1 - self.active_led
+
+    def report(self):
+        return f"$Lever,{self.voltages[0]},{self.voltages[1]}\r\n$IND,0,{self.active_led},0\r\n"
+
+
+class RudderBoardEmulator(EmulatedSerial):
+    """舵機板：FUStbOneDeg/FUPortOneDeg 讓舵角命令加減 1 度，回授每次回報最多追 slew 度"""
+
+    def __init__(self, port="EMU_RUDDER", min_gap=0.05, report_interval=0.05, timeout=1, slew=2):
+        super().__init__(port, min_gap, report_interval, timeout)
+        self.slew = slew
+        self.order = 0
+        self.feedback = 0
+
+    def handle(self, command):
+        if command == "FUStbOneDeg":
+            self.order += 1
+        elif command == "FUPortOneDeg":
+            self.order -= 1
+
+    def report(self):
+        self.feedback += max(-self.slew, min(self.slew, self.order - self.feedback))
+        return f"$RudderOrder,{self.order}\r\n$RudderFeedback,{self.feedback}\r\n"
@@ -1,17 +1,40 @@
-import numpy as np
 import math
-import scipy.linalg # type: ignore
-from pyproj import Proj
 import time
 
+# numpy / scipy / pyproj 載入很慢，第一次計算航向或距離時才 import
+
 class Cal_Rudder_Engine:
+    # LQR 增益與 UTM 投影只跟固定參數有關，第一次用到時算一次後共用
+    _lqr_gain = None
+    _utm_proj = None
+
+    @classmethod
+    def utm_proj(cls):
+        if cls._utm_proj is None:
+            from pyproj import Proj
+            cls._utm_proj = Proj(proj="utm", zone=51, ellps="WGS84", datum="WGS84")
+        return cls._utm_proj
+
+    @classmethod
+    def lqr_gain(cls):
+        if cls._lqr_gain is None:
+            import numpy as np
+            import scipy.linalg # type: ignore
+            A = np.array([[0.9521, 0.0479], [1, 0]])
+            B = np.array([[-0.2043], [0]])
+            Q = np.array([[5, 0], [0, 1]])
+            R = np.array([[23]])
+            P = scipy.linalg.solve_discrete_are(A, B, Q, R)
+            cls._lqr_gain = np.linalg.inv(R + B.T @ P @ B) @ (B.T @ P @ A)
+        return cls._lqr_gain
+
     def __init__(self,):
         # 記錄上一個航向值 (預設為 0)
         self.last_heading = None
         self.last_time = time.time()
 
     def calculate_target_heading(self,lat, lon, lat_ref, lon_ref):
-        proj = Proj(proj="utm", zone=51, ellps="WGS84", datum="WGS84")
+        proj = self.utm_proj()
         x1, y1 = proj(lon, lat)
         x2, y2 = proj(lon_ref, lat_ref)
         theta = math.atan2(x2 - x1, y2 - y1)
@@ -23,7 +46,7 @@ class Cal_Rudder_Engine:
         return difference
 
     def calculate_distance(self,lat1, lon1, lat2, lon2):
-        proj = Proj(proj="utm", zone=51, ellps="WGS84", datum="WGS84")
+        proj = self.utm_proj()
         x1, y1 = proj(lon1, lat1)
         x2, y2 = proj(lon2, lat2)
         return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
@@ -40,17 +63,12 @@ class Cal_Rudder_Engine:
 
 
     def RudderAngleCalculation(self,current_heading,target_heading, yaw_rate):
-        A = np.array([[0.9521, 0.0479], [1, 0]])
-        B = np.array([[-0.2043], [0]])
-        Q = np.array([[5, 0], [0, 1]])
-        R = np.array([[23]])
-        P = scipy.linalg.solve_discrete_are(A, B, Q, R)
-        K = np.linalg.inv(R + B.T @ P @ B) @ (B.T @ P @ A)
+        K = self.lqr_gain()
 
         yaw_error = self.calculate_heading_difference(current_heading, target_heading)
-        X = np.array([[yaw_error], [yaw_rate]])
-        delta = -K @ X
-        delta_value_limited = int(max(min(delta[0, 0], 25), -25))
+        # delta = -K @ [yaw_error, yaw_rate]
+        delta = -(K[0, 0] * yaw_error + K[0, 1] * yaw_rate)
+        delta_value_limited = int(max(min(delta, 25), -25))
         return delta_value_limited, target_heading, yaw_error
 
     def EngineCalculation(self,now_gps, target_point):
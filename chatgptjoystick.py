@@ -2,6 +2,7 @@ import asyncio
 import re
 import requests
 import serial_asyncio
+from streamclient import StatusStream
 import numpy as np
 from enum import Enum, unique
 
@@ -72,6 +73,8 @@ class JoystickSys:
         }
         # 最新控制指令，格式：(command, left_speed, left_rudder, right_speed, right_rudder)
         self.latest_command = None
+        # 訂閱伺服器狀態串流，燈號由串流即時更新
+        self.status_stream = StatusStream(on_update=self._on_status)
 
         # 模式與對應的處理函式映射
         self.movement_function_mapping = {
@@ -138,19 +141,10 @@ class JoystickSys:
                 print("錯誤訊息：", response.text)
         except Exception as e:
             print(f"發送 API 時發生錯誤: {e}")
-        self._update_data()
 
-    def _update_data(self):
-        url = "http://127.0.0.1:5899/status"
-        try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                self.joystickstate = response.json()["Voltage"]["rawdata"]
-            else:
-                print(f"狀態更新失敗，狀態碼：{response.status_code}")
-                print("錯誤訊息：", response.text)
-        except Exception as e:
-            print(f"更新狀態時發生錯誤: {e}")
+    def _on_status(self, status: dict):
+        # /stream 推送的最新狀態
+        self.joystickstate = status["Voltage"]["rawdata"]
 
     #=== Serial 資料讀取與解析 ===#
     async def read_and_process_serial_data(self):
@@ -341,6 +335,7 @@ class JoystickSys:
     #=== 主循環 ===#
     async def main_loop(self):
         await self.open()
+        self.status_stream.start()
         await asyncio.gather(
             self.read_and_process_serial_data(),
             self.send_control_command_periodically(),
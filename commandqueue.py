@@ -0,0 +1,100 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+# 板子指令的優先順序，數字小的先送
+PRIORITY_NEUTRAL = 0  # 空檔、叫站 (緊急停止要最先送到板子)
+PRIORITY_GEAR = 1  # 進檔、退檔、油門模式按鍵
+PRIORITY_STEP = 2  # 加減速步進
+
+PRIORITY_NAMES = {
+    PRIORITY_NEUTRAL: "neutral",
+    PRIORITY_GEAR: "gear",
+    PRIORITY_STEP: "step",
+}
+
+
+def classify(command_key):
+    """
+    回傳指令的 (優先順序, 引擎編號)。
+    LPS_L_* 屬於左俥 (0)、LPS_R_* 屬於右俥 (1)，叫站與油門按鍵不屬於單一引擎 (None)。
+    """
+    if command_key.startswith("LPS_L_"):
+        engine = 0
+    elif command_key.startswith("LPS_R_"):
+        engine = 1
+    else:
+        engine = None
+    if command_key.endswith("_Neutral") or command_key.startswith("STA_SEL_"):
+        return PRIORITY_NEUTRAL, engine
+    if command_key.endswith(("_Forward", "_Reverse")) or command_key.startswith("TH_ONLY_"):
+        return PRIORITY_GEAR, engine
+    return PRIORITY_STEP, engine
+
+
+class BoardCommandQueue:
+    """
+    板子指令的優先佇列 (取代 LeverSys 原本的 FIFO queue.Queue)。
+    空檔/叫站先送，其次是換檔，最後是速度步進；同一優先順序內維持排入順序。
+    取出與取消在同一把鎖內完成，清除某一俥的指令時不會和寫入執行緒互相搶。
+    排入某一俥的空檔時，該俥還沒送出的換檔與步進會一併取消 (已過時)。
+    """
+
+    def __init__(self):
+        self.heap = []  # (優先順序, 序號, 指令, 引擎, 排入時間 ns, 追蹤編號)
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+
+    def put(self, command_key, trace_id=None):
+        # 排入指令，回傳因為這筆空檔指令而被取消的舊指令數
+        priority, engine = classify(command_key)
+        with self.lock:
+            cancelled = 0
+            if priority == PRIORITY_NEUTRAL and engine is not None:
+                cancelled = self._remove(
+                    lambda item: item[3] == engine and item[0] > PRIORITY_NEUTRAL
+                )
+            heapq.heappush(
+                self.heap,
+                (priority, next(self.sequence), command_key, engine, time.perf_counter_ns(), trace_id),
+            )
+            self.not_empty.notify()
+            return cancelled
+
+    def get(self, timeout=None):
+        """
+        取出優先順序最高的指令，回傳 (指令, 優先順序, 排入時間 ns, 追蹤編號)。
+        逾時回傳 None。
+        """
+        with self.not_empty:
+            if not self.not_empty.wait_for(lambda: self.heap, timeout):
+                return None
+            priority, _, command_key, _, enqueued_at, trace_id = heapq.heappop(self.heap)
+            return command_key, priority, enqueued_at, trace_id
+
+    def cancel(self, engine=None):
+        # 取消某一俥還沒送出的指令 (engine 為 None 則全部取消)，回傳取消的數量
+        with self.lock:
+            if engine is None:
+                cancelled = len(self.heap)
+                self.heap.clear()
+                return cancelled
+            return self._remove(lambda item: item[3] == engine)
+
+    def _remove(self, predicate):
+        # 呼叫端需持有 self.lock
+        kept = [item for item in self.heap if not predicate(item)]
+        cancelled = len(self.heap) - len(kept)
+        if cancelled:
+            heapq.heapify(kept)
+            self.heap[:] = kept
+        return cancelled
+
+    def qsize(self):
+        return len(self.heap)
+
+    def empty(self):
+        return not self.heap
@@ -0,0 +1,219 @@
+import threading
+import time
+import itertools
+from collections import OrderedDict, deque
+from metrics import COMMAND_WAIT_SECONDS
+import tracing
+
+
+class CommandWorker:
+    """
+    專責執行控制指令的工作執行緒。
+    /control 只負責把指令排入佇列並立即回傳指令編號，
+    真正的 ControlSys.decision() 由這條執行緒依序執行，致動器延遲不會卡住 API。
+    可合併的指令 (coalesce 判斷為 True) 採最新優先：新指令會取代尚未開始的舊指令。
+    """
+
+    def __init__(self, execute, progress=None, coalesce=None, outcome=None, history=200):
+        self.execute = execute  # 真正執行指令的函數 (command_data) -> msg
+        self.outcome = outcome  # 取得最近一次動作完成控制代碼 (ActuationGroup) 的函數 () -> group 或 None
+        self.progress = progress  # 回報致動器剩餘步數的函數 () -> dict
+        self.coalesce = coalesce  # 判斷指令是否可被較新指令取代的函數 (command_data) -> bool
+        self.history = history  # 保留多少筆指令紀錄供 /commands/<id> 查詢
+        self.records = OrderedDict()
+        self.pending = deque()
+        self.cond = threading.Condition()
+        self.ids = itertools.count(1)
+        self.current_id = None  # 最近一個開始執行的指令編號
+        self.counts = {"submitted": 0, "executed": 0, "superseded": 0}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, command_data, source="api"):
+        # 建立指令紀錄並排入佇列，立即回傳指令編號
+        with self.cond:
+            cmd_id = next(self.ids)
+            self.counts["submitted"] += 1
+            if self.coalesce is not None and self.coalesce(command_data):
+                self._supersede_pending(cmd_id)
+            self.records[cmd_id] = {
+                "id": cmd_id,
+                "source": source,
+                "command": dict(command_data),
+                "state": "queued",
+                "msg": None,
+                "superseded_by": None,
+                "submitted_at": time.time(),
+                "trace_id": tracing.current_trace.get() or tracing.new_trace_id(),
+                "_submitted": time.monotonic(),
+                "_submitted_ns": time.perf_counter_ns(),
+                "_started": None,
+                "_finished": None,
+                "_actuation": None,
+            }
+            while len(self.records) > self.history:
+                self.records.popitem(last=False)
+            self.pending.append(cmd_id)
+            self.cond.notify()
+            return cmd_id
+
+    def _supersede_pending(self, new_id):
+        # 從佇列尾端往前取代尚未開始的可合併指令，遇到不可合併的指令 (例如叫站) 就停止，保持順序
+        while self.pending:
+            record = self.records.get(self.pending[-1])
+            if record is not None and not self.coalesce(record["command"]):
+                break
+            self.pending.pop()
+            if record is not None:
+                record["state"] = "superseded"
+                record["superseded_by"] = new_id
+                record["_finished"] = time.monotonic()
+                self.counts["superseded"] += 1
+
+    def stats(self):
+        # 指令總數、實際執行數與被取代數
+        with self.cond:
+            return dict(self.counts, pending=len(self.pending), current_id=self.current_id)
+
+    def get(self, cmd_id):
+        # 取得指令目前的狀態、剩餘步數與時間資訊
+        with self.cond:
+            record = self.records.get(cmd_id)
+            if record is None:
+                return None
+            record = dict(record)
+            is_current = cmd_id == self.current_id
+            queue_position = (
+                list(self.pending).index(cmd_id) if record["state"] == "queued" else 0
+            )
+
+        now = time.monotonic()
+        record.pop("_submitted_ns")
+        actuation = record.pop("_actuation")
+        submitted = record.pop("_submitted")
+        started = record.pop("_started")
+        finished = record.pop("_finished")
+        record["queue_position"] = queue_position
+        record["wait_ms"] = round(((started or finished or now) - submitted) * 1000, 1)
+        record["run_ms"] = (
+            round(((finished or now) - started) * 1000, 1) if started else None
+        )
+        # 這筆指令驅動的致動器是否到達目標 (True/False，尚未完成為 None)；沒有驅動致動器則為 None
+        record["actuation"] = actuation.results() if actuation is not None else None
+        # 只有最新執行的指令才有意義的剩餘步數，舊指令的致動器已被後續指令接手
+        if is_current and self.progress is not None:
+            record["steps_left"] = self.progress()
+        else:
+            record["steps_left"] = None if record["state"] == "queued" else 0
+        return record
+
+    def started(self, cmd_id):
+        # 指令開始執行的時間 (time.monotonic)，尚未開始或已不在紀錄中回傳 None
+        with self.cond:
+            record = self.records.get(cmd_id)
+            return record["_started"] if record is not None else None
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                cmd_id = self.pending.popleft()
+                record = self.records.get(cmd_id)
+                if record is None:
+                    continue
+                record["state"] = "running"
+                record["_started"] = time.monotonic()
+                COMMAND_WAIT_SECONDS.observe(record["_started"] - record["_submitted"], source=record["source"])
+                self.current_id = cmd_id
+                self.counts["executed"] += 1
+                command_data = record["command"]
+
+            # 在指令的追蹤編號下執行，致動器的 span 都會帶著同一個編號
+            with tracing.use_trace(record["trace_id"]):
+                tracing.add_span("CommandWorker.queue_wait", record["_submitted_ns"], time.perf_counter_ns(), id=cmd_id)
+                previous = self.outcome() if self.outcome is not None else None
+                try:
+                    with tracing.span("CommandWorker.execute", id=cmd_id, command=command_data.get("Command")):
+                        msg = self.execute(command_data)
+                    state = "done"
+                except Exception as e:
+                    msg = f"指令執行失敗: {e}"
+                    state = "error"
+                    print(f"[CommandWorker] 指令 {cmd_id} 執行失敗，原因: {e}")
+                # 執行後換了新的動作代碼才是這筆指令驅動的 (連接、叫站等不動致動器的指令沒有)
+                actuation = self.outcome() if self.outcome is not None else None
+
+            with self.cond:
+                record["state"] = state
+                record["msg"] = msg
+                record["_finished"] = time.monotonic()
+                record["_actuation"] = actuation if actuation is not previous else None
+
+
+class CommandWatchdog:
+    """
+    以 monotonic 時鐘計時的指令看門狗，取代每 3 秒重跑一次指令的 control_loop。
+    最後一筆指令逾時時剛好在期限送一次空俥；需要週期重算的指令 (例如 701 航向保持)
+    依 refresh_periods 各自的頻率重送，其他穩態指令不會重複驅動硬體。
+    """
+
+    def __init__(self, on_timeout, on_refresh, timeout=60, refresh_periods=None):
+        self.on_timeout = on_timeout  # 逾時時呼叫 on_timeout()
+        self.on_refresh = on_refresh  # 週期重算時呼叫 on_refresh(command)
+        self.timeout = timeout  # 指令逾時秒數
+        self.refresh_periods = refresh_periods or {}  # {指令代碼: 重算週期秒數}
+        self.cond = threading.Condition()
+        self.command = None
+        self.deadline = None
+        self.next_refresh = None
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def kick(self, command):
+        # 收到新指令：重設逾時期限與週期重算時間
+        with self.cond:
+            now = time.monotonic()
+            self.command = command
+            self.deadline = now + self.timeout
+            period = self.refresh_periods.get(command)
+            self.next_refresh = now + period if period else None
+            self.cond.notify()
+
+    def _next_due(self):
+        due = [t for t in (self.deadline, self.next_refresh) if t is not None]
+        return min(due) if due else None
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while True:
+                    due = self._next_due()
+                    now = time.monotonic()
+                    if due is not None and due <= now:
+                        break
+                    self.cond.wait(None if due is None else due - now)
+
+                if self.deadline is not None and self.deadline <= now:
+                    # 逾時只處理一次，直到下一筆指令才重新計時
+                    self.deadline = None
+                    self.next_refresh = None
+                    action, command = "timeout", self.command
+                else:
+                    period = self.refresh_periods[self.command]
+                    # 固定節拍；落後太多就從現在重新起算，不補送
+                    self.next_refresh = max(self.next_refresh + period, now)
+                    action, command = "refresh", self.command
+
+            try:
+                if action == "timeout":
+                    print(f"[CommandWatchdog] 指令 {command} 逾時 {self.timeout} 秒，回空俥")
+                    self.on_timeout()
+                else:
+                    self.on_refresh(command)
+            except Exception as e:
+                print(f"[CommandWatchdog] {action} 處理失敗，原因: {e}")
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import socket
+import socketserver
+import threading
+
+
+# 精簡指令欄位：搖桿送短欄位名稱，伺服器還原成 /control 的欄位
+FRAME_KEYS = {
+    "c": "Command",
+    "s": "Speed",
+    "r": "Range",
+    "ls": "Left_Speed",
+    "lr": "Left_Rudder",
+    "rs": "Right_Speed",
+    "rr": "Right_Rudder",
+    "h": "Current_heading",
+}
+FRAME_NAMES = {name: key for key, name in FRAME_KEYS.items()}
+
+
+def encode_frame(command_data):
+    # /control 格式 -> 一行精簡 JSON
+    frame = {FRAME_NAMES.get(key, key): value for key, value in command_data.items()}
+    return (json.dumps(frame, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def decode_frame(line):
+    # 一行精簡 JSON -> /control 格式
+    frame = json.loads(line)
+    return {FRAME_KEYS.get(key, key): value for key, value in frame.items()}
+
+
+class _ChannelHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        channel = self.server.channel
+        write_lock = threading.Lock()
+        closed = threading.Event()
+
+        def send(message):
+            data = (json.dumps(message, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+            with write_lock:
+                self.wfile.write(data)
+                self.wfile.flush()
+
+        pusher = threading.Thread(target=channel.push_loop, args=(send, closed), daemon=True)
+        pusher.start()
+        print(f"[ControlChannel] 搖桿已連線 {self.client_address}")
+        try:
+            for line in self.rfile:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    command_data = decode_frame(line)
+                    if "Command" not in command_data:
+                        raise ValueError("缺少 Command")
+                    command, cmd_id = channel.submit(command_data, source="channel")
+                    send({"t": "ack", "id": cmd_id, "c": command["Command"]})
+                except Exception as e:
+                    send({"t": "err", "msg": str(e)})
+        except (ConnectionError, OSError) as e:
+            print(f"[ControlChannel] 連線中斷 {self.client_address}: {e}")
+        finally:
+            closed.set()
+            print(f"[ControlChannel] 搖桿已斷線 {self.client_address}")
+
+
+class _ChannelServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ControlChannelServer:
+    """
+    搖桿用的常駐控制通道 (TCP，每行一個精簡 JSON)。
+    搖桿送指令 -> 回 ack 與指令編號；燈號 (rawdata) 一有變化就主動推回搖桿，
+    取代每 0.5 秒一次的 POST /control + GET /status。
+    """
+
+    def __init__(self, submit, telemetry, host="0.0.0.0", port=5900):
+        self.submit = submit  # submit(command_data, source) -> (指令內容, 指令編號)
+        self.telemetry = telemetry
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        self.server = _ChannelServer((self.host, self.port), _ChannelHandler)
+        self.server.channel = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"[ControlChannel] 控制通道監聽 {self.host}:{self.port}")
+        return self.thread
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def push_loop(self, send, closed):
+        # 只在燈號來源 (lever) 有變化時推送，連線一建立先推一次目前值
+        last = None
+        version = None
+        while not closed.is_set():
+            snapshot = self.telemetry.wait_for_change(version, timeout=1.0)
+            version = snapshot.version
+            leds = snapshot.data.get("lever")
+            if leds is None or leds is last:
+                continue
+            last = leds
+            try:
+                send({"t": "led", "v": version, "d": dict(leds)})
+            except (ConnectionError, OSError):
+                return
+
+
+class ControlChannelClient:
+    """
+    搖桿端的 asyncio 控制通道，送指令不會卡住 CAN 讀取。
+    on_leds(rawdata) 在伺服器推送燈號時呼叫。
+    """
+
+    def __init__(self, host="127.0.0.1", port=5900, on_leds=None, retry=1.0):
+        self.host = host
+        self.port = port
+        self.on_leds = on_leds
+        self.retry = retry  # 斷線後幾秒重連
+        self.reader = None
+        self.writer = None
+
+    @property
+    def connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def send(self, command_data):
+        # 沒有連線就直接丟棄，下一輪會送最新指令
+        if not self.connected:
+            return False
+        try:
+            self.writer.write(encode_frame(command_data))
+            await self.writer.drain()
+            return True
+        except (ConnectionError, OSError) as e:
+            print(f"[ControlChannel] 指令發送失敗: {e}")
+            self.writer.close()
+            return False
+
+    async def run(self):
+        # 持續維持連線並接收伺服器推送
+        while True:
+            try:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                print(f"[ControlChannel] 已連線 {self.host}:{self.port}")
+                while True:
+                    line = await self.reader.readline()
+                    if not line:
+                        break
+                    if not line.strip():
+                        continue
+                    try:
+                        message = json.loads(line)
+                    except ValueError as e:
+                        # 收到壞掉的一行只略過，不中斷連線
+                        print(f"[ControlChannel] 伺服器訊息格式錯誤，略過: {e}")
+                        continue
+                    self._handle(message)
+            except (ConnectionError, OSError) as e:
+                print(f"[ControlChannel] 連線失敗: {e}，{self.retry} 秒後重連")
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+            await asyncio.sleep(self.retry)
+
+    def _handle(self, message):
+        kind = message.get("t")
+        if kind == "led":
+            if self.on_leds is not None:
+                self.on_leds(message["d"])
+        elif kind == "err":
+            print(f"[ControlChannel] 伺服器回報錯誤: {message.get('msg')}")
@@ -5,17 +5,26 @@ import threading
 from boatcontroller import Cal_Rudder_Engine 
 import math
 from filepath import fileControl
+from telemetry import TelemetryHub
+from actuation import ActuationGroup
+from metrics import DECISION_SECONDS
+import tracing
 class ControlSys():
-    def __init__(self, gear_system_port="COM11", rudder_systemEnZero_port='COM12', rudder_systemEnOne_port='COM13'):
-        self.gear_system = LeverSys(port=gear_system_port)
-        self.rudder_systemEnZero = RudderSys(port=rudder_systemEnZero_port,enginID="0")
-        self.rudder_systemEnOne = RudderSys(port=rudder_systemEnOne_port,enginID="1")
+    def __init__(self, gear_system_port="COM11", rudder_systemEnZero_port='COM12', rudder_systemEnOne_port='COM13', telemetry=None):
+        # 三塊板子共用同一個遙測快照 (可由外部傳入，讓 /status 在硬體建立前就能使用)
+        self.telemetry = telemetry if telemetry is not None else TelemetryHub()
+        self.gear_system = LeverSys(port=gear_system_port, telemetry=self.telemetry)
+        self.rudder_systemEnZero = RudderSys(port=rudder_systemEnZero_port,enginID="0", telemetry=self.telemetry)
+        self.rudder_systemEnOne = RudderSys(port=rudder_systemEnOne_port,enginID="1", telemetry=self.telemetry)
         self.autoHeading = Cal_Rudder_Engine()
 
         # # 啟動檢查指令的執行緒
         self.last_command_time = time.time()
         self.current_command = None
         self.file = fileControl()
+        # 各致動器最後一次下達的目標值，與新指令相同就不再驅動硬體
+        self.reset_setpoints()
+        self.last_actuation = ActuationGroup()  # 最近一次動作的完成控制代碼
         # 指令映射：指令代碼對應處理方法
         self.command_map = {
             1: self.Forward,
@@ -65,14 +74,40 @@ class ControlSys():
 
         # 根據 Command 呼叫相應的控制方法
         if Command in self.command_map:
-            msg=self.command_map[Command](**kwargs)
+            start = time.perf_counter()
+            with tracing.span("ControlSys.decision", command=Command):
+                msg=self.command_map[Command](**kwargs)
+            DECISION_SECONDS.observe(time.perf_counter() - start, command=Command)
             return msg
         else:
             msg = "無效指令"
             print(msg)
             return msg
            
+    def pending_steps(self):
+        # 各致動器尚未完成的步數，供指令進度查詢
+        gear = self.gear_system.pending_steps()
+        rudder = {
+            "Engine0": self.rudder_systemEnZero.pending_steps(),
+            "Engine1": self.rudder_systemEnOne.pending_steps(),
+        }
+        total = gear["Engine0"] + gear["Engine1"] + gear["queue"] + rudder["Engine0"] + rudder["Engine1"]
+        return {"total": total, "gear": gear, "rudder": rudder}
+
+    def reset_setpoints(self):
+        # 清除記錄的目標值 (連線、斷線、叫站、校準後實際狀態可能改變，下一筆指令必須重新驅動)
+        self.setpoints = {"gear0": None, "gear1": None, "rudder0": None, "rudder1": None}
+
+    def _setpoint_reached(self, key, setpoint, future):
+        # 目標值相同，且對應的控制任務仍在進行或已成功到達，才算不需要重新驅動
+        if self.setpoints[key] != setpoint or future is None:
+            return False
+        if not future.done():
+            return True
+        return future.exception() is None and future.result() is True
+
     def connected(self, **kwargs):
+        self.reset_setpoints()
         Isconnect1=self.rudder_systemEnZero.open()
         Isconnect2=self.rudder_systemEnOne.open()
         Isconnect3=self.gear_system.open()
@@ -87,52 +122,88 @@ class ControlSys():
             return msg  
 
     def close(self, **kwargs):
-        self.rudder_systemEnZero.rudder_ser = None   
-        self.rudder_systemEnOne.rudder_ser = None   
-        self.gear_system.gear_ser = None 
-        self.gear_system.rawdata = {'NEUTRAL_LED': '0', 'ACTIVE_LED': '0', 'SYNC_LED': '0','LPS_L_vol': '0', 'LPS_R_vol': '0',}
+        self.reset_setpoints()
+        # 關閉串口並從 I/O 執行緒移除，之後 connected() 可以重新打開
+        self.rudder_systemEnZero.close()
+        self.rudder_systemEnOne.close()
+        self.gear_system.close()
+        self.gear_system.rawdata.reset()
+        self.gear_system.publish_telemetry()
+        self.rudder_systemEnZero.publish_telemetry()
+        self.rudder_systemEnOne.publish_telemetry()
         msg = "斷開連結"
         print(msg)
         return msg
         
 
-    def _control_gear(self, adjusted_gear_left, adjusted_gear_right,range):
-        # 控制兩個發動機的傳動系統，並限制速度在最小最大範圍內
-
+    def _clamp_gear(self, adjusted_gear):
         # 設定進俥與退俥的最小與最大值
-        if -1.46<adjusted_gear_left<0.6: #空俥
-            adjusted_gear_left = -0.42
-        elif adjusted_gear_left > 0:  # 進俥
-            adjusted_gear_left = self._clamp(adjusted_gear_left, 0.62, 5)  # 進俥電壓最小值 0.62
+        if -1.46<adjusted_gear<0.6: #空俥
+            return -0.42
+        elif adjusted_gear > 0:  # 進俥
+            return self._clamp(adjusted_gear, 0.62, 5)  # 進俥電壓最小值 0.62
         else :  # 退俥
-            adjusted_gear_left = self._clamp(adjusted_gear_left, -4, -1.48)  # 退俥電壓最小值 -1.46
-
-        if -1.46<adjusted_gear_right<0.6:#空俥
-            adjusted_gear_right=-0.42
-        elif adjusted_gear_right > 0:  # 進俥
-            adjusted_gear_right = self._clamp(adjusted_gear_right, 0.62, 5)  # 進俥電壓最小值 0.62
-        else:  # 退俥
-            adjusted_gear_right = self._clamp(adjusted_gear_right, -4, -1.48)  # 退俥電壓最小值 -1.46
-
-        range = self._calrange(range)
-
-        # 控制左、右發動機
-        print("控制左、右發動機",adjusted_gear_left,adjusted_gear_right)
-        self.gear_system.controlGear(enginID=0, decision=adjusted_gear_left,range=range)
-        #測試#延遲時間  
-        time.sleep(0.1)
-        self.gear_system.controlGear(enginID=1, decision=adjusted_gear_right,range=range)
-        time.sleep(0.1)
-                # 控制左、右發動機
-        # print("只控制左引擎",adjusted_gear_left,adjusted_gear_right)
-        # self.gear_system.controlGear(enginID=0, decision=adjusted_gear_right,range=range)
-        # time.sleep(0.1)
+            return self._clamp(adjusted_gear, -4, -1.48)  # 退俥電壓最小值 -1.46
+
+    @tracing.traced("ControlSys._control_all")
+    def _control_all(self, adjusted_gear_left, adjusted_gear_right, range, left_rudder, right_rudder):
+        """
+        兩俥兩舵同時動作，回傳涵蓋四個致動器的 ActuationGroup。
+        要改變的致動器以新規劃取代舊規劃 (不阻塞呼叫端)，全部排入後同時放行，
+        左右舷不再依序相差 0.1 秒。值為 None 的致動器不動作。
+        """
+        targets = {}
+        if adjusted_gear_left is not None or adjusted_gear_right is not None:
+            range = self._calrange(range)
+        if adjusted_gear_left is not None:
+            targets["gear0"] = (self._clamp_gear(adjusted_gear_left), range)
+        if adjusted_gear_right is not None:
+            targets["gear1"] = (self._clamp_gear(adjusted_gear_right), range)
+        if left_rudder is not None:
+            targets["rudder0"] = self._clamp(left_rudder, -30, 30)
+        if right_rudder is not None:
+            targets["rudder1"] = self._clamp(right_rudder, -30, 30)
+
+        futures = {
+            "gear0": self.gear_system.control_future(0),
+            "gear1": self.gear_system.control_future(1),
+            "rudder0": self.rudder_systemEnZero.control_thread,
+            "rudder1": self.rudder_systemEnOne.control_thread,
+        }
+        # 只驅動目標值有變化的致動器，重複的指令直接略過
+        changed = [key for key, setpoint in targets.items() if not self._setpoint_reached(key, setpoint, futures[key])]
+        group = ActuationGroup(futures)
+        if not changed:
+            self.last_actuation = group
+            return group
+
+        if "gear0" in changed or "gear1" in changed:
+            print("控制左、右發動機", targets.get("gear0"), targets.get("gear1"))
+        # 新規劃直接取代各致動器剩下的步驟 (不等舊規劃結束)，全部排入後才放行，四個致動器同時開始
+        try:
+            for key in changed:
+                setpoint = targets[key]
+                if key == "gear0":
+                    futures[key] = self.gear_system.controlGear(enginID=0, decision=setpoint[0], range=setpoint[1], start_event=group.started)
+                elif key == "gear1":
+                    futures[key] = self.gear_system.controlGear(enginID=1, decision=setpoint[0], range=setpoint[1], start_event=group.started)
+                elif key == "rudder0":
+                    futures[key] = self.rudder_systemEnZero.controlRudder(decision=setpoint, start_event=group.started)
+                else:
+                    futures[key] = self.rudder_systemEnOne.controlRudder(decision=setpoint, start_event=group.started)
+                self.setpoints[key] = setpoint
+        finally:
+            group.futures.update(futures)
+            group.release()
+        self.last_actuation = group
+        return group
+
+    def _control_gear(self, adjusted_gear_left, adjusted_gear_right,range):
+        # 控制兩個發動機的傳動系統，並限制速度在最小最大範圍內
+        return self._control_all(adjusted_gear_left, adjusted_gear_right, range, None, None)
 
     def _control_rudder(self, left_rudder, right_rudder):
-        left_rudder = self._clamp(left_rudder, -30, 30)
-        right_rudder = self._clamp(right_rudder, -30, 30)
-        self.rudder_systemEnZero.controlRudder(decision=left_rudder)
-        self.rudder_systemEnOne.controlRudder(decision=right_rudder)
+        return self._control_all(None, None, None, left_rudder, right_rudder)
 
     def _clamp(self, value, min_value, max_value):
         # 確保值在給定的範圍內
@@ -154,8 +225,7 @@ class ControlSys():
         Gear = kwargs.get('Speed', -0.42)
         Range = kwargs.get('Range', 0.01)
         forwordval = Gear
-        self._control_gear(forwordval, forwordval,Range)
-        self._control_rudder(0, 0)
+        self._control_all(forwordval, forwordval, Range, 0, 0)
         msg = "前進"
         print(msg)
         return msg
@@ -166,8 +236,7 @@ class ControlSys():
         Gear = kwargs.get('Speed', -0.42)
         Range = kwargs.get('Range', 0.01)
         backval=-1.98 - 1 * (Gear - 1)
-        self._control_gear(backval, backval,Range)
-        self._control_rudder(0, 0)
+        self._control_all(backval, backval, Range, 0, 0)
         msg = "後退"
         print(msg)
         return msg
@@ -178,8 +247,7 @@ class ControlSys():
         forwordval = Gear
         Range = kwargs.get('Range', 0.01)
         # backval=-1.98 - 1 * (Gear - 1)
-        self._control_gear(forwordval, forwordval,Range)
-        self._control_rudder(0, 10)
+        self._control_all(forwordval, forwordval, Range, 0, 10)
         msg = "右上"
         print(msg)
         return msg
@@ -189,8 +257,7 @@ class ControlSys():
         forwordval = Gear
         Range = kwargs.get('Range', 0.01)
         # backval=-1.98 - 1 * (Gear - 1)
-        self._control_gear(forwordval, forwordval,Range)
-        self._control_rudder(20, 20)
+        self._control_all(forwordval, forwordval, Range, 20, 20)
         msg = "右邊"
         print(msg)
         return msg
@@ -200,8 +267,7 @@ class ControlSys():
         forwordval = Gear
         Range = kwargs.get('Range', 0.01)
         # backval=-1.98 - 1 * (Gear - 1)
-        self._control_gear(forwordval, forwordval,Range)
-        self._control_rudder(25, 25)  
+        self._control_all(forwordval, forwordval, Range, 25, 25)  
         msg = "右下"
         print(msg)
         return msg
@@ -211,8 +277,7 @@ class ControlSys():
         forwordval = Gear
         Range = kwargs.get('Range', 0.01)
         # backval=-1.98 - 1 * (Gear - 1)
-        self._control_gear(forwordval, forwordval,Range)
-        self._control_rudder(-10, 0)
+        self._control_all(forwordval, forwordval, Range, -10, 0)
         msg = "左上"
         print(msg)
         return msg
@@ -222,8 +287,7 @@ class ControlSys():
         forwordval = Gear
         Range = kwargs.get('Range', 0.01)
         # backval=-1.98 - 1 * (Gear - 1)
-        self._control_gear(forwordval, forwordval,Range)
-        self._control_rudder(-20, -20)
+        self._control_all(forwordval, forwordval, Range, -20, -20)
         msg = "左邊"
         print(msg)
         return msg
@@ -233,16 +297,14 @@ class ControlSys():
         forwordval = Gear
         Range = kwargs.get('Range', 0.01)
         # backval=-1.98 - 1* (Gear - 1)
-        self._control_gear(forwordval, forwordval,Range)
-        self._control_rudder(-25, -25)
+        self._control_all(forwordval, forwordval, Range, -25, -25)
         msg = "左下"
         print(msg)
         return msg
     def Stop(self, **kwargs):
         # 空俥
         # self._control_gear(-0.42, -0.42)
-        self.Neutral()
-        self._control_rudder(0, 0)
+        self.Neutral(left_rudder=0, right_rudder=0)
         msg = "空俥"
         print(msg)
         return msg
@@ -253,8 +315,7 @@ class ControlSys():
         forwordval = Gear
         backval=-1.98 - 1* (Gear - 1)
         Range = kwargs.get('Range', 0.01)
-        self._control_gear(forwordval, backval,Range)
-        self._control_rudder(20, -20)
+        self._control_all(forwordval, backval, Range, 20, -20)
         msg = "順時針"
         print(msg)
         return msg
@@ -265,8 +326,7 @@ class ControlSys():
         forwordval = Gear
         Range = kwargs.get('Range', 0.01)
         backval=-1.98 - 1* (Gear - 1)
-        self._control_gear(backval, forwordval,Range)
-        self._control_rudder(20, -20)
+        self._control_all(backval, forwordval, Range, 20, -20)
         msg = "逆時針"
         print(msg)
         return msg
@@ -277,8 +337,7 @@ class ControlSys():
         ratio = 1.25
         forwordval = ratio * Gear
         backval=-1.98 - (Gear - 1)
-        self._control_gear(forwordval,backval,Range)
-        self._control_rudder(-20, 30)
+        self._control_all(forwordval,backval, Range, -20, 30)
         msg = "右上平移"
         print(msg)
         return msg
@@ -289,8 +348,7 @@ class ControlSys():
         ratio = 1.4
         forwordval = Gear
         backval=-1.98 - ratio * (Gear - 1)
-        self._control_gear(forwordval,backval,Range)
-        self._control_rudder(-25, 25)
+        self._control_all(forwordval,backval, Range, -25, 25)
         msg = "右平移"
         print(msg)
         return msg
@@ -301,8 +359,7 @@ class ControlSys():
         ratio = 1.8
         forwordval = Gear
         backval=-1.98 - ratio * (Gear - 1)
-        self._control_gear(forwordval,backval,Range)
-        self._control_rudder(-30, 30) 
+        self._control_all(forwordval,backval, Range, -30, 30) 
         msg = "右下平移"
         print(msg)
         return msg
@@ -318,8 +375,7 @@ class ControlSys():
         ratio = 1.25
         forwordval = ratio *Gear
         backval=-1.98 -  (Gear - 1)
-        self._control_gear(backval,forwordval,Range)
-        self._control_rudder(-30, 20)
+        self._control_all(backval,forwordval, Range, -30, 20)
         msg = "左上平移"
         print(msg)
         return msg
@@ -336,8 +392,7 @@ class ControlSys():
         ratio = 1.4
         forwordval = Gear
         backval=-1.98 - ratio * (Gear - 1)
-        self._control_gear(backval,forwordval,Range)
-        self._control_rudder(-25, 25)
+        self._control_all(backval,forwordval, Range, -25, 25)
         msg = "左平移"
         print(msg)
         return msg
@@ -355,8 +410,7 @@ class ControlSys():
         ratio = 1.8
         forwordval = Gear
         backval=-1.98 - ratio * (Gear - 1)
-        self._control_gear(backval,forwordval,Range)
-        self._control_rudder(-30, 30)
+        self._control_all(backval,forwordval, Range, -30, 30)
         msg = "左下平移"
         print(msg)
         return msg
@@ -366,8 +420,7 @@ class ControlSys():
         Gear = kwargs.get('Speed', -0.42)
         Range = kwargs.get('Range', 0.01)
         backval=-1.98 - 1 * (Gear - 1)
-        self._control_gear(backval, backval,Range)
-        self._control_rudder(-25, -25)
+        self._control_all(backval, backval, Range, -25, -25)
         msg = "左下後退"
         print(msg)
         return msg
@@ -377,8 +430,7 @@ class ControlSys():
         Gear = kwargs.get('Speed', -0.42)
         Range = kwargs.get('Range', 0.01)
         backval=-1.98 - 1 * (Gear - 1)
-        self._control_gear(backval, backval,Range)
-        self._control_rudder(25, 25)
+        self._control_all(backval, backval, Range, 25, 25)
         msg = "右下後退"
         print(msg)
         return msg
@@ -396,8 +448,7 @@ class ControlSys():
             Left_Speed = Left_Speed - 0.98
         if Right_Speed < -0.42:
             Right_Speed = Right_Speed - 0.98
-        self._control_gear(Left_Speed, Right_Speed, Range)
-        self._control_rudder(Left_Rudder, Right_Rudder)
+        self._control_all(Left_Speed, Right_Speed, Range, Left_Rudder, Right_Rudder)
         msg = "精密控制成功"
         print(msg)
         return msg
@@ -429,27 +480,20 @@ class ControlSys():
         self.autoHeading.last_time = time.time()
         # 計算引擎輸出（維持一定前進速度）
         
-        # # 控制舵角
-        self._control_rudder(rudder_angle, rudder_angle)  # 雙舵同步控制
-
-        # # 控制發動機
-        self._control_gear(engine_power, engine_power, range=range)
+        # # 控制舵角與發動機 (雙舵同步控制)
+        self._control_all(engine_power, engine_power, range, rudder_angle, rudder_angle)
         msg = f"航向保持: 目標航向 {target_heading:.2f}° 偏航誤差 {yaw_error:.2f}° 舵角 {rudder_angle}° 引擎功率 {engine_power:.2f}"
         print(msg)
         return msg
 
     def Callstation(self, **kwargs):
         # 叫站
-        try:
-            systemEnZero_RudderFeedback=int(self.rudder_systemEnZero.rawdata['RudderFeedback'])
-            systemEnOne_RudderFeedback=int(self.rudder_systemEnOne.rawdata['RudderFeedback'])
-        except:
-            print("叫站時，舵角值獲取錯誤，請檢查現在舵角資訊")
-            systemEnZero_RudderFeedback=0
-            systemEnOne_RudderFeedback=0    
+        # rawdata 收到時已轉成 int，無法解析的回報不會寫入
+        systemEnZero_RudderFeedback=self.rudder_systemEnZero.rawdata.RudderFeedback
+        systemEnOne_RudderFeedback=self.rudder_systemEnOne.rawdata.RudderFeedback
 
-        
-        if systemEnZero_RudderFeedback != 0: 
+        # 回授模式的舵角隨時以回授同步，不需要在這裡校準
+        if systemEnZero_RudderFeedback != 0 and not self.rudder_systemEnZero.feedback_active(): 
             if systemEnZero_RudderFeedback >0:
                 systemEnZero_RudderFeedback = systemEnZero_RudderFeedback + 1
             elif  systemEnZero_RudderFeedback<0:
@@ -457,13 +501,14 @@ class ControlSys():
             self.rudder_systemEnZero.Adjustment(adjVal=systemEnZero_RudderFeedback)
             time.sleep(0.03)
 
-        if systemEnOne_RudderFeedback !=0:
+        if systemEnOne_RudderFeedback !=0 and not self.rudder_systemEnOne.feedback_active():
             if systemEnOne_RudderFeedback >0:
                 systemEnOne_RudderFeedback = systemEnOne_RudderFeedback + 1
             elif  systemEnOne_RudderFeedback<0:
                 systemEnOne_RudderFeedback = systemEnOne_RudderFeedback - 1
             self.rudder_systemEnOne.Adjustment(adjVal=systemEnOne_RudderFeedback)
             
+        self.reset_setpoints()
         Iscall=self.gear_system.call()
         if Iscall:
             msg = "叫站成功"
@@ -473,13 +518,11 @@ class ControlSys():
             msg = "叫站失敗"
             print(msg)
             return msg
-    def Neutral(self):
-        # 強制空俥
+    def Neutral(self, left_rudder=None, right_rudder=None):
+        # 強制空俥 (安全指令)：每次都送出兩俥空俥，不做目標值比對；舵角照常只在有變化時動作
         self.gear_system.neutral()
-        self.gear_system.controlGear(enginID=0, decision=-0.42)
-        #測試#延遲時間
-        time.sleep(0.08)
-        self.gear_system.controlGear(enginID=1, decision=-0.42)
+        self.setpoints["gear0"] = self.setpoints["gear1"] = (-0.42, 0.01)
+        return self._control_all(None, None, None, left_rudder, right_rudder)
         # msg = "兩俥進空俥"
         # print(msg)
         # return msg        
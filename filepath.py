@@ -4,6 +4,7 @@ import json
 import time
 import csv
 from threading import Lock
+from metrics import FILE_FLUSH_SECONDS
 
 class fileControl:
     def __init__(self):
@@ -45,6 +46,7 @@ class fileControl:
         if filename not in self.buffers or not self.buffers[filename]:
             return  # 沒有緩衝資料則跳過
 
+        start = time.perf_counter()
         name = filename.split("/")
         filepath = filename[:-len(name[-1])]
         self.addfolder(filepath)
@@ -59,6 +61,7 @@ class fileControl:
 
         self.buffers[filename].clear()  # 清空該檔案的緩衝區
         self.open_files[filename] = f  # 儲存開啟的檔案以便關閉
+        FILE_FLUSH_SECONDS.observe(time.perf_counter() - start, folder=filepath)
 
     # 關閉所有開啟的檔案，確保緩衝區寫入
     def close(self):
@@ -4,6 +4,7 @@ import serial_asyncio
 import time
 import requests
 import json
+from streamclient import StatusStream
 class JoystickSys:
     def __init__(self, port, baudrate=9600, timeout=1):
         # self.ControlSys=ControlSys(gear_system_port="COM11", rudder_systemEnZero_port='COM12', rudder_systemEnOne_port='COM13')
@@ -30,6 +31,8 @@ class JoystickSys:
         }
         # **最新的指令狀態**
         self.latest_command = None
+        # 訂閱伺服器狀態串流，燈號由串流即時更新
+        self.status_stream = StatusStream(on_update=self._on_status)
     async def open(self):
         """ 使用 asyncio 開啟 Serial 連線 """
         try:
@@ -98,19 +101,9 @@ class JoystickSys:
             print(f"請求失敗，狀態碼：{response.status_code}")
             print("錯誤訊息：", response.text)
 
-        self.update_data()
-    def update_data(self):
-
-        url = "http://127.0.0.1:5899/status"
-        response = requests.get(url)
-        
-        # 檢查回應狀態碼和內容
-        if response.status_code == 200:
-            self.joystickstate = response.json()["Voltage"]["rawdata"]
-            # print("伺服器回應：", json.dumps(response.json(), ensure_ascii=False))
-        else:
-            print(f"請求失敗，狀態碼：{response.status_code}")
-            print("錯誤訊息：", response.text)
+    def _on_status(self, status):
+        # /stream 推送的最新狀態
+        self.joystickstate = status["Voltage"]["rawdata"]
     async def read_and_process_serial_data(self):
         """ 同時讀取 Serial 資料並立即處理 """
         while True:
@@ -344,6 +337,7 @@ class JoystickSys:
     async def main_loop(self):
         """ 主循環，確保程式一直運行 """
         await self.open()
+        self.status_stream.start()
         
         # **確保所有任務持續運行**
         await asyncio.gather(
@@ -2,74 +2,95 @@ import serial
 import threading
 from filepath import fileControl
 import time
-from concurrent.futures import ThreadPoolExecutor
 from nemadict import customNemaJson
-import queue
+from serialreader import SerialLineReader
+from telemetry import TelemetryHub, FieldNotifier, record_type
+import tracing
+from commandqueue import BoardCommandQueue, PRIORITY_NAMES
+import pacing as pacing_profile
+import reactor as serial_reactor
+import stepplan
+from stepplan import Step
+from metrics import (
+    GEAR_COMMANDS_CANCELLED_TOTAL,
+    GEAR_QUEUE_DEPTH,
+    GEAR_QUEUE_WAIT_SECONDS,
+    GEAR_WRITE_SECONDS,
+    SERIAL_LINES_TOTAL,
+    SERIAL_PARSE_FAILURES_TOTAL,
+)
+
+
+# 控制板回報：燈號 (0/1) 與兩俥實際電壓 (mV)
+LeverRecord = record_type(
+    "LeverRecord",
+    (
+        ("NEUTRAL_LED", int, 0),
+        ("ACTIVE_LED", int, 0),
+        ("SYNC_LED", int, 0),
+        ("LPS_L_vol", int, 0),
+        ("LPS_R_vol", int, 0),
+    ),
+)
+
+# 引擎回報 (EngRap、TransPar)；TransPar 的 DiscreteStatus1 沒有用到，留在 extra
+EngineRecord = record_type(
+    "EngineRecord",
+    (
+        ("EngineInstance", int, 0),
+        ("EngineSpeed", float, 0),
+        ("EngineBoostPressure", float, 0),
+        ("EngineTiltTrim", float, 0),
+        ("TransmissionGear", int, 0),
+        ("OilPressure", float, 0),
+        ("OilTemperature", float, 0),
+        ("DiscreteStatus", int, 0),
+    ),
+)
 
 
 class LeverSys:
-    def __init__(self, port, baudrate=9600, timeout=1):
+    def __init__(self, port, baudrate=9600, timeout=1, telemetry=None, pacing=None, reactor=None, sequencer=None):
         self.port = port
+        # 接收與送指令都交給共用的 I/O 執行緒 (reactor.REACTOR)
+        self.reactor = reactor if reactor is not None else serial_reactor.REACTOR
+        # 換檔與速度的動作規劃由共用的排程器執行 (stepplan.SEQUENCER)
+        self.sequencer = sequencer if sequencer is not None else stepplan.SEQUENCER
+        # 指令送出間隔設定 (每個串口、每類指令)，預設共用 pacing.PROFILE
+        self.pacing = pacing if pacing is not None else pacing_profile.PROFILE
         self.baudrate = baudrate
         self.timeout = timeout
         self.gear_ser = None
+        self.reader = None  # 串口逐行讀取器，跟著 gear_ser 建立
         self.file = fileControl()
         self.filename = (
             "01_Data/03_LeverSys/" + str(self.file.timestr(timstr="d")) + ".csv"
         )
-        self.rawdata = {
-            "NEUTRAL_LED": "0",
-            "ACTIVE_LED": "0",
-            "SYNC_LED": "0",
-            "LPS_L_vol": "0",
-            "LPS_R_vol": "0",
-        }
+        self.fields = FieldNotifier()  # rawdata 欄位更新通知 (電壓、燈號)
+        self.rawdata = LeverRecord()
         # 左引擎預設
         self.left_curvoltval = 2.710  # 初始電壓
         self.left_decision = 0  # 初始決策值
-        self.rawdata0 = {
-            "EngineInstance": "0",
-            "EngineSpeed": "0",
-            "EngineBoostPressure": "0",
-            "EngineTiltTrim": "0",
-            "TransmissionGear": "0",
-            "OilPressure": "0",
-            "OilTemperature": "0",
-            "DiscreteStatus": "0",
-        }
+        self.rawdata0 = EngineRecord()
         self.left_gear_status = "neutral"
+        self.left_steps_left = 0  # 尚未送出的速度步數
 
         # 右引擎預設
         self.right_curvoltval = 2.710
         self.right_decision = 0
-        self.rawdata1 = {
-            "EngineInstance": "1",
-            "EngineSpeed": "0",
-            "EngineBoostPressure": "0",
-            "EngineTiltTrim": "0",
-            "TransmissionGear": "0",
-            "OilPressure": "0",
-            "OilTemperature": "0",
-            "DiscreteStatus": "0",
-        }
+        self.rawdata1 = EngineRecord()
+        self.rawdata1.update({"EngineInstance": "1"})
         self.right_gear_status = "neutral"
-        # 保護機制
-        self.left_executor = ThreadPoolExecutor(max_workers=1)
-        self.right_executor = ThreadPoolExecutor(max_workers=1)
+        self.right_steps_left = 0
+        # 保護機制 (兩俥目前規劃的 Future)
         self.left_control_thread = None
         self.right_control_thread = None
-        self.left_stop_event = threading.Event()  # 左引擎的停止事件
-        self.right_stop_event = threading.Event()  # 右引擎的停止事件
         self.left_lock = threading.Lock()
         self.right_lock = threading.Lock()
-        # 用於接收數據的線程池
-        self.receive_executor = ThreadPoolExecutor(max_workers=1)
-        self.receive_stop_event = threading.Event()
         self.receiveTime = time.time()
-        # 使用佇列
-        self.command_queue = queue.Queue()
-        self.command_thread = threading.Thread(target=self._process_queue, daemon=True)
-        self.command_thread.start()
+        # 板子指令優先佇列：空檔/叫站 > 換檔 > 步進，由 I/O 執行緒依間隔送出
+        self.command_queue = BoardCommandQueue()
+        self.feedback_stepping = True  # 電壓步進依板子回報的實際電壓確認 (False 則每步固定等 0.8 秒)
         # 指令對應表
         self.commands = {
             "LPS_L_ACC": "左俥加速",
@@ -95,14 +116,18 @@ class LeverSys:
             "LPS_L_Reverse": "左俥退檔",
             "LPS_R_Reverse": "右俥退檔",
         }
+        # 遙測快照：接收執行緒發布，/status 直接讀取
+        self.telemetry = telemetry if telemetry is not None else TelemetryHub()
+        self.publish_telemetry()
 
-    def open(self):
+    def open(self, ser=None):
+        # ser: 已建立的串口物件 (例如 boardemulator 的模擬板子)，不給則開啟實體串口
         try:
             if self.gear_ser is not None:
                 print(f"串口 {self.port} 已經打開")
                 return True
             else:
-                self.gear_ser = serial.Serial(
+                self.gear_ser = ser if ser is not None else serial.Serial(
                     port=self.port,
                     baudrate=self.baudrate,
                     timeout=self.timeout,
@@ -111,8 +136,10 @@ class LeverSys:
                     bytesize=serial.EIGHTBITS,
                 )
                 if self.gear_ser.is_open:
-                    # 開始接收值
-                    self.receive_executor.submit(self._receive_data_loop)
+                    # 開始接收值 (I/O 執行緒在有資料時呼叫) 與依間隔送出佇列中的指令
+                    self.reactor.add_reader(self.gear_ser, self._process_receive_data)
+                    self.reactor.add_writer(self, self._process_queue)
+                    self._publish_state()
                     print(f"串口 {self.port} 打開")
                     return True
 
@@ -135,72 +162,88 @@ class LeverSys:
             return False
 
     def close(self):
+        # 先停止 I/O 執行緒的接收與送出，再放掉串口 (之後可以重新 open)
+        self.reactor.remove_writer(self)
+        self._clear_command_queue()
+        if self.gear_ser is not None:
+            self.reactor.remove_reader(self.gear_ser)
         if self.gear_ser and self.gear_ser.is_open:
             self.gear_ser.close()
             print(f"串口 {self.port} 已關閉")
-
-        if not self.receive_executor._shutdown:
-            self.receive_stop_event.set()
-            self.receive_executor.shutdown(wait=True)
-
-        if not self.left_executor._shutdown:
-            self.left_executor.shutdown(wait=True)
-
-        if not self.right_executor._shutdown:
-            self.right_executor.shutdown(wait=True)
-
+        self.gear_ser = None
+        self._publish_state()
+        self.shutdown()
         return True
 
     def send_board_command(self, command_key):
         """
         原本這裡直接呼叫 gear_ser.write()
-        現在改成：把指令 key 放進佇列，讓 _process_queue() 統一發送。
+        現在改成：把指令 key 放進優先佇列，讓 _process_queue() 統一發送。
+        空檔指令會插到最前面，並取消同一俥還沒送出的換檔與步進。
         """
-        self.command_queue.put(command_key)
+        # 佇列記錄排入時間與追蹤編號，用來量測在佇列中等待多久並串起追蹤
+        cancelled = self.command_queue.put(command_key, tracing.current_trace.get())
+        if cancelled:
+            GEAR_COMMANDS_CANCELLED_TOTAL.inc(cancelled, port=self.port, engine=command_key[4])
+        GEAR_QUEUE_DEPTH.set(self.command_queue.qsize(), port=self.port)
+        self.reactor.wake()
         # print("333333333333333查看現在有多少佇列", list(self.command_queue))
 
     def _process_queue(self):
         """
-        負責從佇列取出指令字串，然後真正呼叫 gear_ser.write()。
+        由 I/O 執行緒呼叫：從佇列取出優先順序最高的一筆指令並呼叫 gear_ser.write()。
+        回傳這類指令的送出間隔 (秒)，I/O 執行緒在間隔後才會再呼叫；佇列為空回傳 None。
         """
-        while True:
-            command_key = self.command_queue.get()  # 取出指令
-            try:
-                if self.gear_ser is not None:
-                    cmd_bytes = command_key.encode("utf-8")
-                    self.gear_ser.write(cmd_bytes)
-                    time.sleep(0.25)
-                    print(f"[_process_queue] 已發送指令: {command_key}")
-                else:
-                    print(f"[_process_queue] 串口未開啟, 暫無法送: {command_key}")
-            except Exception as e:
-                # 如果在發送過程中出錯，可以視需求做錯誤處理
-                print(f"[_process_queue] 指令 {command_key} 發送失敗，原因: {e}")
-                self.file.writefile(
-                    "01_Data/99_Error/LeverSys/"
-                    + str(self.file.timestr(timstr="d"))
-                    + ".csv",
-                    str(e),
-                    method="csv",
-                )
-                self.file.flush_buffer(
-                    "01_Data/99_Error/LeverSys/"
-                    + str(self.file.timestr(timstr="d"))
-                    + ".csv",
-                    method="csv",
-                )
-            finally:
-                self.command_queue.task_done()
+        item = self.command_queue.get(timeout=0)
+        if item is None:
+            return None
+        command_key, priority, enqueued_at, trace_id = item
+        dequeued_at = time.perf_counter_ns()
+        GEAR_QUEUE_WAIT_SECONDS.observe(
+            (dequeued_at - enqueued_at) / 1e9, port=self.port, priority=PRIORITY_NAMES[priority]
+        )
+        GEAR_QUEUE_DEPTH.set(self.command_queue.qsize(), port=self.port)
+        try:
+            if self.gear_ser is not None:
+                cmd_bytes = command_key.encode("utf-8")
+                with tracing.use_trace(trace_id):
+                    tracing.add_span("LeverSys.queue_wait", enqueued_at, dequeued_at, command=command_key)
+                    write_start = time.perf_counter()
+                    with tracing.span("LeverSys.serial_write", command=command_key):
+                        self.gear_ser.write(cmd_bytes)
+                    GEAR_WRITE_SECONDS.observe(time.perf_counter() - write_start, port=self.port)
+                print(f"[_process_queue] 已發送指令: {command_key}")
+            else:
+                print(f"[_process_queue] 串口未開啟, 暫無法送: {command_key}")
+        except Exception as e:
+            # 如果在發送過程中出錯，可以視需求做錯誤處理
+            print(f"[_process_queue] 指令 {command_key} 發送失敗，原因: {e}")
+            self.file.writefile(
+                "01_Data/99_Error/LeverSys/"
+                + str(self.file.timestr(timstr="d"))
+                + ".csv",
+                str(e),
+                method="csv",
+            )
+            self.file.flush_buffer(
+                "01_Data/99_Error/LeverSys/"
+                + str(self.file.timestr(timstr="d"))
+                + ".csv",
+                method="csv",
+            )
+        return self.pacing.gap(self.port, PRIORITY_NAMES[priority])
 
-    def _clear_command_queue(self):
+    def _clear_command_queue(self, enginID=None):
         """
-        使用安全循環清空所有指令。
+        取消還沒送出的指令：指定 enginID 只取消該俥，None 則全部取消。
+        與寫入執行緒在同一把鎖內完成，不會清到一半。
         """
-        while not self.command_queue.empty():
-            try:
-                self.command_queue.get_nowait()
-            except queue.Empty:
-                break
+        cancelled = self.command_queue.cancel(enginID)
+        if cancelled:
+            GEAR_COMMANDS_CANCELLED_TOTAL.inc(
+                cancelled, port=self.port, engine="all" if enginID is None else ("L" if enginID == 0 else "R")
+            )
+        GEAR_QUEUE_DEPTH.set(self.command_queue.qsize(), port=self.port)
         # print("[動作] 指令佇列已清空")
 
     def Adjustment(self, enginID, adjVal=2.71):
@@ -208,11 +251,13 @@ class LeverSys:
         if enginID == 0:
             self.left_curvoltval = adjVal
             self.left_decision = -2 * adjVal + 5
+            self._publish_state()
             # print(f"[動作] enginID : {enginID} 校準成功，電壓：{adjVal}V")
             return True
         elif enginID == 1:
             self.right_curvoltval = adjVal
             self.right_decision = -2 * adjVal + 5
+            self._publish_state()
             # print(f"[動作] enginID : {enginID} 校準成功，電壓：{adjVal}V")
             return True
         else:
@@ -221,197 +266,150 @@ class LeverSys:
 
     # 單值
     def receive_data(self):
-        # 使用線程池執行 `receive_data` 方法，並持續監聽
-        self.receive_executor.submit(self._process_receive_data)
-
-    # 持續值
-    def _receive_data_loop(self):
-        # 持續執行，直到 `receive_stop_event` 被設置
-        while not self.receive_stop_event.is_set():
-            self._process_receive_data()
+        # 立即讀取並處理一次串口資料 (持續接收由 I/O 執行緒負責)
+        return self._process_receive_data()
 
-    # 接收數據的方法
+    # 接收數據的方法 (I/O 執行緒在串口有資料時呼叫)
     def _process_receive_data(self):
         if self.gear_ser and self.gear_ser.is_open:
             # data = "$EngRap,1,11,22,33"
-            # data = self.gear_ser.read(size)
             # 彥陞調整
+            reader = self._line_reader()
             if time.time() - self.receiveTime > 25:
                 # 每25秒清理一次usb阻塞
                 self.receiveTime = time.time()
                 self.gear_ser.flushInput()
-
-            data = (
-                str(self.gear_ser.readline())
-                .replace("'", "")
-                .replace("b", "")
-                .replace("\\r\\n", "")
-            )
-            # zz = '$Lever,2731,2731'
-            raw = customNemaJson().formatjson(data)
-            if raw is not None:
-                if raw.get("EngineInstance") == "0":
-                    self.rawdata0.update(raw)
-                elif raw.get("EngineInstance") == "1":
-                    self.rawdata1.update(raw)
-                else:
-                    self.rawdata.update(raw)
-                # result = data
-                result = (time.time(), data)
-                self.file.writefile(
-                    "01_Data/01_Receive/LeverSys/"
-                    + str(self.file.timestr(timstr="d"))
-                    + ".csv",
-                    str(result),
-                    method="csv",
-                )
-                return raw
-            else:
-                return False
+                reader.clear()
+
+            # 一次讀完串口上的資料再逐行處理，回傳最後一筆解析成功的資料
+            reader.fill()
+            result = False
+            for line in reader.lines():
+                raw = self._process_line(line)
+                if raw:
+                    result = raw
+            return result
         else:
             # print("串口尚未打開或已關閉")
             return False
 
+    def _line_reader(self):
+        # 串口重新開啟後換新的讀取器，不沿用舊串口的殘留資料
+        if self.reader is None or self.reader.ser is not self.gear_ser:
+            self.reader = SerialLineReader(self.gear_ser)
+        return self.reader
+
+    def _process_line(self, line):
+        # 解析一行資料 (bytes，直接交給解析器) 並更新 rawdata 與遙測
+        # zz = '$Lever,2731,2731'
+        raw = customNemaJson().formatjson(line)
+        SERIAL_LINES_TOTAL.inc(port=self.port)
+        if raw is None:
+            SERIAL_PARSE_FAILURES_TOTAL.inc(port=self.port)
+            return False
+        if raw.get("EngineInstance") == "0":
+            self.rawdata0.update(raw)
+            self.telemetry.publish("lever0", raw)
+        elif raw.get("EngineInstance") == "1":
+            self.rawdata1.update(raw)
+            self.telemetry.publish("lever1", raw)
+        else:
+            # 寫入並喚醒等待電壓/燈號的執行緒
+            self.fields.update(self.rawdata, raw)
+            self.telemetry.publish("lever", raw)
+        # result = data (只有記錄時才把整行轉成文字)
+        result = (time.time(), str(line, "ascii", "replace"))
+        self.file.writefile(
+            "01_Data/01_Receive/LeverSys/"
+            + str(self.file.timestr(timstr="d"))
+            + ".csv",
+            str(result),
+            method="csv",
+        )
+        return raw
+
     def connect(self):
         # 簡易的連結判斷，之後要考慮如果serial斷掉怎麼辦
         return 0 if self.gear_ser is None else 1
 
+    def publish_telemetry(self):
+        # 發布全部遙測資料 (初始化或整批重設 rawdata 時使用)
+        self.telemetry.publish("lever", self.rawdata.as_status())
+        self.telemetry.publish("lever0", self.rawdata0.as_status())
+        self.telemetry.publish("lever1", self.rawdata1.as_status())
+        self._publish_state()
+
+    def _publish_state(self):
+        # 發布連線狀態、計算電壓與檔位
+        self.telemetry.publish(
+            "gear",
+            {
+                "status": self.connect(),
+                "Engine0": self.left_curvoltval,
+                "Engine1": self.right_curvoltval,
+                "Engine0_left_gear_status": self.left_gear_status,
+                "Engine1_right_gear_status": self.right_gear_status,
+            },
+        )
+
     # main決策主要程式入口
-    def controlGear(self, enginID, decision, range=0.01):
+    def controlGear(self, enginID, decision, range=0.01, start_event=None):
+        """
+        以新的動作規劃取代這一俥剩下的步驟後立即返回 (不等舊規劃結束)，回傳規劃的 Future。
+        規劃在開始執行時才依當下的檔位與電壓編譯，由共用的 StepSequencer 在 I/O 執行緒上依期限送出。
+        """
         # print(f"[DEBUG] 嘗試控制 {enginID} 號引擎, 指令: {decision}, range: {range}")
-
-        # print("[DEBUG] left_executor 和 right_executor 仍然活著，提交任務")
-        current_command = (enginID, decision, range)
-        # 中斷當前線程
+        if enginID not in (0, 1):
+            print(f"[動作] enginID : {enginID} 錯誤ID")
+            return None
+        future = self.sequencer.run(
+            (self.port, enginID),
+            [Step(apply=lambda confirmed: self._compile_gear_plan(enginID, decision, range), label="compile")],
+            start_event=start_event,
+            on_cancel=lambda: self._interrupted(enginID),
+        )
         if enginID == 0:
+            self.left_control_thread = future
+        else:
+            self.right_control_thread = future
+        return future
 
-            if (
-                self.left_control_thread is not None
-                and self.left_control_thread.running()
-            ):
-                self.left_stop_event.set()  # 設置停止事件
-                self.left_control_thread.result()  # 等待線程結束
-
-            # 清除中斷標記
-            self.left_stop_event.clear()
-            # 使用線程池執行任務
-            # 檢查 left_executor 狀態
-            try:
-                self.left_control_thread = self.left_executor.submit(
-                    self._control_gear_thread, enginID, decision, range
-                )
-            except Exception as e:
-                print(
-                    f"[_control_gear_thread] enginID: {enginID} 發生錯誤: {e.__class__}, {str(e)}"
-                )  # 輸出詳細的錯誤資訊
+    def request_stop(self, enginID):
+        # 取消這一俥目前的規劃 (不等待)，回傳其 Future；沒有執行中的規劃回傳 None
+        return self.sequencer.cancel((self.port, enginID))
+
+    def control_future(self, enginID):
+        # 目前 (或最近一次) 的控制規劃，結果為 True 代表到達目標
+        if enginID == 0:
+            return self.left_control_thread
         elif enginID == 1:
-            if (
-                self.right_control_thread is not None
-                and self.right_control_thread.running()
-            ):
-                self.right_stop_event.set()  # 設置停止事件
-                self.right_control_thread.result()  # 等待線程結束
-            # 清除中斷標記
-            self.right_stop_event.clear()
-            # 使用線程池執行任務
-            self.right_control_thread = self.right_executor.submit(
-                self._control_gear_thread, enginID, decision, range
-            )
+            return self.right_control_thread
+        return None
 
-        else:
-            print(f"[動作] enginID : {enginID} 錯誤ID")
+    def _interrupted(self, enginID):
+        # 規劃被取代或取消：剩下的步驟不送，並清掉這一俥還沒寫出的舊指令
+        self._set_steps_left(enginID, 0)
+        self._clear_command_queue(enginID)
+        print(f"enginID:{enginID},俥檔被中斷")
 
-    def _control_gear_thread(self, enginID, decision, range):
-        start = time.time()
-        # 取得目前引擎指令資訊
+    def _compile_gear_plan(self, enginID, decision, range=0.01):
+        """
+        依當下的檔位編譯規劃：檔位有變化時先換檔，再接速度步驟。
+        速度步驟等換檔確認後才依當時的實際電壓編譯，range 為單一指令最大的電壓變化量。
+        """
         cur_engine_command = self._engine_command(enginID)
         # 根據 decision 計算目標檔位
         new_gear_status = self._gear_status(decision)
         current_gear_status = cur_engine_command["current_gear_status"]
-        volt_change = 0  # 看這之後可以調成甚麼
-        if current_gear_status != new_gear_status:
-            # 當檔位有改變時，先以 real_vol 或 curvoltval 作為基準值
-            current_val = (
-                cur_engine_command["real_vol"]
-                if self.gear_ser is not None
-                else cur_engine_command["curvoltval"]
-            )
-            # 執行檔位控制指令
-            issuccess_gear_change = self._gear_change(
-                enginID, current_gear_status, new_gear_status, current_val
-            )
-            if issuccess_gear_change:
-                print(f"enginID:{enginID}, 檔位控制成功，執行速度控制指令")
-                # 更新引擎指令，重新取得狀態
-                new_engine_command = self._engine_command(enginID)
-                # 統一取得目前電壓值
-                current_volt = (
-                    new_engine_command["real_vol"]
-                    if self.gear_ser is not None
-                    else new_engine_command["curvoltval"]
-                )
-                # 若有連接串口，先更新校準數值
-                if self.gear_ser is not None:
-                    self.Adjustment(enginID=enginID, adjVal=current_volt)
-                # 計算需要的電壓變化步驟數
-                step_change = self._calculate_voltage_steps(
-                    decision, current_volt, range
-                )
-
-                if step_change != 0:
-                    # 判斷應發送的指令與對應電壓變化量
-                    send_command, volt_change = self._judge_send_command(
-                        decision, current_volt, new_engine_command, range
-                    )
-                    self._adjust_speed(
-                        step_change,
-                        send_command,
-                        enginID,
-                        volt_change,
-                        new_engine_command["stop_event"],
-                        decision,
-                    )
-            else:
-                print(f"enginID:{enginID}, 檔位控制失敗，跳過速度控制")
-
-        else:
+        speed = Step(apply=lambda confirmed: self._speed_steps(enginID, decision, range), label="speed")
+        if current_gear_status == new_gear_status:
             # 檔位無變化，僅檢查速度（電壓）是否需要更新
             print(f"enginID:{enginID}, 檔位未變化，檢查速度變化")
-            new_engine_command = self._engine_command(enginID)
-            current_volt = (
-                new_engine_command["real_vol"]
-                if self.gear_ser is not None
-                else new_engine_command["curvoltval"]
-            )
-            if self.gear_ser is not None:
-                self.Adjustment(enginID=enginID, adjVal=current_volt)
-            step_change = self._calculate_voltage_steps(decision, current_volt, range)
-            if step_change != 0:
-                print(f"enginID:{enginID}, 速度有變化，執行速度控制指令")
-                send_command, volt_change = self._judge_send_command(
-                    decision, current_volt, new_engine_command, range
-                )
-                self._adjust_speed(
-                    step_change,
-                    send_command,
-                    enginID,
-                    volt_change,
-                    new_engine_command["stop_event"],
-                    decision,
-                )
-            else:
-                print(f"enginID:{enginID}, 檔位與速度均未變化")
-        end = time.time()
-        # self.file.flush_buffer("01_Data/03_LeverSys/"+ str(self.file.timestr(timstr="d")) + ".csv", method="csv")
-        # caltime = (
-        #     f"_control_gear_thread,{enginID},{decision},{volt_change},{start},{end}"
-        # )
-        # self.file.writefile(
-        #     "01_Data/04_Time/" + str(self.file.timestr(timstr="d")) + ".csv",
-        #     str(caltime),
-        #     method="csv",
-        # )
-        # self.file.flush_buffer("01_Data/04_Time/"+ str(self.file.timestr(timstr="d")) + ".csv", method="csv")
+            return [speed]
+        steps = self._gear_change_steps(enginID, current_gear_status, new_gear_status)
+        if steps is None:
+            return False
+        return steps + [speed]
 
     def _engine_command(self, enginID):
         if enginID == 0:
@@ -420,7 +418,6 @@ class LeverSys:
                 self.left_gear_status = new_status
 
             with self.left_lock:
-                stop_event = self.left_stop_event
                 curvoltval = self.left_curvoltval
                 current_gear_status = self.left_gear_status
                 lock = self.left_lock
@@ -429,14 +426,13 @@ class LeverSys:
             send_forward = "LPS_L_Forward"
             send_neutral = "LPS_L_Neutral"
             send_reverse = "LPS_L_Reverse"
-            real_vol = int(self.rawdata["LPS_L_vol"]) * 0.001
+            real_vol = self.rawdata.LPS_L_vol * 0.001
         elif enginID == 1:
 
             def change_gear_status(new_status):
                 self.right_gear_status = new_status
 
             with self.right_lock:
-                stop_event = self.right_stop_event
                 curvoltval = self.right_curvoltval
                 current_gear_status = self.right_gear_status
                 lock = self.right_lock
@@ -445,13 +441,12 @@ class LeverSys:
             send_forward = "LPS_R_Forward"
             send_neutral = "LPS_R_Neutral"
             send_reverse = "LPS_R_Reverse"
-            real_vol = int(self.rawdata["LPS_R_vol"]) * 0.001
+            real_vol = self.rawdata.LPS_R_vol * 0.001
         else:
             print(f"[動作] enginID : {enginID} 錯誤ID")
             return
 
         return {
-            "stop_event": stop_event,
             "curvoltval": curvoltval,
             "current_gear_status": current_gear_status,
             "lock": lock,
@@ -473,234 +468,206 @@ class LeverSys:
         else:
             return "neutral"
 
-    def _gear_change(self, enginID, current_gear_status, new_gear_status, real_vol):
+    def _gear_change_steps(self, enginID, current_gear_status, new_gear_status):
         """
-        只有當俥狀態發生變化時執行指令
+        換檔步驟：依序切換檔位 (進退檔互換時先回空檔)，全部確認後才更新檔位狀態。
+        對應表錯誤回傳 None。
         """
-        if new_gear_status == current_gear_status:
-            # 沒有變化，不執行任何操作
-            return False
-
-        # 中立位置的切換方法映射
-        gear_change_methods = {
-            ("forward", "reverse"): [self._switch_to_neutral, self._switch_to_reverse],
-            ("reverse", "forward"): [self._switch_to_neutral, self._switch_to_forward],
-            ("neutral", "forward"): [self._switch_to_forward],
-            ("neutral", "reverse"): [self._switch_to_reverse],
-            ("forward", "neutral"): [self._switch_to_neutral],
-            ("reverse", "neutral"): [self._switch_to_neutral],
+        # 中立位置的切換順序映射
+        gear_change_sequences = {
+            ("forward", "reverse"): ["neutral", "reverse"],
+            ("reverse", "forward"): ["neutral", "forward"],
+            ("neutral", "forward"): ["forward"],
+            ("neutral", "reverse"): ["reverse"],
+            ("forward", "neutral"): ["neutral"],
+            ("reverse", "neutral"): ["neutral"],
         }
 
-        # 延遲時間映射表
+        # 延遲時間映射表 (預設 1.0/0.5 秒，見 pacing.DEFAULT_GAPS)
+        reversal = self.pacing.gap(self.port, "reversal_settle")
+        shift = self.pacing.gap(self.port, "shift_settle")
         delay_times = {
-            ("forward", "reverse"): [1.0, 0.5],
-            ("reverse", "forward"): [1.0, 0.5],
-            ("neutral", "forward"): [0.50],
-            ("neutral", "reverse"): [0.50],
-            ("forward", "neutral"): [0.50],
-            ("reverse", "neutral"): [0.50],
+            ("forward", "reverse"): [reversal, shift],
+            ("reverse", "forward"): [reversal, shift],
+            ("neutral", "forward"): [shift],
+            ("neutral", "reverse"): [shift],
+            ("forward", "neutral"): [shift],
+            ("reverse", "neutral"): [shift],
         }
 
-        # 尋找對應的切換方法
-        change_sequence = gear_change_methods.get(
-            (current_gear_status, new_gear_status)
-        )
+        change_sequence = gear_change_sequences.get((current_gear_status, new_gear_status))
         delay_sequence = delay_times.get((current_gear_status, new_gear_status))
-
         if change_sequence is None:
             print("---俥位名稱錯誤")
+            return None
+
+        start_volt = self._engine_command(enginID)["real_vol"]
+        steps = []
+        for gear, delay in zip(change_sequence, delay_sequence):
+            steps.extend(self._switch_steps(enginID, gear, delay, start_volt))
+
+        def changed(confirmed):
+            # 所有變速操作成功後，更新變速狀態
+            engine_command = self._engine_command(enginID)
+            with engine_command["lock"]:
+                engine_command["change_gear_status"](new_gear_status)
+            self._publish_state()
+            print(f"enginID:{enginID}, 檔位控制成功，執行速度控制指令")
+
+        steps.append(Step(apply=changed, label=new_gear_status))
+        return steps
+
+    # 各檔位板子回報的電壓範圍與沒有串口時的校準值 (V)
+    GEAR_VOLTAGES = {
+        "neutral": (2.65, 2.75, 2.71),
+        "forward": (2.0, 2.3, 2.19),
+        "reverse": (3.2, 3.3, 3.24),
+    }
+    GEAR_NAMES = {"neutral": "純空檔", "forward": "純進檔", "reverse": "純退檔"}
+    GEAR_CONFIRM_TIMEOUT = 1.0
+
+    def _switch_steps(self, enginID, gear, delay, start_volt):
+        """
+        切換到單一檔位：送出換檔指令，delay 後確認實際電壓進入該檔位範圍 (最多等 GEAR_CONFIRM_TIMEOUT)，
+        逾時則換檔失敗、規劃結束。進退檔在 delay 後補送一次；沒有串口時等 delay 後以預設電壓校準。
+        """
+        low, high, default_volt = self.GEAR_VOLTAGES[gear]
+        name = self.GEAR_NAMES[gear]
+        if self.gear_ser is None:
+            def simulated(confirmed):
+                self.Adjustment(enginID=enginID, adjVal=default_volt)
+                print(f"enginID:{enginID},---{name}")
+
+            return [Step(delay=delay, apply=simulated, label=gear)]
+
+        command = self._engine_command(enginID)["send_" + gear]
+
+        def send_first():
+            if gear != "neutral":
+                # 確保清空這一俥的舊指令 (另一俥的指令不受影響)
+                self._clear_command_queue(enginID)
+            self.send_board_command(command)
+
+        def switched(confirmed):
+            if confirmed:
+                self.Adjustment(enginID=enginID, adjVal=self._real_vol(enginID))
+                print(f"enginID:{enginID},只有當俥狀態發生變化時才執行指令", name)
+                return None
+            if gear != "neutral":
+                # 直接再送一次
+                self.send_board_command(command)
+            self.Adjustment(enginID=enginID, adjVal=start_volt)
+            print(f"enginID:{enginID},{name}尚未打好")
+            print(f"enginID:{enginID}, 檔位控制失敗，跳過速度控制")
             return False
 
-        # 執行變速操作
-        # 測試#延遲時間
-        # start = time.time()
-        for change_method, delay in zip(change_sequence, delay_sequence):
-            if not change_method(enginID, real_vol, delay):
-                # 如果任何一次變速操作失敗，則中止並返回 False
-                return False
-        # end = time.time()
-        # print("打檔完成時間:",end-start,"current_gear_status:",current_gear_status, "new_gear_status:",new_gear_status)
-        # 所有變速操作成功後，更新變速狀態
-        engine_command = self._engine_command(enginID)
-        with engine_command["lock"]:
-            engine_command["change_gear_status"](new_gear_status)
-        return True
-
-    def _switch_to_neutral(self, enginID, real_vol, delay):
-        if self.gear_ser is not None:
-            if enginID == 0:
-                # time.sleep(0.08)
-                self.send_board_command("LPS_L_Neutral")
-            else:
-                # time.sleep(0.08)
-                self.send_board_command("LPS_R_Neutral")
-            time.sleep(delay)
-            # 等待 real_vol 更新到空檔電壓範圍
-            if self._wait_for_real_vol(enginID, 2.65, 2.75):
-                new_engine_command = self._engine_command(enginID)
-                self.Adjustment(enginID=enginID, adjVal=new_engine_command["real_vol"])
-                print(f"enginID:{enginID},只有當俥狀態發生變化時才執行指令", "純空檔")
-                return True
-            else:
-                self.Adjustment(enginID=enginID, adjVal=real_vol)
-                print(f"enginID:{enginID},純空檔尚未打好")
-                return False
-        else:
-            # 測試#延遲時間
-            time.sleep(delay)
-            self.Adjustment(enginID=enginID, adjVal=2.71)
-            print(f"enginID:{enginID},---純空檔")
-            return True
-
-    def _switch_to_forward(self, enginID, real_vol, delay):
-        if self.gear_ser is not None:
-            new_engine_command = self._engine_command(enginID)
-            # 確保清空所有舊指令
-            self._clear_command_queue()
-            if enginID == 0:
-                # time.sleep(0.08)
-                self.send_board_command("LPS_L_Forward")
-            else:
-                # time.sleep(0.08)
-                self.send_board_command("LPS_R_Forward")
-            time.sleep(delay)
-            if enginID == 0:
-                # time.sleep(0.08)
-                self.send_board_command("LPS_L_Forward")
-            else:
-                # time.sleep(0.08)
-                self.send_board_command("LPS_R_Forward")
-            if self._wait_for_real_vol(enginID, 2.0, 2.3):
-                self.Adjustment(enginID=enginID, adjVal=new_engine_command["real_vol"])
-                print(f"enginID:{enginID},只有當俥狀態發生變化時才執行指令", "純進檔")
-                return True
-            else:
-                if enginID == 0:
-                    # time.sleep(0.08)
-                    self.send_board_command("LPS_L_Forward")
-                else:
-                    # time.sleep(0.08)
-                    self.send_board_command("LPS_R_Forward")
-                self.Adjustment(enginID=enginID, adjVal=new_engine_command["real_vol"])
-                print(f"enginID:{enginID},純進檔尚未打好，直接再送一次")
-                return False
-        else:
-            # 測試#延遲時間
-            time.sleep(delay)
-            self.Adjustment(enginID=enginID, adjVal=2.19)
-            print(f"enginID:{enginID},---純進檔")
-            return True
-
-    def _switch_to_reverse(self, enginID, real_vol, delay):
-        if self.gear_ser is not None:
-            new_engine_command = self._engine_command(enginID)
-            # 確保清空所有舊指令
-            self._clear_command_queue()
-            if enginID == 0:
-                # time.sleep(0.08)
-                self.send_board_command("LPS_L_Reverse")
-            else:
-                # time.sleep(0.08)
-                self.send_board_command("LPS_R_Reverse")
-            time.sleep(delay)
-            if enginID == 0:
-                # time.sleep(0.08)
-                self.send_board_command("LPS_L_Reverse")
-            else:
-                # time.sleep(0.08)
-                self.send_board_command("LPS_R_Reverse")
-            if self._wait_for_real_vol(enginID, 3.2, 3.3):
-                self.Adjustment(enginID=enginID, adjVal=new_engine_command["real_vol"])
-                print(f"enginID:{enginID},只有當俥狀態發生變化時才執行指令", "純退檔")
-                return True
-            else:
-                if enginID == 0:
-                    # time.sleep(0.08)
-                    self.send_board_command("LPS_L_Reverse")
-                else:
-                    # time.sleep(0.08)
-                    self.send_board_command("LPS_R_Reverse")
-                self.Adjustment(enginID=enginID, adjVal=new_engine_command["real_vol"])
-                print(f"enginID:{enginID},純退檔尚未打好")
-                return False
-        else:
-            # 測試#延遲時間
-            time.sleep(delay)
-            self.Adjustment(enginID=enginID, adjVal=3.24)
-            print(f"enginID:{enginID},---純退檔")
-            return True
-
-    def _calculate_voltage_steps(self, decision, curvoltval, range):
-        # 計算目標電壓值計算需要的步驟變化
+        return [
+            Step(send=send_first, label=command),
+            Step(
+                send=None if gear == "neutral" else lambda: self.send_board_command(command),
+                delay=delay,
+                expect=lambda: low <= self._real_vol(enginID) <= high,
+                timeout=self.GEAR_CONFIRM_TIMEOUT,
+                required=True,
+                apply=switched,
+                label=command,
+            ),
+        ]
+
+    # 板子一次指令可調整的電壓 (V) 與指令後綴，由大到小
+    VOLTAGE_STEPS = ((0.1, "_Ten"), (0.05, "_Five"), (0.01, ""))
+
+    def _plan_voltage_steps(self, decision, curvoltval, engine_command, range=0.01):
+        """
+        把目前電壓到目標電壓的差距拆成最少的指令：先用 10 倍 (0.1V)，再 5 倍 (0.05V)，最後單步 (0.01V)，
+        最後一步剛好落在目標電壓 (0.01V 解析度)。
+        range 限制單一指令的變化量 (跟原本 range 選擇 _Ten/_Five 一樣)：0.01 只用單步、0.05 最多用 5 倍、0.1 才用 10 倍。
+        回傳 [(指令, 電壓變化量), ...]；電壓已在目標上則回傳空陣列。
+        """
         target_voltval = (5 - decision) / 2
-        step_change = round(abs(target_voltval - curvoltval) / range)
+        hundredths = round((target_voltval - curvoltval) * 100)
+        # 注意板子指令命名相反：*_DEC 讓電壓上升，*_ACC 讓電壓下降
+        if hundredths > 0:
+            base_command, sign = engine_command["send_acc"], 1
+        else:
+            base_command, sign = engine_command["send_dec"], -1
+        remaining = abs(hundredths)
+        plan = []
+        for volt, suffix in self.VOLTAGE_STEPS:
+            if volt > range + 1e-9 and suffix:
+                continue
+            size = round(volt * 100)
+            count, remaining = divmod(remaining, size)
+            plan.extend([(base_command + suffix, sign * volt)] * count)
         print(
-            f"需要的步驟變化: {step_change}, 當前電壓: {curvoltval}V, 目標電壓: {target_voltval}V"
+            f"需要的指令數: {len(plan)}, 當前電壓: {curvoltval}V, 目標電壓: {target_voltval}V"
         )
-        return step_change
-
-    def _judge_send_command(self, decision, curvoltval, engine_command, range):
-        # 檢查 range 的值是否為允許的範圍
-        target_voltval = (5 - decision) / 2
+        return plan
 
-        if range == 0.01:
-            acc_command = engine_command["send_acc"]
-            dec_command = engine_command["send_dec"]
-        elif range == 0.05:
-            dec_command = (
-                "LPS_L_ACC_Five"
-                if "LPS_L" in engine_command["send_acc"]
-                else "LPS_R_ACC_Five"
-            )
-            acc_command = (
-                "LPS_L_DEC_Five"
-                if "LPS_L" in engine_command["send_dec"]
-                else "LPS_R_DEC_Five"
-            )
-        elif range == 0.1:
-            dec_command = (
-                "LPS_L_ACC_Ten"
-                if "LPS_L" in engine_command["send_acc"]
-                else "LPS_R_ACC_Ten"
-            )
-            acc_command = (
-                "LPS_L_DEC_Ten"
-                if "LPS_L" in engine_command["send_dec"]
-                else "LPS_R_DEC_Ten"
-            )
-        else:
-            raise ValueError(f"無效的 range 值: {range}")
+    # 閉迴路步進：實際電壓與預期差距在容許值內視為到達；等不到回報時最多等這麼久再送下一步 (原本固定 0.8 秒)
+    VOLTAGE_TOLERANCE = 0.006
+    STEP_CONFIRM_TIMEOUT = 0.8
 
-        if target_voltval > curvoltval:
-            # 增加電壓
-            return acc_command, range
-        else:
-            # 減少電壓
-            return dec_command, -range
-
-    def _adjust_speed(
-        self, step_count, send_command, enginID, volt_change, stop_event, decision
-    ):
-        # 測試#延遲時間
+    def _real_vol(self, enginID):
+        # 板子回報的實際電壓 (V)
+        return (self.rawdata.LPS_L_vol if enginID == 0 else self.rawdata.LPS_R_vol) * 0.001
 
+    def _speed_steps(self, enginID, decision, range=0.01):
+        """
+        依目前電壓編譯速度步驟 [(指令, 電壓變化量), ...] (見 _plan_voltage_steps)，每個指令一步。
+        有串口且 feedback_stepping 開啟時為閉迴路：每送一步就等實際電壓確認後立刻送下一步，
+        逾時才繼續；實際電壓已在目標容許範圍內就不送剩下的步驟。開迴路每步固定保持 0.8 秒。
+        """
+        engine_command = self._engine_command(enginID)
+        # 統一取得目前電壓值
+        current_volt = (
+            engine_command["real_vol"]
+            if self.gear_ser is not None
+            else engine_command["curvoltval"]
+        )
+        # 若有連接串口，先更新校準數值
+        if self.gear_ser is not None:
+            self.Adjustment(enginID=enginID, adjVal=current_volt)
+        plan = self._plan_voltage_steps(decision, current_volt, engine_command, range)
+        if not plan:
+            print(f"enginID:{enginID}, 速度未變化")
+            return None
+        print(f"enginID:{enginID}, 速度有變化，執行速度控制指令")
         target_voltval = (5 - decision) / 2
-        for _ in range(step_count):
-            if stop_event.is_set():
-                self._clear_command_queue()
-                print(f"enginID:{enginID},俥檔被中斷")
+        closed_loop = self.gear_ser is not None and self.feedback_stepping
+        steps = [
+            self._voltage_step(enginID, decision, target_voltval, send_command, volt_change, len(plan) - i, closed_loop)
+            for i, (send_command, volt_change) in enumerate(plan)
+        ]
+        steps.append(Step(apply=lambda confirmed: self._set_steps_left(enginID, 0), label="speed done"))
+        return steps
+
+    def _voltage_step(self, enginID, decision, target_voltval, send_command, volt_change, steps_left, closed_loop):
+        # 單一電壓步進：送出時更新計算電壓並記錄，閉迴路時以板子回報的電壓確認
+        expected_volt = None
+
+        def reached():
+            real_volt = self._real_vol(enginID)
+            if abs(real_volt - target_voltval) > self.VOLTAGE_TOLERANCE:
                 return False
+            print(f"enginID:{enginID},實際電壓 {real_volt}V 已到達目標，剩餘 {steps_left} 步不送")
+            self.Adjustment(enginID=enginID, adjVal=real_volt)
+            self._set_steps_left(enginID, 0)
+            return True
+
+        def send():
+            nonlocal expected_volt
+            self._set_steps_left(enginID, steps_left)
+            expected_volt = self._real_vol(enginID) + volt_change
             if enginID == 0:
                 with self.left_lock:
-                    self.left_curvoltval += volt_change
-                    current_volt = round(self.left_curvoltval, 3)
-                    # print(f"{enginID},目前電壓值{current_volt}")
+                    self.left_curvoltval = round(self.left_curvoltval + volt_change, 3)
+                    current_volt = self.left_curvoltval
             else:
                 with self.right_lock:
-                    self.right_curvoltval += volt_change
-                    current_volt = round(self.right_curvoltval, 3)
-                    # print(f"---{enginID},目前電壓值{current_volt}")
-            # 測試#延遲時間
-            # time.sleep(0.3)
+                    self.right_curvoltval = round(self.right_curvoltval + volt_change, 3)
+                    current_volt = self.right_curvoltval
+            self._publish_state()
             # 記錄電壓變化
             result = f"{enginID},{current_volt},{send_command},{decision}"
             self.file.writefile(
@@ -708,56 +675,74 @@ class LeverSys:
                 str(result),
                 method="csv",
             )
-
             # 執行指令
             if self.gear_ser is not None:
-                # print(f"4444444enginID:{enginID},當前電壓: {self._engine_command(enginID)["real_vol"]}, 目標電壓: {target_voltval}V")
-                # self.send_board_command(send_command)
-                # if self._engine_command(enginID)["real_vol"] == target_voltval:
-                #     print("444444444444444444達到目標電壓不再傳送step指令")
-                #     break
-                # print(
-                #     "444444444444444444達到目標電壓不再傳送step指令",
-                #     self._engine_command(enginID)["real_vol"],
-                #     target_voltval,
-                # )
                 self.send_board_command(send_command)
-                time.sleep(0.8)
-                # 延遲時間
 
-        # self._clear_command_queue()
+        def confirmed_step(confirmed):
+            # 確認後以實際電壓為準
+            if confirmed:
+                self.Adjustment(enginID=enginID, adjVal=self._real_vol(enginID))
+            else:
+                print(f"enginID:{enginID},{send_command} 未在 {self.STEP_CONFIRM_TIMEOUT} 秒內確認，繼續下一步")
+
+        if closed_loop:
+            return Step(
+                send=send,
+                expect=lambda: abs(self._real_vol(enginID) - expected_volt) <= self.VOLTAGE_TOLERANCE,
+                timeout=self.STEP_CONFIRM_TIMEOUT,
+                skip_if=reached,
+                apply=confirmed_step,
+                label=send_command,
+            )
+        # 開迴路：有串口時每步固定保持 0.8 秒
+        return Step(send=send, timeout=0.8 if self.gear_ser is not None else 0.0, label=send_command)
 
-        # print("動作完成時間",end-start,"step_count:" ,step_count, "send_command:",send_command,"enginID:" ,enginID,"volt_change:", volt_change,"decision:" ,decision)
-        # if self.gear_ser is not None:
-        # 如果直沒有被中斷的話就校正
-        return True
+    def _set_steps_left(self, enginID, steps):
+        if enginID == 0:
+            self.left_steps_left = steps
+        else:
+            self.right_steps_left = steps
+
+    def pending_steps(self):
+        # 回報兩俥尚未送出的速度步數與佇列中尚未寫出的指令數
+        return {
+            "Engine0": self.left_steps_left,
+            "Engine1": self.right_steps_left,
+            "queue": self.command_queue.qsize(),
+        }
 
     def _wait_for_real_vol(self, enginID, expected_min, expected_max, timeout=1.0):
-        # 測試#延遲時間
-        # 等待 real_vol 更新到指定範圍
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            real_vol = (
-                self.rawdata["LPS_L_vol"] if enginID == 0 else self.rawdata["LPS_R_vol"]
-            )
-            real_vol = float(real_vol) * 0.001
-            if expected_min <= real_vol <= expected_max:
-                return True
-            time.sleep(0.01)  # 等待 10ms 重新檢查
-        return False
+        # 等待 real_vol 更新到指定範圍：接收執行緒收到新電壓時立即喚醒，板子一確認就返回
+        field = "LPS_L_vol" if enginID == 0 else "LPS_R_vol"
+        return self.fields.wait_for(
+            field,
+            lambda: expected_min <= self._real_vol(enginID) <= expected_max,
+            timeout,
+        )
 
     def shutdown(self):
-        self.left_executor.shutdown(wait=True)
-        self.right_executor.shutdown(wait=True)
+        # 取消兩俥還沒完成的規劃
+        self.request_stop(0)
+        self.request_stop(1)
+
+    # 叫站：等空俥與等 ACTIVE_LED 亮起最多等多久
+    CALL_NEUTRAL_TIMEOUT = 0.5
+    CALL_ACTIVE_TIMEOUT = 2.0
 
     def call(self):
         # 要等空俥才可以叫站
         if self.gear_ser is not None:
-            if self.rawdata["ACTIVE_LED"] == "0":
+            if self.rawdata.ACTIVE_LED == 0:
                 self.neutral()
-                time.sleep(0.5)
+                # 等兩俥的實際電壓回到空俥範圍 (原本固定等 0.5 秒)
+                low, high, _ = self.GEAR_VOLTAGES["neutral"]
+                deadline = time.monotonic() + self.CALL_NEUTRAL_TIMEOUT
+                for enginID in (0, 1):
+                    self._wait_for_real_vol(enginID, low, high, max(0.0, deadline - time.monotonic()))
                 self.send_board_command("STA_SEL_LONG_PRESS")
-                time.sleep(2)
+                # 等板子亮起 ACTIVE_LED (原本固定等 2 秒)；跟原本一樣送出就回傳 True，燈號較慢亮起不算失敗
+                self.fields.wait_for("ACTIVE_LED", lambda: self.rawdata.ACTIVE_LED == 1, self.CALL_ACTIVE_TIMEOUT)
                 return True
                 # print("叫站成功")
             else:
@@ -766,7 +751,25 @@ class LeverSys:
             return False
 
     def neutral(self):
-        # 要等空俥才可以叫站
+        """
+        強制兩俥空俥 (安全指令，也是叫站前的準備)：以空俥確認規劃取代兩俥剩下的步驟，
+        清空還沒送出的指令後立即送出兩俥空俥。
+        板子回報的電壓進入空俥範圍才把檔位記為空俥並以實際電壓校準 (不接速度步驟)；
+        確認逾時則檔位維持原狀。回傳兩俥確認規劃的 Future。
+        """
+        futures = []
+        for enginID in (0, 1):
+            # 取代舊規劃時會清掉這一俥還沒送出的步進
+            future = self.sequencer.run(
+                (self.port, enginID),
+                self._neutral_steps(enginID),
+                on_cancel=lambda enginID=enginID: self._interrupted(enginID),
+            )
+            if enginID == 0:
+                self.left_control_thread = future
+            else:
+                self.right_control_thread = future
+            futures.append(future)
         if self.gear_ser is not None:
             self._clear_command_queue()  # 確保清空所有舊指令
             self.send_board_command("LPS_L_Neutral")
@@ -775,9 +778,36 @@ class LeverSys:
             self.send_board_command("LPS_R_Neutral")
             # 測試#延遲時間
             # time.sleep(0.3)
-            self.Adjustment(enginID=0, adjVal=2.71)
-            self.Adjustment(enginID=1, adjVal=2.71)
             # print("兩俥進空檔")
+        return futures
+
+    def _neutral_steps(self, enginID):
+        # neutral() 送出空俥後的確認：等實際電壓進入空俥範圍 (沒有串口時等換檔時間後以預設電壓校準)
+        low, high, default_volt = self.GEAR_VOLTAGES["neutral"]
+        shift = self.pacing.gap(self.port, "shift_settle")
+
+        def neutral_confirmed(confirmed):
+            if not confirmed:
+                print(f"enginID:{enginID},{self.GEAR_NAMES['neutral']}尚未打好")
+                return False
+            volt = self._real_vol(enginID) if self.gear_ser is not None else default_volt
+            engine_command = self._engine_command(enginID)
+            with engine_command["lock"]:
+                engine_command["change_gear_status"]("neutral")
+            self.Adjustment(enginID=enginID, adjVal=volt)
+            return None
+
+        if self.gear_ser is None:
+            return [Step(delay=shift, apply=neutral_confirmed, label="neutral")]
+        return [
+            Step(
+                expect=lambda: low <= self._real_vol(enginID) <= high,
+                timeout=shift + self.GEAR_CONFIRM_TIMEOUT,
+                required=True,
+                apply=neutral_confirmed,
+                label="neutral",
+            )
+        ]
 
 
 # 使用範例
@@ -0,0 +1,164 @@
+import threading
+from bisect import bisect_left
+
+
+# 預設的延遲分桶 (秒)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted(self.values.items())
+            lines.extend(self._render_items(items))
+        return lines
+
+    def _render_items(self, items):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Counter(_Metric):
+    """只會增加的計數器"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可減的目前值"""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(_Metric):
+    """分桶統計 (延遲等)，每次 observe 只做一次二分搜尋與加法"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # [各分桶計數 (最後一格為 +Inf), 總和]
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def _render_items(self, items):
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """收集所有指標，輸出 Prometheus 文字格式"""
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# 指令路徑上的指標
+COMMAND_WAIT_SECONDS = Histogram(
+    "boat_command_wait_seconds", "指令從 /control 排入到開始執行的等待時間", ["source"]
+)
+DECISION_SECONDS = Histogram(
+    "boat_decision_seconds", "ControlSys.decision() 執行時間", ["command"]
+)
+GEAR_QUEUE_DEPTH = Gauge(
+    "boat_gear_queue_depth", "LeverSys 板子指令佇列長度", ["port"]
+)
+GEAR_QUEUE_WAIT_SECONDS = Histogram(
+    "boat_gear_queue_wait_seconds", "板子指令在佇列中等待的時間", ["port", "priority"]
+)
+GEAR_COMMANDS_CANCELLED_TOTAL = Counter(
+    "boat_gear_commands_cancelled_total", "尚未送出就被取消的板子指令數", ["port", "engine"]
+)
+GEAR_WRITE_SECONDS = Histogram(
+    "boat_gear_write_seconds", "LeverSys 寫入串口的時間 (不含寫入後的間隔)", ["port"]
+)
+RUDDER_STEP_SECONDS = Histogram(
+    "boat_rudder_step_seconds", "RudderSys 每一度舵角的時間 (含發送與間隔)", ["engine"]
+)
+RUDDER_TRACKING_ERROR_DEGREES = Gauge(
+    "boat_rudder_tracking_error_degrees", "RudderSys 計算舵角與板子回授 (RudderFeedback) 的差距", ["engine"]
+)
+RUDDER_RESYNC_TOTAL = Counter(
+    "boat_rudder_resync_total", "以板子回授修正計算舵角的次數", ["engine"]
+)
+SERIAL_LINES_TOTAL = Counter(
+    "boat_serial_lines_total", "串口收到的資料行數", ["port"]
+)
+SERIAL_PARSE_FAILURES_TOTAL = Counter(
+    "boat_serial_parse_failures_total", "串口資料行解析失敗數", ["port"]
+)
+FILE_FLUSH_SECONDS = Histogram(
+    "boat_file_flush_seconds", "fileControl 緩衝寫入檔案的時間", ["folder"]
+)
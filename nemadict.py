@@ -218,12 +218,86 @@ class customSentence(NMEASentence):
         except:
             pass
 
+def _field_reader(cls):
+    # 依 pynmea2 __getattr__ 的規則預先算好 (欄位名稱, 索引, 轉換函式)
+    readers = []
+    for name, index in cls.name_to_idx.items():
+        if hasattr(cls, name):
+            # 欄位名稱被類別屬性蓋掉 (property 等)，交給 pynmea2 處理
+            return None
+        field = cls.fields[index]
+        readers.append((name, index, field[2] if len(field) >= 3 else None))
+    return tuple(readers)
+
+
+# 快速解析表：句型 ID (類型名稱最後三個字，如 VER、RAP、ACK) -> 欄位讀取規則
+# 只收本檔自訂的句型；其餘 (標準 NMEA、含校驗碼的句子) 仍走 pynmea2
+FAST_SENTENCES = {}
+for _cls in (EPR, OUT, EPD, DTM, HTD, IND, VER, RAP, PAR, DER, ACK, ODE, ING, RSE):
+    _readers = _field_reader(_cls)
+    if _readers is not None and TalkerSentence.sentence_types.get(_cls.__name__) is _cls:
+        FAST_SENTENCES[_cls.__name__] = _readers
+
+
+def _convert(value, converter):
+    # 與 pynmea2 相同：空字串為 None，轉換失敗保留原字串；再依 formatjson 的規則轉型
+    if converter is not None:
+        if value == "":
+            return "None"
+        try:
+            value = converter(value)
+        except Exception:
+            return value
+        if type(value) is Decimal:
+            return float(str(value))
+    return str(value)
+
+
+def fast_formatjson(line):
+    """
+    板子自訂句子的快速解析 (str 或 bytes)，結果與 customNemaJson().formatjson() 相同。
+    不是快速路徑能處理的句子回傳 None，由呼叫端改走 pynmea2。
+    """
+    if type(line) is not str:
+        line = str(line, "ascii", "replace")
+    line = line.lstrip()
+    if line[:1] == "$":
+        line = line[1:]
+    if "*" in line:
+        return None
+    head, sep, rest = line.partition(",")
+    if not sep or len(head) < 3:
+        return None
+    readers = FAST_SENTENCES.get(head[-3:].upper())
+    if readers is None or not (head.isalnum() or head.isidentifier()):
+        return None
+    data = rest.split(",")
+    count = len(data)
+    return {
+        name: (
+            _convert(data[index] if index < count else "", converter)
+            if converter is not None
+            else (data[index] if index < count else "")
+        )
+        for name, index, converter in readers
+    }
+
+
 class customNemaJson(customSentence):
     def __init__(self):
         pass
 
     
     def formatjson(self,nmea_sentence):
+        # 板子的自訂句子先走快速解析，解析不了再交給 pynmea2
+        selectedDict = fast_formatjson(nmea_sentence)
+        if selectedDict is not None:
+            return selectedDict
+        if type(nmea_sentence) is not str:
+            nmea_sentence = str(nmea_sentence, "ascii", "replace")
+        return self.formatjson_pynmea(nmea_sentence)
+
+    def formatjson_pynmea(self,nmea_sentence):
         data = nmea_sentence
         # print(data)
         try:
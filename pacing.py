@@ -0,0 +1,224 @@
+"""
+板子指令送出間隔 (pacing) 設定與自動校正。
+
+每個串口、每類指令各有一個間隔 (秒)，預設值就是原本寫死在程式裡的數值；
+校正結果存在 PROFILE_PATH，下次啟動自動載入。
+
+校正：python pacing.py --emulator          (使用 boardemulator 模擬板子)
+      python pacing.py COM11 COM12 [--save] (實體板子：油門板、舵機板；兩俥需在空俥、舵可自由轉動)
+"""
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+
+# 預設間隔 (秒)
+DEFAULT_GAPS = {
+    "neutral": 0.25,  # LeverSys 送出空檔/叫站後
+    "gear": 0.25,  # LeverSys 送出進退檔後
+    "step": 0.25,  # LeverSys 送出加減速步進後
+    "rudder_step": 0.08,  # RudderSys 每一度
+    "rudder_burst": 0.08,  # RudderSys 回授模式連發時每一度的最短間隔 (校正為板子可接受的最短間隔，不加餘裕)
+    "rudder_mode": 0.3,  # RudderSys 切換模式後
+    "shift_settle": 0.5,  # 換檔後等檔位穩定 (機構穩定時間，不做自動校正)
+    "reversal_settle": 1.0,  # 進退檔互換時，回空檔後的等待
+}
+
+PROFILE_PATH = "01_Data/06_Pacing/profile.json"
+
+
+class PacingProfile:
+    """每個串口、每類指令的送出間隔；沒有設定的串口/類別使用 DEFAULT_GAPS"""
+
+    def __init__(self, path=PROFILE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.gaps = {}  # {串口: {類別: 間隔}}
+        if path is not None and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self.gaps = json.load(file)
+
+    def gap(self, port, command_class):
+        return self.gaps.get(port, {}).get(command_class, DEFAULT_GAPS[command_class])
+
+    def set(self, port, command_class, gap):
+        with self.lock:
+            self.gaps.setdefault(port, {})[command_class] = gap
+
+    def reset(self, port, command_class):
+        # 回到預設值
+        with self.lock:
+            self.gaps.get(port, {}).pop(command_class, None)
+
+    def save(self):
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as file:
+                json.dump(self.gaps, file, ensure_ascii=False, indent=2)
+
+
+# 所有板子共用的設定
+PROFILE = PacingProfile()
+
+
+def find_min_gap(trial, low=0.02, high=0.3, resolution=0.01, repeats=3):
+    """
+    二分搜尋板子能穩定接受的最短間隔。
+    trial(gap) 回傳 True 表示該間隔下送出的指令全部被板子執行；每個間隔要連續成功 repeats 次才算。
+    high 本身也失敗時回傳 None。
+    """
+    def reliable(gap):
+        for _ in range(repeats):
+            if not trial(gap):
+                print(f"[pacing] 間隔 {gap:.2f}s 失敗")
+                return False
+        print(f"[pacing] 間隔 {gap:.2f}s 成功")
+        return True
+
+    steps_low = max(1, round(low / resolution))
+    steps_high = round(high / resolution)
+    if not reliable(steps_high * resolution):
+        return None
+    while steps_low < steps_high:
+        middle = (steps_low + steps_high) // 2
+        if reliable(middle * resolution):
+            steps_high = middle
+        else:
+            steps_low = middle + 1
+    return steps_high * resolution
+
+
+def recommended_gap(min_gap, margin=1.2, resolution=0.01):
+    # 量到的最短間隔加上安全餘裕，取到 resolution 的整數倍
+    return math.ceil(round(min_gap * margin / resolution, 6)) * resolution
+
+
+def lever_trial(gear_system, enginID=0, burst=5, timeout=1.0):
+    """
+    油門板的單次試驗：以 gap 連送 burst 個單步升壓，確認實際電壓升了 burst*0.01V，再送回原電壓。
+    只能在空俥時執行 (±0.05V 仍在空俥範圍)。
+    """
+    up, down = ("LPS_L_DEC", "LPS_L_ACC") if enginID == 0 else ("LPS_R_DEC", "LPS_R_ACC")
+    tolerance = gear_system.VOLTAGE_TOLERANCE
+    port = gear_system.port
+    pacing = gear_system.pacing
+
+    def trial(gap):
+        pacing.set(port, "step", gap)
+        start = gear_system._real_vol(enginID)
+        expected = start + burst * 0.01
+        for _ in range(burst):
+            gear_system.send_board_command(up)
+        ok = gear_system._wait_for_real_vol(enginID, expected - tolerance, expected + tolerance, timeout + burst * gap)
+        # 不論成功與否都以預設間隔逐步回到原電壓
+        pacing.reset(port, "step")
+        for _ in range(round((gear_system._real_vol(enginID) - start) * 100)):
+            gear_system.send_board_command(down)
+        gear_system._wait_for_real_vol(enginID, start - tolerance, start + tolerance, timeout + burst * DEFAULT_GAPS["step"])
+        return ok
+
+    return trial
+
+
+def rudder_trial(rudder_system, burst=3, timeout=1.0):
+    """舵機板的單次試驗：以 gap 連轉 burst 度，確認板子回報的舵角命令 (RudderOrder) 也變了 burst 度，再轉回來"""
+    port = rudder_system.port
+    pacing = rudder_system.pacing
+
+    def wait_order(expected, limit):
+        deadline = time.monotonic() + limit
+        while rudder_system.rawdata.RudderOrder != expected:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.02)
+        return True
+
+    def trial(gap):
+        # 回授模式會補送漏掉的指令，校正時關閉，才量得到板子在這個間隔下是否漏指令
+        feedback_tracking = rudder_system.feedback_tracking
+        rudder_system.feedback_tracking = False
+        pacing.set(port, "rudder_step", gap)
+        start_order = rudder_system.rawdata.RudderOrder
+        start_angle = rudder_system.currudder
+        rudder_system.controlRudder(decision=start_angle + burst).result()
+        ok = wait_order(start_order + burst, timeout)
+        # 以板子回報的舵角命令校準後，用預設間隔轉回原位置
+        pacing.reset(port, "rudder_step")
+        rudder_system.Adjustment(start_angle + rudder_system.rawdata.RudderOrder - start_order)
+        rudder_system.controlRudder(decision=start_angle).result()
+        wait_order(start_order, timeout + burst * DEFAULT_GAPS["rudder_step"])
+        rudder_system.feedback_tracking = feedback_tracking
+        return ok
+
+    return trial
+
+
+def throughput_report(port, command_class, gap):
+    # 每秒可送指令數與一次滿舵 / 滿速規劃需要的時間，和預設值比較
+    default = DEFAULT_GAPS[command_class]
+    commands = 60 if command_class.startswith("rudder") else 23  # 滿舵 -30→30 度；空俥到全速約 23 個混合步進
+    print(
+        f"[pacing] {port} {command_class}: 預設 {default:.2f}s ({1 / default:.1f} 筆/秒, {commands} 筆 {commands * default:.2f}s)"
+        f" -> 校正 {gap:.2f}s ({1 / gap:.1f} 筆/秒, {commands} 筆 {commands * gap:.2f}s)，吞吐量 {default / gap:.2f} 倍"
+    )
+
+
+def calibrate(gear_system=None, rudder_system=None, profile=None, save=False):
+    """對油門板與舵機板執行校正，回傳 {(串口, 類別): 建議間隔}"""
+    profile = profile if profile is not None else PROFILE
+    results = {}
+    targets = []
+    if gear_system is not None:
+        targets.append((gear_system.port, "step", lever_trial(gear_system)))
+    if rudder_system is not None:
+        targets.append((rudder_system.port, "rudder_step", rudder_trial(rudder_system)))
+    for port, command_class, trial in targets:
+        previous = profile.gaps.get(port, {}).get(command_class)
+        min_gap = find_min_gap(trial, high=DEFAULT_GAPS[command_class])
+        if min_gap is None:
+            print(f"[pacing] {port} {command_class}: 預設間隔也不穩定，維持原設定")
+            if previous is not None:
+                profile.set(port, command_class, previous)
+            continue
+        gap = min(recommended_gap(min_gap), DEFAULT_GAPS[command_class])
+        profile.set(port, command_class, gap)
+        results[(port, command_class)] = gap
+        print(f"[pacing] {port} {command_class}: 最短可接受 {min_gap:.2f}s，建議 {gap:.2f}s")
+        throughput_report(port, command_class, gap)
+        if command_class == "rudder_step":
+            # 回授模式會補送漏掉的度數，連發直接用量到的最短間隔
+            burst = min(recommended_gap(min_gap, margin=1.0), DEFAULT_GAPS["rudder_burst"])
+            profile.set(port, "rudder_burst", burst)
+            results[(port, "rudder_burst")] = burst
+            throughput_report(port, "rudder_burst", burst)
+    if save:
+        profile.save()
+    return results
+
+
+if __name__ == "__main__":
+    from leverboard import LeverSys
+    from rudderboard import RudderSys
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    # 校正過程不寫入正式設定檔，只有 --save 才存
+    profile = PacingProfile(path=PROFILE_PATH)
+    if "--emulator" in sys.argv:
+        from boardemulator import LeverBoardEmulator, RudderBoardEmulator
+
+        gear_system = LeverSys(port="EMU_LEVER", pacing=profile)
+        rudder_system = RudderSys(port="EMU_RUDDER", enginID=0, pacing=profile)
+        gear_system.open(LeverBoardEmulator())
+        rudder_system.open(RudderBoardEmulator())
+    else:
+        gear_system = LeverSys(port=args[0] if args else "COM11", pacing=profile)
+        rudder_system = RudderSys(port=args[1] if len(args) > 1 else "COM12", enginID=0, pacing=profile)
+        gear_system.open()
+        rudder_system.open()
+    time.sleep(0.5)  # 等第一筆回報
+    calibrate(gear_system, rudder_system, profile, save="--save" in sys.argv)
+    gear_system.close()
+    rudder_system.close()
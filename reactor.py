@@ -0,0 +1,130 @@
+import threading
+import time
+
+
+class SerialReactor:
+    """
+    單一 I/O 執行緒，負責所有串口的接收與依間隔送出。
+    取代每個 LeverSys/RudderSys 各自的接收執行緒與 LeverSys 的送指令執行緒，
+    串口再多也只多一個輪詢項目，不多開執行緒。
+
+    Windows 的 COM 埠不能用 selectors/asyncio 等待，因此以 in_waiting 輪詢：
+    有資料的串口才呼叫讀取回呼 (不會阻塞)；送出端在到期時才呼叫，回呼回傳下一次可送出的間隔；
+    排程回呼 (stepplan 的動作規劃) 每一輪都呼叫，回傳下一個期限。
+    沒事可做時最多睡 poll_interval，wake() 可立即喚醒 (例如新指令排入)。
+    """
+
+    def __init__(self, poll_interval=0.005, name="SerialReactor"):
+        self.poll_interval = poll_interval
+        self.name = name
+        self.lock = threading.Lock()
+        self.readers = {}  # {id(ser): (ser, 回呼)}
+        self.writers = {}  # {key: [回呼, 下次可送出的時間]}
+        self.timers = {}  # {key: 回呼}
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def add_reader(self, ser, callback):
+        # ser 有資料 (in_waiting > 0) 時在 I/O 執行緒呼叫 callback()
+        with self.lock:
+            self.readers[id(ser)] = (ser, callback)
+        self._ensure_running()
+
+    def remove_reader(self, ser):
+        with self.lock:
+            self.readers.pop(id(ser), None)
+
+    def add_writer(self, key, callback):
+        """
+        註冊送出端：到期時在 I/O 執行緒呼叫 callback()，
+        回傳秒數表示已送出一筆、這段時間後才能再送；回傳 None 表示目前沒有要送的。
+        """
+        with self.lock:
+            self.writers[key] = [callback, 0.0]
+        self._ensure_running()
+
+    def remove_writer(self, key):
+        with self.lock:
+            self.writers.pop(key, None)
+
+    def add_timer(self, key, callback):
+        """
+        註冊排程回呼：I/O 執行緒每一輪 (包含每次讀到資料後) 都呼叫 callback()，
+        回傳下一個需要被呼叫的時間 (time.monotonic)，I/O 執行緒最晚在那時醒來；None 表示沒有期限。
+        """
+        with self.lock:
+            self.timers[key] = callback
+        self._ensure_running()
+
+    def remove_timer(self, key):
+        with self.lock:
+            self.timers.pop(key, None)
+
+    def wake(self):
+        # 有新工作時立即喚醒 I/O 執行緒
+        self.wakeup.set()
+
+    def _ensure_running(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wakeup.clear()
+            with self.lock:
+                readers = list(self.readers.values())
+                writers = list(self.writers.values())
+                timers = list(self.timers.values())
+            busy = False
+            for ser, callback in readers:
+                try:
+                    if not ser.is_open:
+                        # 串口已關閉 (close() 也會呼叫 remove_reader)：不再輪詢
+                        self.remove_reader(ser)
+                        continue
+                    waiting = ser.in_waiting
+                    if waiting > 0:
+                        callback()
+                        # 回呼有讀走資料才立刻再輪詢一次；沒讀走 (例如提早返回) 就照常睡到下一個週期，不空轉
+                        if not ser.is_open or ser.in_waiting < waiting:
+                            busy = True
+                except Exception as e:
+                    # 串口斷線等錯誤：停止輪詢這個串口，避免每個週期重複報錯
+                    print(f"[{self.name}] 讀取錯誤，停止接收: {e}")
+                    self.remove_reader(ser)
+            next_due = None
+            for writer in writers:
+                callback, ready_at = writer
+                now = time.monotonic()
+                if now >= ready_at:
+                    try:
+                        gap = callback()
+                    except Exception as e:
+                        print(f"[{self.name}] 送出錯誤: {e}")
+                        gap = None
+                    if gap is not None:
+                        ready_at = writer[1] = now + gap
+                        busy = True
+                if ready_at > now and (next_due is None or ready_at < next_due):
+                    next_due = ready_at
+            for callback in timers:
+                try:
+                    deadline = callback()
+                except Exception as e:
+                    print(f"[{self.name}] 排程錯誤: {e}")
+                    deadline = None
+                if deadline is not None and (next_due is None or deadline < next_due):
+                    next_due = deadline
+            if busy:
+                continue
+            # 沒有資料也沒有要送的：睡到下一個送出時間或輪詢週期，新指令排入時提早醒來
+            timeout = self.poll_interval
+            if next_due is not None:
+                timeout = min(timeout, max(0.0, next_due - time.monotonic()))
+            self.wakeup.wait(timeout)
+
+
+# 所有串口共用的 I/O 執行緒
+REACTOR = SerialReactor()
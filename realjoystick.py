@@ -5,6 +5,7 @@ import serial_asyncio
 import time
 import requests
 import json
+from controlchannel import ControlChannelClient
 import re
 
 class JoystickSys:
@@ -34,6 +35,8 @@ class JoystickSys:
         }
         # **最新的指令狀態**
         self.latest_command = None
+        # 常駐控制通道：送指令與接收燈號都不經過 HTTP，不會卡住 CAN 讀取
+        self.channel = ControlChannelClient(on_leds=self._on_leds)
     async def open(self):
         """ 使用 asyncio 開啟 Serial 連線 """
         try:
@@ -59,7 +62,7 @@ class JoystickSys:
                 if self.latest_command[0]==0:
                     # self.ControlSys.decision(Command=0)  
                     jsondata = {'Command': 0}  
-                    self.send_api(jsondata)
+                    await self.send_command(jsondata)
                 elif self.latest_command[0]<900:
                     # self.ControlSys.decision(
                     #     Command=666, 
@@ -76,23 +79,31 @@ class JoystickSys:
                     'Right_Rudder': self.latest_command[4],
                     'Range':0.05,
                     }     
-                    self.send_api(jsondata)
+                    await self.send_command(jsondata)
                 elif self.latest_command[0] == 900:
                     jsondata = {'Command': 900}
-                    self.send_api(jsondata)
+                    await self.send_command(jsondata)
 
                     # 自動送出 Callstation
                     jsondata_901 = {'Command': 901}
-                    self.send_api(jsondata_901)    
+                    await self.send_command(jsondata_901)    
                 else:
                     # self.ControlSys.decision(Command=901)  
                     jsondata = {
                     'Command': self.latest_command[0],
                     }   
-                    self.send_api(jsondata)
+                    await self.send_command(jsondata)
                     # self.joystickstate = {'NEUTRAL_LED': '0', 'ACTIVE_LED': '1', 'SYNC_LED': '0','LPS_L_vol': '0', 'LPS_R_vol': '0',}
             await asyncio.sleep(0.5)  
 
+    async def send_command(self, jsondata):
+        # 優先走控制通道，通道斷線時才在背景執行緒走 HTTP，避免阻塞 asyncio 迴圈
+        if not await self.channel.send(jsondata):
+            try:
+                await asyncio.to_thread(self.send_api, jsondata)
+            except Exception as e:
+                print(f"[ERROR] API 發送失敗: {e}")
+
     def send_api(self,jsondata):
         url = "http://127.0.0.1:5899/control"
         # 要發送的資料
@@ -108,19 +119,9 @@ class JoystickSys:
             print(f"請求失敗，狀態碼：{response.status_code}")
             print("錯誤訊息：", response.text)
 
-        self.update_data()
-    def update_data(self):
-
-        url = "http://127.0.0.1:5899/status"
-        response = requests.get(url)
-        
-        # 檢查回應狀態碼和內容
-        if response.status_code == 200:
-            self.joystickstate = response.json()["Voltage"]["rawdata"]
-            # print("伺服器回應：", json.dumps(response.json(), ensure_ascii=False))
-        else:
-            print(f"請求失敗，狀態碼：{response.status_code}")
-            print("錯誤訊息：", response.text)
+    def _on_leds(self, rawdata):
+        # 控制通道推送的最新燈號
+        self.joystickstate = rawdata
     async def read_and_process_serial_data(self):
         """ 同時讀取 Serial 資料並立即處理 """
         while True:
@@ -430,6 +431,7 @@ class JoystickSys:
         await asyncio.gather(
             self.read_and_process_serial_data(),
             self.send_control_command_periodically(),  # **每 3 秒發送一次最新指令**
+            self.channel.run(),  # 控制通道連線與燈號接收
             asyncio.Event().wait()  # 讓程式不會直接結束
         )
 
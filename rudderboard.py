@@ -1,18 +1,49 @@
 import serial
-import threading
 from filepath import fileControl
 import time
-from concurrent.futures import ThreadPoolExecutor
 from nemadict import customNemaJson
+from serialreader import SerialLineReader
+from telemetry import TelemetryHub, record_type
+import pacing as pacing_profile
+import reactor as serial_reactor
+import stepplan
+from stepplan import Step
+from metrics import (
+    RUDDER_RESYNC_TOTAL,
+    RUDDER_STEP_SECONDS,
+    RUDDER_TRACKING_ERROR_DEGREES,
+    SERIAL_LINES_TOTAL,
+    SERIAL_PARSE_FAILURES_TOTAL,
+)
 import random
 
 
+# 舵機板回報：舵角命令/回授 (度)、駕駛模式、航向
+RudderRecord = record_type(
+    "RudderRecord",
+    (
+        ("RudderOrder", int, 0),
+        ("RudderFeedback", int, 0),
+        ("Pilot_Mode", str, "None"),
+        ("Heading", float, 0),
+        ("Course", float, 0),
+    ),
+)
+
+
 class RudderSys:
-    def __init__(self, port, baudrate=9600, timeout=1, enginID=-9999):
+    def __init__(self, port, baudrate=9600, timeout=1, enginID=-9999, telemetry=None, pacing=None, reactor=None, sequencer=None):
         self.port = port
+        # 接收交給共用的 I/O 執行緒 (reactor.REACTOR)
+        self.reactor = reactor if reactor is not None else serial_reactor.REACTOR
+        # 舵角的動作規劃由共用的排程器執行 (stepplan.SEQUENCER)
+        self.sequencer = sequencer if sequencer is not None else stepplan.SEQUENCER
+        # 指令送出間隔設定 (每個串口、每類指令)，預設共用 pacing.PROFILE
+        self.pacing = pacing if pacing is not None else pacing_profile.PROFILE
         self.baudrate = baudrate
         self.timeout = timeout
         self.rudder_ser = None
+        self.reader = None  # 串口逐行讀取器，跟著 rudder_ser 建立
         self.file = fileControl()
         self.step = 0
         self.mode = "FUMode"
@@ -24,34 +55,35 @@ class RudderSys:
             + str(self.enginID)
             + ".csv"
         )
-        self.rawdata = {
-            "enginID": enginID,
-            "RudderOrder": "0",
-            "RudderFeedback": "0",
-            "Pilot_Mode": "None",
-            "Heading": "0",
-            "Course": "0",
-        }
+        self.rawdata = RudderRecord()
         # test
         self.decision = 0
         self.currudder = 0
-        self.control_thread = None
-        self.stop_event = threading.Event()
-        self.executor = ThreadPoolExecutor(
-            max_workers=2
-        )  # 創建一個最大工作數為1的線程池
-        # 用於接收數據的線程池
-        self.receive_executor = ThreadPoolExecutor(max_workers=1)
-        self.receive_stop_event = threading.Event()
+        self.control_thread = None  # 目前規劃的 Future
+        self.plan_key = (self.port, "rudder")
+        self.last_step_at = float("-inf")  # 上一度送出的時間 (time.monotonic)
+        self.feedback_tracking = True  # 以板子回授 (RudderFeedback) 確認每一度並同步計算舵角 (False 則只計數指令)
+        self.burst_window = 4  # 回授模式連發時最多領先回授的度數 (1 則每一度等回授確認)
+        self.burst_backoff = 1.0  # 漏指令時放大連發間隔的倍數
+        self.feedback_lag = 0.0  # 每一度從送出到回授到達的平滑延遲 (秒)
+        self.sent_times = {}  # {舵角: 送出時間}，量回授延遲用
+        self.move_from = 0  # 這次轉舵的起點、開始時間與送出度數
+        self.move_started = 0.0
+        self.move_sent = 0
         self.receiveTime = time.time()
+        # 遙測快照：接收執行緒發布，/status 直接讀取
+        self.telemetry = telemetry if telemetry is not None else TelemetryHub()
+        self.telemetry_key = f"rudder{self.enginID}"
+        self.publish_telemetry()
 
-    def open(self):
+    def open(self, ser=None):
+        # ser: 已建立的串口物件 (例如 boardemulator 的模擬板子)，不給則開啟實體串口
         try:
             if self.rudder_ser is not None:
                 print(f"串口 {self.port} 已經打開")
                 return True
             else:
-                self.rudder_ser = serial.Serial(
+                self.rudder_ser = ser if ser is not None else serial.Serial(
                     port=self.port,
                     baudrate=self.baudrate,
                     timeout=self.timeout,
@@ -60,8 +92,9 @@ class RudderSys:
                     bytesize=serial.EIGHTBITS,
                 )
                 if self.rudder_ser.is_open:
-                    # 開始接收值
-                    self.receive_executor.submit(self._receive_data_loop)
+                    # 開始接收值 (I/O 執行緒在有資料時呼叫)
+                    self.reactor.add_reader(self.rudder_ser, self._process_receive_data)
+                    self._publish_state()
                     print(f"串口 {self.port} 已打開")
                     return True
         except serial.SerialException as e:
@@ -71,16 +104,14 @@ class RudderSys:
 
     def close(self):
         self.file.close()
+        if self.rudder_ser is not None:
+            self.reactor.remove_reader(self.rudder_ser)
         if self.rudder_ser and self.rudder_ser.is_open:
             self.rudder_ser.close()
             print(f"串口 {self.port} 已關閉")
-
-        if not self.receive_executor._shutdown:
-            self.receive_stop_event.set()
-            self.receive_executor.shutdown(wait=True)
-
-        if not self.executor._shutdown:
-            self.executor.shutdown(wait=True)
+        self.rudder_ser = None
+        self._publish_state()
+        self.request_stop()
 
     # 發送指令的方法
     def send_AutopilotSdbyMode(self):
@@ -118,139 +149,283 @@ class RudderSys:
         # 簡易的連結判斷，之後要考慮如果serial斷掉怎麼辦
         return 0 if self.rudder_ser is None else 1
 
+    def publish_telemetry(self):
+        # 發布全部遙測資料 (初始化或整批重設 rawdata 時使用)
+        self.telemetry.publish(
+            self.telemetry_key, dict(enginID=self.enginID, **self.rawdata.as_status())
+        )
+        self._publish_state()
+
+    def _publish_state(self):
+        # 發布連線狀態與計算舵角
+        self.telemetry.publish(
+            self.telemetry_key + "_state",
+            {"status": self.connect(), "currudder": self.currudder},
+        )
+
     def Adjustment(self, adjVal):
         self.decision = adjVal
         self.currudder = adjVal
         self.step = adjVal
+        self._publish_state()
         # print(f"[動作] 舵角校準成功")
 
     # 接收數據的方法
     def receive_data(self):
-        # 使用線程池執行 `_process_receive_data`
-        self.receive_executor.submit(self._process_receive_data)
-
-    def _receive_data_loop(self):
-        # 持續運行，直到 `receive_stop_event` 被設置
-        while not self.receive_stop_event.is_set():
-            self._process_receive_data()
+        # 立即讀取並處理一次串口資料 (持續接收由 I/O 執行緒負責)
+        return self._process_receive_data()
 
     def _process_receive_data(self):
+        # I/O 執行緒在串口有資料時呼叫
 
         if self.rudder_ser and self.rudder_ser.is_open:
             # data = "$RudderFeedback,40"
-            # data = self.rudder_ser.read(size)
             # 彥陞調整
+            reader = self._line_reader()
             if time.time() - self.receiveTime > 25:
                 self.receiveTime = time.time()
                 self.rudder_ser.flushInput()
-
-            data = (
-                str(self.rudder_ser.readline())
-                .replace("'", "")
-                .replace("b", "")
-                .replace("\\r\\n", "")
-            )
-
-            raw = customNemaJson().formatjson(data)
-            # print("89898989898",data,raw)
-            if raw is not None:
-                self.rawdata.update(raw)
-                result = f"{time.time()},{self.enginID},{data}"
-                # result = time.time() + "," + str(self.enginID) + "," + data
-                self.file.writefile(
-                    "01_Data/01_Receive/RudderSys/"
-                    + str(self.file.timestr(timstr="d"))
-                    + "_"
-                    + str(self.enginID)
-                    + ".csv",
-                    str(result),
-                    method="csv",
-                )
-                return raw
-            return None
+                reader.clear()
+
+            # 一次讀完串口上的資料再逐行處理，回傳最後一筆解析成功的資料
+            reader.fill()
+            result = None
+            for line in reader.lines():
+                raw = self._process_line(line)
+                if raw is not None:
+                    result = raw
+            return result
         else:
             # print("串口尚未打開或已關閉")
             return None
 
-    def controlRudder(self, decision=0):
+    def _line_reader(self):
+        # 串口重新開啟後換新的讀取器，不沿用舊串口的殘留資料
+        if self.reader is None or self.reader.ser is not self.rudder_ser:
+            self.reader = SerialLineReader(self.rudder_ser)
+        return self.reader
+
+    def _process_line(self, line):
+        # 解析一行資料 (bytes，直接交給解析器) 並更新 rawdata 與遙測
+        raw = customNemaJson().formatjson(line)
+        # print("89898989898",data,raw)
+        SERIAL_LINES_TOTAL.inc(port=self.port)
+        if raw is None:
+            SERIAL_PARSE_FAILURES_TOTAL.inc(port=self.port)
+            return None
+        self.rawdata.update(raw)
+        self.telemetry.publish(self.telemetry_key, raw)
+        if "RudderFeedback" in raw:
+            self._track_feedback()
+        # 只有記錄時才把整行轉成文字
+        result = f"{time.time()},{self.enginID},{str(line, 'ascii', 'replace')}"
+        # result = time.time() + "," + str(self.enginID) + "," + data
+        self.file.writefile(
+            "01_Data/01_Receive/RudderSys/"
+            + str(self.file.timestr(timstr="d"))
+            + "_"
+            + str(self.enginID)
+            + ".csv",
+            str(result),
+            method="csv",
+        )
+        return raw
+
+    def _track_feedback(self):
+        # 記錄計算舵角與回授的差距；沒有轉舵時持續以回授同步計算舵角 (轉舵中由規劃的每一步同步)
+        feedback = self.rawdata.RudderFeedback
+        RUDDER_TRACKING_ERROR_DEGREES.set(self.currudder - feedback, engine=self.enginID)
+        sent_at = self.sent_times.get(feedback)
+        if sent_at is not None:
+            # 回授延遲：這一度從送出到回授到達的時間，平滑後用來調整連發間隔
+            self.feedback_lag += self.LAG_SMOOTHING * (time.monotonic() - sent_at - self.feedback_lag)
+            # 更早送出的度數不是已到達就是被跳過
+            for angle in [angle for angle, stamp in self.sent_times.items() if stamp <= sent_at]:
+                del self.sent_times[angle]
+        if self.feedback_active() and self.sequencer.current(self.plan_key) is None:
+            self._resync()
+
+    def pending_steps(self):
+        # 舵角尚未走完的度數
+        if self.control_thread is None or self.control_thread.done():
+            return 0
+        return int(abs(self.decision - self.currudder))
+
+    def request_stop(self):
+        # 取消目前的規劃 (不等待)，回傳其 Future；沒有執行中的規劃回傳 None
+        return self.sequencer.cancel(self.plan_key)
+
+    def controlRudder(self, decision=0, start_event=None):
+        """
+        設定目標舵角後立即返回，回傳規劃的 Future (結果 True 代表到達最新的目標)。
+        已有執行中的規劃時直接改為朝新目標、從目前舵角繼續轉 (不中斷也不重新開始)；
+        沒有才建立新規劃，由共用的 StepSequencer 依間隔每次轉一度。
+        """
         # print(f"[DEBUG] 嘗試控制舵角, 指令: {decision}")
 
-        # if self.executor is None:
-        #     print("[ERROR] executor 是 None，可能被垃圾回收！")
-        #     return
-
-        # if self.executor._shutdown:
-        #     print("[ERROR] executor 已關閉，無法提交任務")
-        #     return
-
-        # print("[DEBUG] executor 仍然活著，提交舵機控制指令")
-
-        # 中斷當前線程
-        if self.control_thread is not None:
-            self.stop_event.set()  # 設置停止事件
-            self.control_thread.result()  # 等待線程結束
-            # self.control_thread = None  # 清空線程引用
-
-        # 清除中斷標記
-        self.stop_event.clear()
+        def retarget():
+            self.decision = decision  # 更新舵角
+
+        future = self.sequencer.update(self.plan_key, retarget)
+        if future is None:
+            retarget()
+            future = self.sequencer.run(
+                self.plan_key,
+                [Step(apply=lambda confirmed: self._compile_rudder_plan(), label="compile")],
+                start_event=start_event,
+                on_cancel=lambda: print(f"enginID:{self.enginID},舵角被中斷"),
+            )
+        self.control_thread = future
+        return future
 
-        # 使用線程池執行任務
-        self.control_thread = self.executor.submit(
-            self._control_rudder_thread, decision
+    def _compile_rudder_plan(self):
+        # 依當下的舵角編譯規劃 (規劃結果 True 代表舵角已到達目標)
+        if self.mode != "FUMode":
+            print("模式切換成FUMode")
+            return [Step(send=self._switch_to_fumode, timeout=self.pacing.gap(self.port, "rudder_mode"), apply=lambda confirmed: False, label="AutopilotFUMode")]
+        if self.feedback_active():
+            self._resync()
+        if self.decision == self.currudder:
+            self.file.writefile(self.filename, "Nochange", method="csv")
+            # print(self.enginID, "舵角不變")
+            return None
+        # 這次轉舵的起點，結束時只記錄一筆 (見 _log_move)
+        self.move_from = self.currudder
+        self.move_started = time.perf_counter()
+        self.move_sent = 0
+        self.sent_times.clear()
+        return [self._rudder_step()]
+
+    # 回授模式：板子回授 (RudderFeedback) 確認送出的度數，逾時視為漏指令、以回授重新同步後再送；
+    # 連續逾時 FEEDBACK_MAX_MISSES 次 (舵卡住或回授異常) 則停止，避免板子的舵角命令一直累加。
+    # 回授超過 FEEDBACK_MAX_AGE 秒沒更新就退回原本計數指令的開迴路。
+    FEEDBACK_CONFIRM_TIMEOUT = 0.3
+    FEEDBACK_MAX_MISSES = 3
+    FEEDBACK_MAX_AGE = 1.0
+    # 連發間隔的調整：回授延遲的平滑係數；漏指令時間隔放大 1.5 倍 (上限 BURST_MAX_BACKOFF)，確認後每次縮回 0.9 倍
+    LAG_SMOOTHING = 0.3
+    BURST_MAX_BACKOFF = 3.0
+
+    def feedback_active(self):
+        # 是否以板子回授控制舵角
+        return (
+            self.feedback_tracking
+            and self.rudder_ser is not None
+            and self.rawdata.age("RudderFeedback") <= self.FEEDBACK_MAX_AGE
         )
 
-    def _control_rudder_thread(self, decision=0):
-        # curangle = self.decision  # 獲取當前舵角
-        self.decision = decision  # 更新舵角
-        step = abs(self.step - decision)
-
-        def update_rudder(command_func, command_str, increment):
-            # start = time.time()
-            for _ in range(int(step)):
-                if self.stop_event.is_set():  # 檢查是否收到中斷信號
-                    msg = f"enginID:{self.enginID},舵角被中斷"
-                    print(msg)
-                    return msg
-                if self.rudder_ser is not None:
-                    try:
-                        command_func()  # 執行指令
-                    except Exception as e:
-                        self.controlRudder(decision=0)
-                        print(f"[CRITICAL] 未知錯誤: {e}，將舵角歸零...")
-                        self.file.writefile(
-                            "01_Data/99_Error/RudderSys/"
-                            + str(self.file.timestr(timstr="d"))
-                            + ".csv",
-                            str(e),
-                            method="csv",
-                        )
-
-                self.currudder += increment
-                self.step += increment
-                # print(self.enginID, "目前舵角", self.currudder)
-                result = f"{self.enginID},{self.currudder},{command_str}"
-                self.file.writefile(self.filename, str(result), method="csv")
-                time.sleep(0.08)
-            # end = time.time()
-            # print("舵角動作完成時間",end-start,"step:" ,step, "send_command:",command_str,"enginID:" ,self.enginID,"decision:" ,decision)
-
-            return command_str
-
-        if self.mode == "FUMode":
-            if decision < self.currudder:
-                update_rudder(self.send_FUPortOneDeg, "FUPortOneDeg", -1)
-            elif decision > self.currudder:
-                update_rudder(self.send_FUStbOneDeg, "FUStbOneDeg", 1)
+    def _resync(self):
+        # 以板子回授修正計算舵角 (step 一起修正)，回傳修正前的差距
+        error = self.currudder - self.rawdata.RudderFeedback
+        if error:
+            self.currudder -= error
+            self.step -= error
+            self.sent_times.clear()
+            RUDDER_RESYNC_TOTAL.inc(engine=self.enginID)
+            self._publish_state()
+            self.file.writefile(self.filename, f"{self.enginID},resync,{self.currudder},{error}", method="csv")
+        return error
+
+    def _log_move(self, result):
+        # 每次轉舵只寫一筆：目前舵角、結果、起點、送出度數、耗時、回授
+        seconds = time.perf_counter() - self.move_started
+        result = f"{self.enginID},{self.currudder},{result},{self.move_from},{self.move_sent},{seconds:.3f},{self.rawdata.RudderFeedback}"
+        self.file.writefile(self.filename, result, method="csv")
+
+    def _burst_interval(self, window):
+        # 連發時每一度的間隔：不小於板子可接受的間隔 (rudder_burst，漏指令時放大)，回授延遲變長時放慢到 延遲/window
+        return max(self.pacing.gap(self.port, "rudder_burst") * self.burst_backoff, self.feedback_lag / window)
+
+    def _rudder_step(self, misses=0):
+        """
+        朝目前的目標舵角 (self.decision) 轉一度；完成後接下一步，因此轉舵中途換目標會直接改變方向或終點。
+        回授模式為連發：不等每一度確認，最多讓 burst_window 度領先回授，間隔見 _burst_interval；
+        送到目標後等回授跟上才結束。開迴路每一度固定保持 rudder_step 間隔。
+        """
+        closed_loop = self.feedback_active()
+        window = max(1, self.burst_window) if closed_loop else 1
+        interval = self._burst_interval(window) if window > 1 else self.pacing.gap(self.port, "rudder_step")
+        sent = False
+        step_start = None
+
+        def done():
+            if self.decision != self.currudder:
+                return False
+            if closed_loop and self.rawdata.RudderFeedback != self.currudder:
+                return False
+            self._log_move(True)
+            return True
+
+        def send():
+            nonlocal sent, step_start
+            if self.decision == self.currudder:
+                return  # 已送到目標，等回授跟上
+            step_start = time.perf_counter()
+            if self.decision < self.currudder:
+                command_func, increment = self.send_FUPortOneDeg, -1
             else:
-                self.file.writefile(self.filename, "Nochange", method="csv")
-                # print(self.enginID, "舵角不變")
+                command_func, increment = self.send_FUStbOneDeg, 1
+            if self.rudder_ser is not None:
+                try:
+                    command_func()  # 執行指令
+                except Exception as e:
+                    print(f"[CRITICAL] 未知錯誤: {e}，將舵角歸零...")
+                    self.file.writefile(
+                        "01_Data/99_Error/RudderSys/"
+                        + str(self.file.timestr(timstr="d"))
+                        + ".csv",
+                        str(e),
+                        method="csv",
+                    )
+                    if self.decision == 0:
+                        raise
+                    self.controlRudder(decision=0)
+                    return
+            sent = True
+            self.last_step_at = time.monotonic()
+            self.currudder += increment
+            self.step += increment
+            self.move_sent += 1
+            self.sent_times[self.currudder] = self.last_step_at
+            self._publish_state()
+            # print(self.enginID, "目前舵角", self.currudder)
+
+        def ready():
+            # 送出後：領先回授的度數小於 window 就能送下一度；沒有送出 (等回授跟上)：回授到達才算
+            in_flight = abs(self.currudder - self.rawdata.RudderFeedback)
+            return in_flight < window if sent else in_flight == 0
+
+        def after(confirmed):
+            if sent:
+                RUDDER_STEP_SECONDS.observe(time.perf_counter() - step_start, engine=self.enginID)
+            if confirmed or not closed_loop:
+                self.burst_backoff = max(1.0, self.burst_backoff * 0.9)
+                return [self._rudder_step()]
+            print(f"enginID:{self.enginID},舵角 {self.currudder} 未在時限內得到回授確認 (回授 {self.rawdata.RudderFeedback})")
+            self.burst_backoff = min(self.BURST_MAX_BACKOFF, self.burst_backoff * 1.5)
+            self._resync()
+            if misses + 1 >= self.FEEDBACK_MAX_MISSES:
+                print(f"enginID:{self.enginID},連續 {misses + 1} 次沒有回授確認，停止轉舵")
+                self._log_move(False)
+                return False
+            return [self._rudder_step(misses + 1)]
+
+        return Step(
+            send=send,
+            # 和上一度至少隔 interval 才送 (已送到目標只等回授，不用等)
+            delay=0.0 if self.decision == self.currudder else max(0.0, self.last_step_at + interval - time.monotonic()),
+            expect=ready if closed_loop else None,
+            timeout=self.FEEDBACK_CONFIRM_TIMEOUT + self.feedback_lag if closed_loop else interval,
+            skip_if=done,
+            apply=after,
+            label="rudder",
+        )
+
+    def _switch_to_fumode(self):
+        if self.rudder_ser is not None:
+            self.send_AutopilotFUMode()
         else:
-            if self.stop_event.is_set():  # 檢查是否收到中斷信號
-                print("decision", decision, "被中斷")
-                return
-            print("模式切換成FUMode")
-            self.mode = self.send_AutopilotFUMode()
-            time.sleep(0.3)
+            self.mode = "FUMode"
 
 
 # 使用範例
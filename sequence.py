@@ -0,0 +1,198 @@
+import threading
+import time
+import itertools
+from collections import OrderedDict
+
+
+def parse_steps(steps):
+    """
+    檢查並整理動作序列：每一步為 {Command, params, duration}。
+    params 會併入指令內容 (例如 Speed、Range)，duration 為這一步維持的秒數。
+    格式錯誤時丟出 ValueError。
+    """
+    if not isinstance(steps, list) or not steps:
+        raise ValueError("steps 必須是非空的陣列")
+    parsed = []
+    for index, step in enumerate(steps):
+        if not isinstance(step, dict) or "Command" not in step:
+            raise ValueError(f"第 {index} 步缺少 Command")
+        params = step.get("params") or {}
+        if not isinstance(params, dict):
+            raise ValueError(f"第 {index} 步的 params 必須是物件")
+        duration = step.get("duration")
+        if isinstance(duration, bool) or not isinstance(duration, (int, float)) or duration < 0:
+            raise ValueError(f"第 {index} 步的 duration 必須是大於等於 0 的秒數")
+        parsed.append({"command": {**params, "Command": step["Command"]}, "duration": float(duration)})
+    return parsed
+
+
+class SequenceRunner:
+    """
+    伺服器端的定時動作序列 (例如四角測試)。
+    以 monotonic 時鐘排程，每一步在計畫時間點交給 submit() 排入致動執行緒，
+    不受客戶端 HTTP 抖動影響，並記錄每一步被致動執行緒實際開始執行的時間與計畫的偏差。
+    同一時間只執行一個序列；中止或任一步失敗 (執行錯誤或致動器沒有到達目標) 時送空俥。
+    """
+
+    def __init__(self, submit, lookup=None, started=None, neutral=None, history=20):
+        self.submit = submit  # submit(command_data, source) -> 指令編號
+        self.lookup = lookup  # lookup(指令編號) -> 指令紀錄，用來判斷上一步是否執行失敗
+        self.started = started  # started(指令編號) -> 開始執行的 monotonic 時間 (尚未開始為 None)
+        self.neutral = neutral or {"Command": 0}  # 中止或失敗時送出的指令
+        self.history = history
+        self.records = OrderedDict()
+        self.cond = threading.Condition()
+        self.ids = itertools.count(1)
+        self.current_id = None
+        self.abort_event = None
+
+    def start(self, steps):
+        # 建立序列並在背景執行，已有序列執行中則先中止 (不送空俥，由新序列接手)
+        steps = parse_steps(steps)
+        self.abort_running(reason="被新序列取代", neutral=False)
+        with self.cond:
+            seq_id = next(self.ids)
+            offset = 0.0
+            step_records = []
+            for step in steps:
+                step_records.append({
+                    "command": step["command"],
+                    "duration": step["duration"],
+                    "planned_offset_ms": round(offset * 1000, 1),
+                    "drift_ms": None,
+                    "cmd_id": None,
+                    "state": "pending",
+                })
+                offset += step["duration"]
+            self.records[seq_id] = {
+                "id": seq_id,
+                "state": "running",
+                "reason": None,
+                "step_index": None,
+                "started_at": time.time(),
+                "total_duration": round(offset, 3),
+                "steps": step_records,
+            }
+            while len(self.records) > self.history:
+                self.records.popitem(last=False)
+            self.current_id = seq_id
+            self.abort_event = threading.Event()
+            thread = threading.Thread(target=self._run, args=(seq_id, self.abort_event), daemon=True)
+            thread.start()
+            return seq_id
+
+    def abort(self, seq_id, reason="使用者中止", neutral=True):
+        # 中止指定序列，回傳是否真的中止了執行中的序列
+        with self.cond:
+            if seq_id != self.current_id:
+                return False
+            return self._abort_locked(reason, neutral)
+
+    def abort_running(self, reason="手動指令接手", neutral=False):
+        # 中止目前執行中的序列 (手動 /control 接手時使用)
+        with self.cond:
+            return self._abort_locked(reason, neutral)
+
+    def _abort_locked(self, reason, neutral):
+        record = self.records.get(self.current_id)
+        if record is None or record["state"] != "running":
+            return False
+        self.abort_event.set()
+        self._finish(record, "aborted", reason)
+        if neutral:
+            self.submit(dict(self.neutral), source="sequence")
+        return True
+
+    def _finish(self, record, state, reason=None):
+        record["state"] = state
+        record["reason"] = reason
+        for step in record["steps"]:
+            if step["state"] == "running":
+                step["state"] = "done" if state == "done" else state
+            elif step["state"] == "pending":
+                step["state"] = "skipped"
+        self.current_id = None
+
+    def get(self, seq_id):
+        # 取得序列狀態與每一步的偏差
+        with self.cond:
+            record = self.records.get(seq_id)
+            if record is None:
+                return None
+            record = dict(record, steps=[dict(step) for step in record["steps"]])
+        drifts = [abs(step["drift_ms"]) for step in record["steps"] if step["drift_ms"] is not None]
+        record["max_drift_ms"] = max(drifts) if drifts else None
+        return record
+
+    def _step_failed(self, step):
+        # 執行錯誤，或驅動的致動器已結束卻沒有到達目標 (結果為 False)
+        if self.lookup is None or step["cmd_id"] is None:
+            return False
+        command = self.lookup(step["cmd_id"])
+        if command is None:
+            return False
+        if command["state"] == "error":
+            return True
+        return any(result is False for result in (command.get("actuation") or {}).values())
+
+    def _record_drift(self, steps, planned):
+        # 已被致動執行緒開始執行的步驟，記錄實際開始時間與計畫的偏差
+        if self.started is None:
+            return
+        for index, step in enumerate(steps):
+            if step["drift_ms"] is not None or step["cmd_id"] is None:
+                continue
+            started = self.started(step["cmd_id"])
+            if started is not None:
+                step["drift_ms"] = round((started - planned[index]) * 1000, 2)
+
+    def _run(self, seq_id, abort_event):
+        record = self.records[seq_id]
+        t0 = time.monotonic()
+        steps = record["steps"]
+        planned_times = [t0 + step["planned_offset_ms"] / 1000 for step in steps]
+        previous = None
+        for index, step in enumerate(steps):
+            planned = planned_times[index]
+            if abort_event.wait(max(0.0, planned - time.monotonic())):
+                return
+            with self.cond:
+                self._record_drift(steps, planned_times)
+                # 在鎖內確認沒有被中止才送出，避免中止後又多送一步
+                if abort_event.is_set():
+                    return
+                if previous is not None and self._step_failed(previous):
+                    self._fail(record, f"第 {index - 1} 步執行失敗")
+                    return
+                try:
+                    step["cmd_id"] = self.submit(step["command"], source="sequence")
+                except Exception as e:
+                    self._fail(record, f"第 {index} 步送出失敗: {e}")
+                    return
+                step["state"] = "running"
+                if previous is not None:
+                    previous["state"] = "done"
+                record["step_index"] = index
+            previous = step
+
+        end = t0 + record["total_duration"]
+        if abort_event.wait(max(0.0, end - time.monotonic())):
+            return
+        with self.cond:
+            self._record_drift(steps, planned_times)
+            if abort_event.is_set():
+                return
+            if previous is not None and self._step_failed(previous):
+                self._fail(record, f"第 {len(record['steps']) - 1} 步執行失敗")
+                return
+            self._finish(record, "done")
+
+    def _fail(self, record, reason):
+        # 任一步失敗：結束序列並送空俥
+        print(f"[SequenceRunner] 序列 {record['id']} 失敗: {reason}，回空俥")
+        self.abort_event.set()
+        self._finish(record, "failed", reason)
+        try:
+            self.submit(dict(self.neutral), source="sequence")
+        except Exception as e:
+            print(f"[SequenceRunner] 空俥送出失敗，原因: {e}")
@@ -0,0 +1,57 @@
+class SerialLineReader:
+    """
+    串口逐行讀取器 (LeverSys、RudderSys 共用)。
+    一次把 in_waiting 的資料全部讀進可重複使用的 bytearray，切出每一行直接交給解析器
+    (nemadict.fast_formatjson 接受 bytes/bytearray)，板子不用先把整行轉成 str，
+    也不再用 str(readline()) 加三次 replace (那樣還會把資料裡所有的字母 b 刪掉)。
+    用過的資料以 del buffer[:start] 就地移除，緩衝區本身不重新配置。
+
+    板子的句子只有十幾到二十幾個位元組，memoryview 切片本身就要 184 bytes，
+    比複製這一行還大，所以每行是 bytearray 的切片 (小的複製) 而不是 memoryview。
+    """
+
+    def __init__(self, ser, separator=b"\r\n", max_line=4096):
+        self.ser = ser
+        self.separator = separator
+        self.max_line = max_line  # 超過這個長度還沒有換行就丟棄 (雜訊或鮑率錯誤)
+        self.buffer = bytearray()
+        self.dropped = 0  # 因過長被丟棄的位元組數
+
+    def clear(self):
+        # 清掉尚未成行的殘留資料 (例如 flushInput 之後)
+        del self.buffer[:]
+
+    def fill(self):
+        # 讀取目前串口上所有資料 (不阻塞：所有串口共用一條 I/O 執行緒)，回傳讀到的位元組數
+        waiting = self.ser.in_waiting
+        if waiting <= 0:
+            return 0
+        data = self.ser.read(waiting)
+        if data:
+            self.buffer += data
+        return len(data)
+
+    def lines(self):
+        # 切出緩衝區中所有完整的行 (不含分隔符號)，剩下不完整的部分留到下次
+        buffer = self.buffer
+        separator = self.separator
+        start = 0
+        try:
+            while True:
+                end = buffer.find(separator, start)
+                if end < 0:
+                    break
+                if end > start:
+                    yield buffer[start:end]
+                start = end + len(separator)
+        finally:
+            if start:
+                del buffer[:start]
+            if len(buffer) > self.max_line:
+                self.dropped += len(buffer)
+                del buffer[:]
+
+    def read_lines(self):
+        # fill() 後切行，回傳 bytes 行的 list，方便不在意配置的呼叫端
+        self.fill()
+        return [bytes(line) for line in self.lines()]
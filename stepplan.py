@@ -0,0 +1,215 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import reactor as serial_reactor
+import tracing
+
+
+class Step:
+    """
+    動作規劃中的一步 (換檔、電壓步進、一度舵角...)。
+
+    send      送出指令的函式，None 表示這一步不送指令 (只等待或只執行 apply)
+    delay     上一步完成後至少再等多久才送 (最早送出時間)
+    expect    確認這一步的回授條件，None 表示不需確認
+    timeout   等待 expect 成立的上限；沒有 expect 時為送出後固定保持的時間
+    required  expect 逾時則整個規劃失敗；False 則繼續下一步
+    skip_if   送出前檢查，成立代表目標已達成，剩下的步驟都不送 (規劃成功結束)
+    apply     這一步完成時呼叫 apply(confirmed)：回傳 list 則接在後面執行 (依當下狀態編譯後續步驟)，
+              回傳 False 則規劃失敗
+    """
+
+    __slots__ = ("send", "delay", "expect", "timeout", "required", "skip_if", "apply", "label")
+
+    def __init__(self, send=None, delay=0.0, expect=None, timeout=0.0, required=False, skip_if=None, apply=None, label=""):
+        self.send = send
+        self.delay = delay
+        self.expect = expect
+        self.timeout = timeout
+        self.required = required
+        self.skip_if = skip_if
+        self.apply = apply
+        self.label = label
+
+    def __repr__(self):
+        return f"Step({self.label!r}, delay={self.delay}, timeout={self.timeout})"
+
+
+class Plan:
+    """一個致動器目前執行中的規劃；future 的結果為 True 代表到達目標，被取代或失敗為 False"""
+
+    def __init__(self, key, steps, start_event=None, on_cancel=None):
+        self.key = key
+        self.steps = list(steps)
+        self.start_event = start_event  # 同一批致動器一起放行
+        self.on_cancel = on_cancel  # 被新規劃取代或取消時呼叫 (例如清掉佇列中的舊指令)
+        self.future = Future()
+        self.trace_id = tracing.current_trace.get()
+        self.ready_at = None  # 上一步完成的時間
+        self.sent_at = None  # 目前這一步送出的時間，None 表示還沒送出
+        self.sent_ns = None
+        self.started_ns = None
+
+    def remaining(self):
+        return len(self.steps)
+
+
+class StepSequencer:
+    """
+    依期限執行所有致動器的動作規劃，取代各自的控制執行緒與 time.sleep。
+    在 I/O 執行緒 (reactor) 上執行：每一輪檢查各規劃的目前步驟是否到了送出時間、回授是否已確認，
+    讀到新資料後立即重新檢查，沒有事情時睡到最近的期限。
+    run() 以新規劃取代同一個致動器剩下的步驟後立即返回，不等舊規劃結束。
+    """
+
+    def __init__(self, reactor=None):
+        self.reactor = reactor if reactor is not None else serial_reactor.REACTOR
+        self.lock = threading.RLock()
+        self.plans = {}  # {致動器 key: Plan}
+        self.attached = False
+
+    def run(self, key, steps, start_event=None, on_cancel=None):
+        """執行新規劃並回傳其 Future；同一個 key 的舊規劃立即取消 (結果為 False)"""
+        plan = Plan(key, steps, start_event, on_cancel)
+        with self.lock:
+            old = self.plans.get(key)
+            self.plans[key] = plan
+            if old is not None:
+                self._finish(old, False, cancelled=True)
+            if not self.attached:
+                self.reactor.add_timer(self, self.tick)
+                self.attached = True
+        self.reactor.wake()
+        return plan.future
+
+    def cancel(self, key):
+        # 取消致動器目前的規劃，回傳其 Future (沒有則回傳 None)
+        with self.lock:
+            plan = self.plans.pop(key, None)
+            if plan is None:
+                return None
+            self._finish(plan, False, cancelled=True)
+            return plan.future
+
+    def update(self, key, change):
+        """
+        在排程器的鎖內對執行中的規劃呼叫 change() (例如改變目標)，回傳該規劃的 Future；
+        沒有執行中的規劃則不呼叫並回傳 None。和規劃的推進互斥，不會在最後一步完成時漏掉新目標。
+        """
+        with self.lock:
+            plan = self.plans.get(key)
+            if plan is None:
+                return None
+            change()
+        self.reactor.wake()
+        return plan.future
+
+    def current(self, key):
+        plan = self.plans.get(key)
+        return plan.future if plan is not None else None
+
+    def remaining(self, key):
+        # 尚未完成的步驟數
+        plan = self.plans.get(key)
+        return plan.remaining() if plan is not None else 0
+
+    def tick(self):
+        # 由 I/O 執行緒呼叫：推進所有規劃，回傳最近的期限
+        next_due = None
+        with self.lock:
+            for plan in list(self.plans.values()):
+                with tracing.use_trace(plan.trace_id):
+                    due = self._advance(plan)
+                if due is not None and (next_due is None or due < next_due):
+                    next_due = due
+        return next_due
+
+    def _active(self, plan):
+        return self.plans.get(plan.key) is plan
+
+    def _advance(self, plan):
+        # 盡量推進規劃，回傳這個規劃下一個期限 (None 表示等放行或已結束)
+        while self._active(plan):
+            now = time.monotonic()
+            if plan.ready_at is None:
+                if plan.start_event is not None and not plan.start_event.is_set():
+                    return None
+                plan.ready_at = now
+                plan.started_ns = time.perf_counter_ns()
+                plan.future.set_running_or_notify_cancel()
+            if not plan.steps:
+                self._finish(plan, True)
+                return None
+            step = plan.steps[0]
+            try:
+                if plan.sent_at is None:
+                    send_at = plan.ready_at + step.delay
+                    if now < send_at:
+                        return send_at
+                    if step.skip_if is not None and step.skip_if():
+                        plan.steps.clear()
+                        continue
+                    if step.send is not None:
+                        step.send()
+                        if not self._active(plan):
+                            return None
+                    plan.sent_at = now
+                    plan.sent_ns = time.perf_counter_ns()
+                confirmed = True
+                if step.expect is not None:
+                    confirmed = step.expect()
+                if not confirmed or step.expect is None:
+                    hold_until = plan.sent_at + step.timeout
+                    if now < hold_until:
+                        return hold_until
+                self._complete(plan, step, confirmed)
+            except Exception as e:
+                print(f"[StepSequencer] {plan.key} {step.label} 發生錯誤: {e}")
+                self._finish(plan, e)
+                return None
+        return None
+
+    def _complete(self, plan, step, confirmed):
+        plan.steps.pop(0)
+        tracing.add_span(
+            "StepSequencer.step",
+            plan.sent_ns,
+            time.perf_counter_ns(),
+            actuator=str(plan.key),
+            step=step.label,
+            confirmed=confirmed,
+        )
+        plan.ready_at = time.monotonic()
+        plan.sent_at = None
+        result = step.apply(confirmed) if step.apply is not None else None
+        if not self._active(plan):
+            return
+        if result is False or (not confirmed and step.required):
+            self._finish(plan, False)
+        elif result:
+            plan.steps[0:0] = result
+
+    def _finish(self, plan, result, cancelled=False):
+        # 呼叫端需持有 self.lock
+        if self.plans.get(plan.key) is plan:
+            del self.plans[plan.key]
+        if plan.future.done():
+            return
+        if cancelled and plan.on_cancel is not None:
+            try:
+                plan.on_cancel()
+            except Exception as e:
+                print(f"[StepSequencer] {plan.key} 取消處理錯誤: {e}")
+        if plan.started_ns is not None:
+            tracing.add_span("StepSequencer.plan", plan.started_ns, time.perf_counter_ns(), actuator=str(plan.key), result=str(result))
+        if not plan.future.running():
+            plan.future.set_running_or_notify_cancel()
+        if isinstance(result, BaseException):
+            plan.future.set_exception(result)
+        else:
+            plan.future.set_result(result)
+
+
+# 所有致動器共用的排程器 (跑在 reactor.REACTOR 上)
+SEQUENCER = StepSequencer()
@@ -0,0 +1,65 @@
+import json
+import threading
+import time
+import requests
+
+
+def merge_delta(target, delta):
+    # 把 /stream 的 delta 合併進目前狀態 (巢狀欄位逐層合併)
+    for key, value in delta.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_delta(target[key], value)
+        else:
+            target[key] = value
+
+
+class StatusStream:
+    """
+    訂閱 apimain 的 /stream (Server-Sent Events)，在背景執行緒維護最新的 /status 內容。
+    取代每次送指令後再 GET /status 的輪詢。
+    """
+
+    def __init__(self, url="http://127.0.0.1:5899/stream", on_update=None, retry=1.0):
+        self.url = url
+        self.on_update = on_update  # 狀態更新時呼叫 on_update(status)
+        self.retry = retry  # 斷線後幾秒重連
+        self.status = None
+        self.thread = None
+
+    def start(self):
+        # 以 daemon 執行緒背景訂閱，不會卡住 asyncio 迴圈
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def run(self):
+        while True:
+            try:
+                with requests.get(self.url, stream=True, timeout=(3, 30)) as response:
+                    event = None
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line.startswith("event:"):
+                            event = line[6:].strip()
+                        elif line.startswith("data:"):
+                            try:
+                                data = json.loads(line[5:])
+                            except ValueError as e:
+                                # 收到壞掉的一行只略過，不中斷串流
+                                print(f"[StatusStream] 狀態資料格式錯誤，略過: {e}")
+                                continue
+                            self._handle(event, data)
+                        elif not line:
+                            event = None
+            except Exception as e:
+                print(f"[StatusStream] 狀態串流中斷: {e}，{self.retry} 秒後重連")
+            time.sleep(self.retry)
+
+    def _handle(self, event, data):
+        if event == "snapshot":
+            self.status = data
+        elif event == "delta" and self.status is not None:
+            merge_delta(self.status, data)
+        else:
+            return
+        if self.on_update is not None:
+            self.on_update(self.status)
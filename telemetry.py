@@ -0,0 +1,170 @@
+import threading
+import time
+from array import array
+from collections import namedtuple
+from types import MappingProxyType
+
+
+# 唯讀快照：version 每次內容變化加一，data 為 {來源: {欄位: 值}}
+Snapshot = namedtuple("Snapshot", ["version", "data", "timestamp"])
+
+
+class TelemetryHub:
+    """
+    遙測快照發布中心。
+    接收執行緒呼叫 publish() 產生新的唯讀快照並整個替換，
+    讀取端直接拿 self.snapshot，不需要任何鎖，也不會讀到改到一半的資料。
+    """
+
+    def __init__(self):
+        self.publish_lock = threading.Lock()  # 只有發布端之間互斥
+        self.changed = threading.Condition(self.publish_lock)  # 有新版本時通知等待者
+        self.snapshot = Snapshot(0, MappingProxyType({}), time.time())
+
+    def publish(self, source, values):
+        # 合併某個來源的新數值，內容沒變就不增加版本
+        with self.publish_lock:
+            old = self.snapshot
+            current = old.data.get(source)
+            merged = dict(current) if current is not None else {}
+            merged.update(values)
+            if current is not None and merged == current:
+                return old.version
+            data = dict(old.data)
+            data[source] = MappingProxyType(merged)
+            self.snapshot = Snapshot(old.version + 1, MappingProxyType(data), time.time())
+            self.changed.notify_all()
+            return self.snapshot.version
+
+    def wait_for_change(self, version, timeout=None):
+        # 等到快照版本比 version 新才回傳，逾時則回傳目前快照
+        with self.changed:
+            self.changed.wait_for(lambda: self.snapshot.version != version, timeout)
+            return self.snapshot
+
+    def get(self, source, default=None):
+        # 讀取某個來源目前的唯讀資料
+        return self.snapshot.data.get(source, default)
+
+
+class FieldNotifier:
+    """
+    欄位層級的更新通知。
+    接收執行緒以 update() 寫入新數值，只喚醒在等待這些欄位的執行緒；
+    等待端以 wait_for() 阻塞到條件成立或逾時，不需要每 10ms 輪詢。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conditions = {}  # {欄位: Condition}，共用同一把鎖
+
+    def _condition(self, field):
+        condition = self.conditions.get(field)
+        if condition is None:
+            condition = self.conditions[field] = threading.Condition(self.lock)
+        return condition
+
+    def update(self, target, values):
+        # 把 values 合併進 target (例如 rawdata)，並通知等待這些欄位的執行緒
+        with self.lock:
+            target.update(values)
+            for field in values:
+                condition = self.conditions.get(field)
+                if condition is not None:
+                    condition.notify_all()
+
+    def wait_for(self, field, predicate, timeout=None):
+        # 等到 predicate() 成立 (field 每次更新時重新檢查)，逾時回傳 False
+        with self.lock:
+            return self._condition(field).wait_for(predicate, timeout)
+
+
+class TelemetryRecord:
+    """
+    板子回報資料的緊湊紀錄 (取代 {欄位: 字串} 的 rawdata)。
+    欄位固定 (__slots__)，數值在收到時就轉成 int/float，熱路徑直接讀 record.LPS_L_vol；
+    每個欄位另記最後更新時間 (time.monotonic，0 表示尚未收到) 與收到的原始字串 (給 /status)。
+    仍可用 record["欄位"] 讀取與 update(dict) 寫入；不在欄位表中的資料原樣放在 extra。
+    以 record_type() 建立各板子的紀錄類別。
+    """
+
+    __slots__ = ("stamps", "text", "extra")
+    FIELDS = ()  # ((欄位, 型別, 預設值), ...)
+    INDEX = {}  # {欄位: (索引, 型別)}
+
+    def __init__(self):
+        self.stamps = array("d", [0.0]) * len(self.FIELDS)
+        self.text = [None] * len(self.FIELDS)
+        self.extra = {}
+        self.reset()
+
+    def reset(self):
+        # 回到預設值 (斷線時使用)
+        for index, (name, _, default) in enumerate(self.FIELDS):
+            setattr(self, name, default)
+            self.stamps[index] = 0.0
+            self.text[index] = str(default)
+        self.extra.clear()
+
+    def update(self, values):
+        # 寫入解析結果；轉換失敗的欄位保留上一筆數值
+        now = time.monotonic()
+        index = self.INDEX
+        for name, value in values.items():
+            entry = index.get(name)
+            if entry is None:
+                self.extra[name] = value
+                continue
+            position, convert = entry
+            text = value
+            if type(value) is not convert:
+                try:
+                    value = convert(value)
+                except (TypeError, ValueError):
+                    continue
+            setattr(self, name, value)
+            self.stamps[position] = now
+            self.text[position] = str(text)
+
+    def __getitem__(self, name):
+        if name in self.INDEX:
+            return getattr(self, name)
+        return self.extra[name]
+
+    def __setitem__(self, name, value):
+        self.update({name: value})
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def age(self, name):
+        # 欄位距離上次更新的秒數，從未收到回傳 inf
+        stamp = self.stamps[self.INDEX[name][0]]
+        return time.monotonic() - stamp if stamp else float("inf")
+
+    def as_status(self):
+        # 轉回 /status 原本的字串格式 (整批發布時使用)
+        status = {name: text for (name, _, _), text in zip(self.FIELDS, self.text)}
+        status.update(self.extra)
+        return status
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name, _, _ in self.FIELDS)
+        return f"{type(self).__name__}({fields})"
+
+
+def record_type(name, fields):
+    """建立固定欄位的遙測紀錄類別，fields 為 ((欄位, 型別, 預設值), ...)"""
+    fields = tuple(fields)
+    return type(
+        name,
+        (TelemetryRecord,),
+        {
+            "__slots__": tuple(field[0] for field in fields),
+            "FIELDS": fields,
+            "INDEX": {field[0]: (index, field[1]) for index, field in enumerate(fields)},
+        },
+    )
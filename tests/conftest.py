@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+# 專案的模組都放在根目錄 (沒有套件)，讓測試可以直接 import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stepplan import StepSequencer  # noqa: E402
+
+
+class ManualReactor:
+    """測試用的 reactor：不開 I/O 執行緒，由測試自己呼叫 tick() 推進規劃"""
+
+    def __init__(self):
+        self.timers = {}
+
+    def add_timer(self, key, callback):
+        self.timers[key] = callback
+
+    def remove_timer(self, key):
+        self.timers.pop(key, None)
+
+    def wake(self):
+        pass
+
+
+@pytest.fixture
+def sequencer():
+    return StepSequencer(reactor=ManualReactor())
@@ -0,0 +1,71 @@
+from commandqueue import (
+    PRIORITY_GEAR,
+    PRIORITY_NEUTRAL,
+    PRIORITY_STEP,
+    BoardCommandQueue,
+    classify,
+)
+
+
+def drain(queue):
+    commands = []
+    while not queue.empty():
+        commands.append(queue.get(timeout=0)[0])
+    return commands
+
+
+def test_classify():
+    assert classify("LPS_L_Neutral") == (PRIORITY_NEUTRAL, 0)
+    assert classify("STA_SEL_LONG_PRESS") == (PRIORITY_NEUTRAL, None)
+    assert classify("LPS_R_Forward") == (PRIORITY_GEAR, 1)
+    assert classify("LPS_L_Reverse") == (PRIORITY_GEAR, 0)
+    assert classify("LPS_R_ACC_Ten") == (PRIORITY_STEP, 1)
+    assert classify("LPS_L_DEC") == (PRIORITY_STEP, 0)
+
+
+def test_higher_priority_first_and_fifo_within_priority():
+    queue = BoardCommandQueue()
+    for command in ("LPS_L_ACC", "LPS_R_Forward", "LPS_L_DEC_Five", "LPS_L_Forward", "STA_SEL_LONG_PRESS"):
+        queue.put(command)
+    assert drain(queue) == [
+        "STA_SEL_LONG_PRESS",
+        "LPS_R_Forward",
+        "LPS_L_Forward",
+        "LPS_L_ACC",
+        "LPS_L_DEC_Five",
+    ]
+
+
+def test_get_returns_priority_and_trace():
+    queue = BoardCommandQueue()
+    queue.put("LPS_L_Forward", trace_id="t-1")
+    command, priority, enqueued_at, trace_id = queue.get(timeout=0)
+    assert (command, priority, trace_id) == ("LPS_L_Forward", PRIORITY_GEAR, "t-1")
+    assert enqueued_at > 0
+    assert queue.get(timeout=0) is None
+
+
+def test_neutral_cancels_pending_gear_and_steps_of_that_engine_only():
+    queue = BoardCommandQueue()
+    for command in ("LPS_L_Forward", "LPS_L_ACC", "LPS_L_ACC", "LPS_R_Forward", "LPS_R_ACC", "STA_SEL_LONG_PRESS"):
+        queue.put(command)
+    assert queue.put("LPS_L_Neutral") == 3
+    assert drain(queue) == ["STA_SEL_LONG_PRESS", "LPS_L_Neutral", "LPS_R_Forward", "LPS_R_ACC"]
+
+
+def test_neutral_keeps_earlier_neutral_of_same_engine():
+    queue = BoardCommandQueue()
+    queue.put("LPS_R_Neutral")
+    queue.put("LPS_R_DEC")
+    assert queue.put("LPS_R_Neutral") == 1
+    assert drain(queue) == ["LPS_R_Neutral", "LPS_R_Neutral"]
+
+
+def test_cancel_one_engine_or_all():
+    queue = BoardCommandQueue()
+    for command in ("LPS_L_ACC", "LPS_R_ACC", "LPS_L_Forward", "STA_SEL_LONG_PRESS"):
+        queue.put(command)
+    assert queue.cancel(0) == 2
+    assert queue.qsize() == 2
+    assert queue.cancel() == 2
+    assert queue.empty()
@@ -0,0 +1,102 @@
+import threading
+import time
+
+from commandworker import CommandWorker
+
+
+def coalescable(command_data):
+    # 叫站 (900) 不可被取代，其餘移動指令採最新優先
+    return command_data["Command"] != 900
+
+
+class BlockingExecute:
+    """第一筆指令卡住直到 release()，讓後面的指令留在佇列裡"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.executed = []
+        self.lock = threading.Lock()
+
+    def __call__(self, command_data):
+        with self.lock:
+            self.executed.append(command_data["Command"])
+        self.started.set()
+        self.release.wait(5)
+        return "ok"
+
+
+def wait_idle(worker, timeout=5):
+    # 等佇列清空且最後一筆執行完成
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = worker.stats()
+        record = worker.get(stats["current_id"]) if stats["current_id"] else None
+        if stats["pending"] == 0 and record is not None and record["state"] in ("done", "error"):
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_latest_command_replaces_queued_ones():
+    execute = BlockingExecute()
+    worker = CommandWorker(execute, coalesce=coalescable)
+    first = worker.submit({"Command": 1})
+    assert execute.started.wait(5)
+    second = worker.submit({"Command": 2})
+    third = worker.submit({"Command": 3})
+    latest = worker.submit({"Command": 4})
+
+    assert worker.get(second)["state"] == "superseded"
+    assert worker.get(second)["superseded_by"] == third
+    assert worker.get(third)["state"] == "superseded"
+    assert worker.get(third)["superseded_by"] == latest
+    assert worker.get(latest)["queue_position"] == 0
+
+    execute.release.set()
+    assert wait_idle(worker)
+    assert execute.executed == [1, 4]
+    assert worker.get(first)["state"] == "done"
+    assert worker.stats()["superseded"] == 2
+
+
+def test_non_coalescable_command_is_never_dropped():
+    execute = BlockingExecute()
+    worker = CommandWorker(execute, coalesce=coalescable)
+    worker.submit({"Command": 1})
+    assert execute.started.wait(5)
+    worker.submit({"Command": 2})
+    call = worker.submit({"Command": 900})
+    worker.submit({"Command": 3})
+    worker.submit({"Command": 4})
+
+    # 叫站之前的移動指令保留，叫站本身也不會被後面的指令取代
+    assert worker.get(call)["state"] == "queued"
+    execute.release.set()
+    assert wait_idle(worker)
+    assert execute.executed == [1, 2, 900, 4]
+
+
+def test_without_coalesce_every_command_runs_in_order():
+    execute = BlockingExecute()
+    worker = CommandWorker(execute)
+    worker.submit({"Command": 1})
+    assert execute.started.wait(5)
+    for command in (2, 3, 4):
+        worker.submit({"Command": command})
+    execute.release.set()
+    assert wait_idle(worker)
+    assert execute.executed == [1, 2, 3, 4]
+    assert worker.stats()["superseded"] == 0
+
+
+def test_failed_execute_is_recorded_as_error():
+    def execute(command_data):
+        raise RuntimeError("串口未連線")
+
+    worker = CommandWorker(execute)
+    cmd_id = worker.submit({"Command": 1})
+    assert wait_idle(worker)
+    record = worker.get(cmd_id)
+    assert record["state"] == "error"
+    assert "串口未連線" in record["msg"]
@@ -0,0 +1,57 @@
+import pytest
+
+from leverboard import LeverSys
+from telemetry import TelemetryHub
+
+
+@pytest.fixture
+def lever(sequencer):
+    return LeverSys(port="TEST_LEVER", telemetry=TelemetryHub(), sequencer=sequencer)
+
+
+def plan(lever, decision, volt, range, enginID=0):
+    return lever._plan_voltage_steps(decision, volt, lever._engine_command(enginID), range)
+
+
+def decision_for(volt):
+    return 5 - 2 * volt
+
+
+def test_no_steps_when_already_at_target(lever):
+    assert plan(lever, decision_for(2.71), 2.71, 0.1) == []
+
+
+@pytest.mark.parametrize(
+    "range, expected",
+    [
+        (0.1, ["LPS_L_ACC_Ten"] * 12 + ["LPS_L_ACC"]),
+        (0.05, ["LPS_L_ACC_Five"] * 24 + ["LPS_L_ACC"]),
+        (0.01, ["LPS_L_ACC"] * 121),
+    ],
+)
+def test_range_caps_step_size(lever, range, expected):
+    # 2.71V -> 1.50V：電壓下降用 *_ACC 指令 (板子指令命名相反，見 _plan_voltage_steps)
+    steps = plan(lever, decision_for(1.5), 2.71, range)
+    assert [command for command, _ in steps] == expected
+    assert all(abs(change) <= range + 1e-9 for _, change in steps)
+
+
+def test_steps_mix_sizes_largest_first(lever):
+    # 0.37V = 3 x 0.1 + 1 x 0.05 + 2 x 0.01
+    steps = plan(lever, decision_for(2.19), 2.56, 0.1, enginID=1)
+    assert [command for command, _ in steps] == ["LPS_R_ACC_Ten"] * 3 + ["LPS_R_ACC_Five"] + ["LPS_R_ACC"] * 2
+
+
+@pytest.mark.parametrize("start, target", [(2.71, 1.5), (2.19, 3.24), (3.3, 3.23), (2.0, 2.71), (2.713, 2.19)])
+@pytest.mark.parametrize("range", [0.01, 0.05, 0.1])
+def test_last_step_lands_on_target(lever, start, target, range):
+    steps = plan(lever, decision_for(target), start, range)
+    assert round(start + sum(change for _, change in steps), 2) == round(target, 2)
+    # 同一個規劃只往一個方向走
+    assert len({change > 0 for _, change in steps}) <= 1
+
+
+def test_rising_voltage_uses_dec_commands(lever):
+    steps = plan(lever, decision_for(3.24), 2.71, 0.1)
+    assert [command for command, _ in steps] == ["LPS_L_DEC_Ten"] * 5 + ["LPS_L_DEC"] * 3
+    assert all(change > 0 for _, change in steps)
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from sequence import SequenceRunner, parse_steps
+
+
+class FakeWorker:
+    """記錄送出的指令；lookup 回傳的狀態可由測試設定"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.submitted = []
+        self.records = {}
+        self.started_at = {}
+
+    def submit(self, command_data, source="api"):
+        with self.lock:
+            cmd_id = len(self.submitted) + 1
+            self.submitted.append((dict(command_data), source))
+            self.records[cmd_id] = {"state": "done", "actuation": None}
+            self.started_at[cmd_id] = time.monotonic()
+            return cmd_id
+
+    def get(self, cmd_id):
+        return self.records.get(cmd_id)
+
+    def started(self, cmd_id):
+        return self.started_at.get(cmd_id)
+
+    def commands(self):
+        return [command["Command"] for command, _ in self.submitted]
+
+
+def wait_state(runner, seq_id, states=("done", "failed", "aborted"), timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        record = runner.get(seq_id)
+        if record["state"] in states:
+            return record
+        time.sleep(0.005)
+    raise AssertionError(f"序列沒有結束: {runner.get(seq_id)}")
+
+
+def test_parse_steps_merges_params():
+    steps = parse_steps([{"Command": 1, "params": {"Speed": 2.0}, "duration": 1}])
+    assert steps == [{"command": {"Speed": 2.0, "Command": 1}, "duration": 1.0}]
+
+
+@pytest.mark.parametrize(
+    "steps",
+    [
+        [],
+        "1,2",
+        [{"duration": 1}],
+        [{"Command": 1, "params": [1], "duration": 1}],
+        [{"Command": 1, "duration": -1}],
+        [{"Command": 1, "duration": True}],
+    ],
+)
+def test_parse_steps_rejects_bad_input(steps):
+    with pytest.raises(ValueError):
+        parse_steps(steps)
+
+
+def test_sequence_runs_every_step_and_records_drift():
+    worker = FakeWorker()
+    runner = SequenceRunner(worker.submit, lookup=worker.get, started=worker.started)
+    seq_id = runner.start([{"Command": 1, "duration": 0.02}, {"Command": 3, "duration": 0.02}])
+    record = wait_state(runner, seq_id)
+    assert record["state"] == "done"
+    assert worker.commands() == [1, 3]
+    assert [step["state"] for step in record["steps"]] == ["done", "done"]
+    assert all(step["drift_ms"] is not None for step in record["steps"])
+    assert record["max_drift_ms"] is not None
+
+
+def test_unreached_actuation_fails_sequence_and_sends_neutral():
+    worker = FakeWorker()
+    runner = SequenceRunner(worker.submit, lookup=worker.get, started=worker.started)
+    original_submit = worker.submit
+
+    def submit(command_data, source="api"):
+        cmd_id = original_submit(command_data, source)
+        if command_data["Command"] == 1:
+            # 致動器結束卻沒有到達目標
+            worker.records[cmd_id]["actuation"] = {"gear0": False, "gear1": True}
+        return cmd_id
+
+    runner.submit = submit
+    seq_id = runner.start([{"Command": 1, "duration": 0.02}, {"Command": 3, "duration": 0.02}])
+    record = wait_state(runner, seq_id)
+    assert record["state"] == "failed"
+    assert worker.commands() == [1, 0]
+    assert [step["state"] for step in record["steps"]] == ["failed", "skipped"]
+
+
+def test_abort_sends_neutral_and_skips_remaining_steps():
+    worker = FakeWorker()
+    runner = SequenceRunner(worker.submit, lookup=worker.get)
+    seq_id = runner.start([{"Command": 1, "duration": 60}, {"Command": 3, "duration": 1}])
+    deadline = time.monotonic() + 5
+    while not worker.submitted and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert runner.abort(seq_id) is True
+    record = runner.get(seq_id)
+    assert record["state"] == "aborted"
+    assert worker.commands() == [1, 0]
+    assert [step["state"] for step in record["steps"]] == ["aborted", "skipped"]
+    assert runner.abort(seq_id) is False
+
+
+def test_new_sequence_replaces_running_one_without_neutral():
+    worker = FakeWorker()
+    runner = SequenceRunner(worker.submit)
+    first = runner.start([{"Command": 1, "duration": 60}])
+    second = runner.start([{"Command": 3, "duration": 0.01}])
+    assert runner.get(first)["state"] == "aborted"
+    assert wait_state(runner, second)["state"] == "done"
+    assert 0 not in worker.commands()
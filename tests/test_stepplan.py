@@ -0,0 +1,139 @@
+import threading
+
+from stepplan import Step
+
+
+def test_steps_run_in_order_and_plan_succeeds(sequencer):
+    sent = []
+    future = sequencer.run("rudder0", [Step(send=lambda n=n: sent.append(n), label=str(n)) for n in range(3)])
+    sequencer.tick()
+    assert sent == [0, 1, 2]
+    assert future.result(timeout=0) is True
+    assert sequencer.current("rudder0") is None
+
+
+def test_delay_holds_step_until_deadline(sequencer):
+    sent = []
+    future = sequencer.run("gear0", [Step(send=lambda: sent.append("shift"), delay=60)])
+    due = sequencer.tick()
+    assert sent == []
+    assert due is not None
+    assert not future.done()
+    assert sequencer.remaining("gear0") == 1
+
+
+def test_new_plan_replaces_old_one_and_calls_on_cancel(sequencer):
+    cancelled = []
+    old = sequencer.run("gear0", [Step(delay=60)], on_cancel=lambda: cancelled.append("old"))
+    new = sequencer.run("gear0", [Step()])
+    assert old.result(timeout=0) is False
+    assert cancelled == ["old"]
+    sequencer.tick()
+    assert new.result(timeout=0) is True
+
+
+def test_cancel_finishes_plan_with_false(sequencer):
+    future = sequencer.run("gear1", [Step(delay=60)])
+    assert sequencer.cancel("gear1") is future
+    assert future.result(timeout=0) is False
+    assert sequencer.cancel("gear1") is None
+
+
+def test_required_step_that_is_not_confirmed_fails_plan(sequencer):
+    sent = []
+    applied = []
+    future = sequencer.run(
+        "gear0",
+        [
+            Step(expect=lambda: False, timeout=0, required=True, apply=applied.append),
+            Step(send=lambda: sent.append("speed")),
+        ],
+    )
+    sequencer.tick()
+    assert applied == [False]
+    assert sent == []
+    assert future.result(timeout=0) is False
+
+
+def test_optional_step_that_is_not_confirmed_continues(sequencer):
+    sent = []
+    future = sequencer.run(
+        "gear0",
+        [Step(expect=lambda: False, timeout=0), Step(send=lambda: sent.append("next"))],
+    )
+    sequencer.tick()
+    assert sent == ["next"]
+    assert future.result(timeout=0) is True
+
+
+def test_expect_waits_for_feedback_until_confirmed(sequencer):
+    reached = []
+    future = sequencer.run("rudder0", [Step(expect=lambda: bool(reached), timeout=60)])
+    assert sequencer.tick() is not None
+    assert not future.done()
+    reached.append(True)
+    sequencer.tick()
+    assert future.result(timeout=0) is True
+
+
+def test_skip_if_ends_plan_without_sending_the_rest(sequencer):
+    sent = []
+    future = sequencer.run(
+        "gear0",
+        [
+            Step(send=lambda: sent.append(1)),
+            Step(send=lambda: sent.append(2), skip_if=lambda: True),
+            Step(send=lambda: sent.append(3)),
+        ],
+    )
+    sequencer.tick()
+    assert sent == [1]
+    assert future.result(timeout=0) is True
+
+
+def test_apply_can_compile_following_steps(sequencer):
+    sent = []
+
+    def compile_speed(confirmed):
+        return [Step(send=lambda: sent.append("ACC")), Step(send=lambda: sent.append("ACC"))]
+
+    future = sequencer.run("gear0", [Step(send=lambda: sent.append("Forward"), apply=compile_speed), Step(send=lambda: sent.append("done"))])
+    sequencer.tick()
+    assert sent == ["Forward", "ACC", "ACC", "done"]
+    assert future.result(timeout=0) is True
+
+
+def test_apply_returning_false_fails_plan(sequencer):
+    future = sequencer.run("gear0", [Step(apply=lambda confirmed: False), Step()])
+    sequencer.tick()
+    assert future.result(timeout=0) is False
+
+
+def test_step_error_fails_plan_with_exception(sequencer):
+    def broken():
+        raise OSError("串口中斷")
+
+    future = sequencer.run("gear0", [Step(send=broken)])
+    sequencer.tick()
+    assert isinstance(future.exception(timeout=0), OSError)
+
+
+def test_plan_waits_for_start_event(sequencer):
+    start = threading.Event()
+    sent = []
+    future = sequencer.run("rudder1", [Step(send=lambda: sent.append(1))], start_event=start)
+    sequencer.tick()
+    assert sent == [] and not future.running()
+    start.set()
+    sequencer.tick()
+    assert sent == [1]
+    assert future.result(timeout=0) is True
+
+
+def test_update_changes_running_plan_only(sequencer):
+    target = {"value": 10}
+    future = sequencer.run("rudder0", [Step(delay=60)])
+    assert sequencer.update("rudder0", lambda: target.update(value=20)) is future
+    assert target["value"] == 20
+    assert sequencer.update("rudder1", lambda: target.update(value=30)) is None
+    assert target["value"] == 20
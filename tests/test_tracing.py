@@ -0,0 +1,71 @@
+import threading
+import time
+
+import tracing
+from commandworker import CommandWorker
+from stepplan import Step
+
+
+def spans_named(name, trace_id):
+    return [event for event in tracing.chrome_trace(trace_id)["traceEvents"] if event["name"] == name]
+
+
+def test_use_trace_restores_previous_id():
+    with tracing.use_trace("outer"):
+        with tracing.use_trace("inner"):
+            assert tracing.current_trace.get() == "inner"
+        assert tracing.current_trace.get() == "outer"
+    assert tracing.current_trace.get() is None
+
+
+def test_chrome_trace_filters_by_trace_id():
+    first, second = tracing.new_trace_id(), tracing.new_trace_id()
+    assert first != second
+    with tracing.use_trace(first), tracing.span("test.first", step=1):
+        pass
+    with tracing.use_trace(second), tracing.span("test.second"):
+        pass
+
+    events = spans_named("test.first", first)
+    assert len(events) == 1
+    assert events[0]["ph"] == "X"
+    assert events[0]["args"] == {"step": 1, "trace_id": first}
+    assert spans_named("test.second", first) == []
+    # 每個出現的執行緒都附上名稱
+    assert any(event["ph"] == "M" for event in tracing.chrome_trace(first)["traceEvents"])
+
+
+def test_command_worker_runs_command_under_submit_trace():
+    seen = []
+    done = threading.Event()
+
+    def execute(command_data):
+        seen.append(tracing.current_trace.get())
+        done.set()
+        return "ok"
+
+    worker = CommandWorker(execute)
+    trace_id = tracing.new_trace_id()
+    with tracing.use_trace(trace_id):
+        cmd_id = worker.submit({"Command": 1})
+    assert done.wait(5)
+    assert worker.get(cmd_id)["trace_id"] == trace_id
+    assert seen == [trace_id]
+    deadline = time.monotonic() + 5
+    while not spans_named("CommandWorker.execute", trace_id) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert spans_named("CommandWorker.queue_wait", trace_id)
+    assert spans_named("CommandWorker.execute", trace_id)
+
+
+def test_step_plan_sends_under_trace_of_caller(sequencer):
+    seen = []
+    trace_id = tracing.new_trace_id()
+    with tracing.use_trace(trace_id):
+        future = sequencer.run("gear", [Step(send=lambda: seen.append(tracing.current_trace.get()), label="LPS_L_ACC")])
+    # tick 在其他執行緒 (reactor) 呼叫時仍帶著規劃建立時的追蹤編號
+    assert tracing.current_trace.get() is None
+    sequencer.tick()
+    assert future.result(timeout=0) is True
+    assert seen == [trace_id]
+    assert [event["args"]["step"] for event in spans_named("StepSequencer.step", trace_id)] == ["LPS_L_ACC"]
@@ -0,0 +1,100 @@
+import contextvars
+import functools
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+# 目前執行緒 (或 contextvars 環境) 所屬的追蹤編號
+current_trace = contextvars.ContextVar("trace_id", default=None)
+
+# 最近的 span 環形緩衝：(名稱, 開始 ns, 結束 ns, 執行緒 id, 追蹤編號, 參數)
+SPAN_BUFFER_SIZE = 20000
+spans = deque(maxlen=SPAN_BUFFER_SIZE)
+thread_names = {}
+
+_trace_ids = itertools.count(1)
+_trace_prefix = f"{os.getpid():x}"
+
+
+def new_trace_id():
+    # 同一行程內唯一、遞增的追蹤編號
+    return f"{_trace_prefix}-{next(_trace_ids)}"
+
+
+@contextmanager
+def use_trace(trace_id):
+    # 在這段程式內把追蹤編號設為 trace_id (跨執行緒時在接手端呼叫)
+    token = current_trace.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        current_trace.reset(token)
+
+
+@contextmanager
+def span(name, **args):
+    # 記錄一段程式的開始與結束時間 (perf_counter_ns)
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        _record(name, start, time.perf_counter_ns(), args)
+
+
+def traced(name):
+    # 裝飾器版本的 span
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_span(name, start, end, **args):
+    # 補記已知開始/結束時間 (perf_counter_ns) 的 span，例如佇列等待
+    _record(name, start, end, args)
+
+
+def _record(name, start, end, args):
+    thread = threading.current_thread()
+    thread_names.setdefault(thread.ident, thread.name)
+    spans.append((name, start, end, thread.ident, current_trace.get(), args))
+
+
+def chrome_trace(trace_id=None):
+    """
+    把環形緩衝轉成 Chrome trace JSON (chrome://tracing、Perfetto 可直接開啟)。
+    trace_id 不為 None 時只輸出該追蹤編號的 span。
+    """
+    pid = os.getpid()
+    events = []
+    used_threads = set()
+    for name, start, end, tid, span_trace, args in list(spans):
+        if trace_id is not None and span_trace != trace_id:
+            continue
+        used_threads.add(tid)
+        events.append({
+            "name": name,
+            "cat": "boat",
+            "ph": "X",
+            "ts": start / 1000,
+            "dur": (end - start) / 1000,
+            "pid": pid,
+            "tid": tid,
+            "args": dict(args, trace_id=span_trace),
+        })
+    for tid in used_threads:
+        events.append({
+            "name": "thread_name",
+            "ph": "M",
+            "pid": pid,
+            "tid": tid,
+            "args": {"name": thread_names.get(tid, str(tid))},
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}